@@ -0,0 +1,194 @@
+
+"""
+Локальная замена forum.matrp.ru для бенчмарков: отдаёт записанные страницы
+из benchmarks/corpus.
+
+    python benchmarks/forum_stub.py --port 8765 --changed 0.1
+
+Маршруты:
+    /threads/<slug>.<id>/[page-N/]   -> corpus/thread.html
+    /threads/<slug>.<id>/latest      -> 303 на page-N#post-<последний пост>
+    ...?_xfResponseType=json         -> {"html": {"content": тело страницы темы}, "visitor": {...}}
+    /forums/<slug>.<id>/[page-N/]    -> corpus/forum.html
+    /members/<slug>.<id>/            -> corpus/member.html
+    /                                -> corpus/forum.html (главная: вход, /checkcookies)
+    POST /_bench/tick                -> следующее "поколение" форума
+    GET  /_bench/stats               -> число запросов и отданных байт
+
+После каждого tick примерно в доле --changed тем и разделов появляется новый
+пост/тема: id постов (post-N) и тем (js-threadListItem-N, threads/x.N/) в
+ответе сдвигаются на 1000 за каждое изменение этой страницы.
+--no-light — без latest и JSON (как форум, где их нет: 404 и обычный HTML).
+"""
+
+import argparse
+import json
+import os
+import re
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+_ROUTE = re.compile(r"^/(threads|forums|members)/[^/?#]*?\.?(\d+)/?(?:page-\d+/?)?(?:[?#].*)?$")
+_THREAD_IDS = re.compile(r"(post-|posts/)(\d+)")
+_FORUM_IDS = re.compile(r"(js-threadListItem-|threads/[\w-]+\.)(\d+)")
+_LATEST = re.compile(r"^/threads/([^/?#]*?\.?\d+)/latest/?$")
+
+
+def load_corpus(path: str = CORPUS_DIR) -> dict:
+    pages = {}
+    for name in ("thread", "forum", "member"):
+        with open(os.path.join(path, name + ".html"), "r", encoding="utf-8") as f:
+            pages[name] = f.read()
+    return pages
+
+
+class ForumState:
+    """Поколения форума: какие страницы и сколько раз "получили" новый пост."""
+
+    def __init__(self, changed: float = 0.1):
+        self.changed = changed
+        self.gen = 0
+        self._bumps = {}
+        self._seen = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.bytes = 0
+
+    def tick(self) -> int:
+        with self._lock:
+            self.gen += 1
+            return self.gen
+
+    def _selected(self, key: str, gen: int) -> bool:
+        return zlib.crc32(f"{key}:{gen}".encode()) % 10000 < self.changed * 10000
+
+    def bumps(self, key: str) -> int:
+        with self._lock:
+            seen = self._seen.get(key, 0)
+            n = self._bumps.get(key, 0)
+            for g in range(seen + 1, self.gen + 1):
+                if self._selected(key, g):
+                    n += 1
+            self._seen[key] = self.gen
+            self._bumps[key] = n
+            return n
+
+    def count(self, nbytes: int):
+        with self._lock:
+            self.requests += 1
+            self.bytes += nbytes
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    pages = {}
+    encoded = {}
+    state = ForumState()
+    light = True
+    # (последний пост, последняя страница) в corpus/thread.html
+    thread_last = (0, 1)
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, ctype: str = "text/html; charset=utf-8", location: str = None):
+        self.send_response(status)
+        if location:
+            self.send_header("Location", location)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.state.count(len(body))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        if self.path == "/_bench/tick":
+            self._send(200, json.dumps({"gen": self.state.tick()}).encode(), "application/json")
+        else:
+            self._send(404, b"not found", "text/plain")
+
+    def do_GET(self):
+        if self.path == "/_bench/stats":
+            st = self.state
+            body = json.dumps({"gen": st.gen, "requests": st.requests, "bytes": st.bytes}).encode()
+            self._send(200, body, "application/json")
+            return
+        path = self.path.split("/index.php?", 1)[-1]
+        if not path.startswith("/"):
+            path = "/" + path
+        if path in ("/", ""):
+            self._send(200, self.encoded["forum"])
+            return
+
+        m = _LATEST.match(path)
+        if m and self.light:
+            key = "threads" + m.group(1).rsplit(".", 1)[-1]
+            post, page = self.thread_last
+            post += 1000 * self.state.bumps(key)
+            self._send(303, b"", "text/plain", f"/threads/{m.group(1)}/page-{page}#post-{post}")
+            return
+
+        m = _ROUTE.match(path)
+        if not m:
+            self._send(404, b"not found", "text/plain")
+            return
+        kind, key = m.group(1), m.group(1) + m.group(2)
+        if kind == "members":
+            self._send(200, self.encoded["member"])
+            return
+
+        page = "thread" if kind == "threads" else "forum"
+        n = self.state.bumps(key)
+        partial = self.light and page == "thread" and "_xfResponseType=json" in self.path
+        if not n and not partial:
+            self._send(200, self.encoded[page])
+            return
+        html = self.pages[page]
+        if n:
+            pattern = _THREAD_IDS if page == "thread" else _FORUM_IDS
+            html = pattern.sub(lambda mm: mm.group(1) + str(int(mm.group(2)) + 1000 * n), html)
+        if partial:
+            # как XenForo: содержимое страницы без шапки и подвала
+            start = html.find('<div class="p-body-pageContent">')
+            end = html.rfind("<footer")
+            body = {"status": "ok", "html": {"content": html[max(start, 0):end if end > start else None]},
+                    "visitor": {"conversations_unread": "0", "alerts_unviewed": "0", "total_unread": "0"}}
+            self._send(200, json.dumps(body, ensure_ascii=False).encode("utf-8"), "application/json")
+            return
+        self._send(200, html.encode("utf-8"))
+
+
+def serve(host: str = "127.0.0.1", port: int = 8765, changed: float = 0.1,
+          corpus: str = CORPUS_DIR, light: bool = True) -> ThreadingHTTPServer:
+    """Запускает стенд в фоне; srv.state — ForumState, srv.shutdown() для остановки."""
+    Handler.pages = load_corpus(corpus)
+    Handler.encoded = {k: v.encode("utf-8") for k, v in Handler.pages.items()}
+    Handler.state = ForumState(changed)
+    Handler.light = light
+    thread = Handler.pages["thread"]
+    posts = [int(m.group(2)) for m in _THREAD_IDS.finditer(thread) if m.group(1) == "post-"]
+    Handler.thread_last = (max(posts, default=0), max((int(x) for x in re.findall(r"page-(\d+)", thread)), default=1))
+    srv = ThreadingHTTPServer((host, port), Handler)
+    srv.daemon_threads = True
+    srv.state = Handler.state
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--changed", type=float, default=0.1)
+    ap.add_argument("--corpus", default=CORPUS_DIR)
+    ap.add_argument("--no-light", action="store_true", help="без threads/<id>/latest и _xfResponseType=json")
+    args = ap.parse_args()
+    srv = serve(args.host, args.port, args.changed, args.corpus, light=not args.no_light)
+    print(f"Forum stand-in on http://{args.host}:{args.port}/")
+    threading.Event().wait()
@@ -0,0 +1,99 @@
+
+"""
+Бюджет времени импорта процесса бота (python -X importtime).
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --budget-ms 300 --runs 7 --json import_time.json
+
+Импортирует то же, что main.py до старта VKBot, в чистом интерпретаторе
+несколько раз и берёт медиану. Падает (код 1), если медиана импорта
+больше бюджета или в процесс бота попал модуль из FORBIDDEN
+(bs4, DeepSeek-клиент, Flask должны грузиться лениво).
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BOT_IMPORTS = "import colorama, bot.logging_setup, bot.vk_bot, bot.forum_tracker"
+FORBIDDEN = ("bs4", "flask", "flask_sock", "bot.deepseek_ai")
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)$")
+
+
+def parse_importtime(stderr: str):
+    """-> [(module, self_us, cumulative_us, depth)] в порядке вывода."""
+    out = []
+    for line in stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            out.append((m.group(4), int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2))
+    return out
+
+
+def run_once(code: str):
+    t0 = time.perf_counter()
+    p = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                       cwd=ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    if p.returncode != 0:
+        raise RuntimeError(p.stderr.strip().splitlines()[-1] if p.stderr.strip() else "import failed")
+    return wall, parse_importtime(p.stderr)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--code", default=BOT_IMPORTS, help="что импортировать")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--budget-ms", type=float, default=300.0)
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--json", dest="json_path", help="куда записать результат")
+    args = ap.parse_args()
+
+    walls, totals, last = [], [], []
+    for _ in range(max(1, args.runs)):
+        wall, rows = run_once(args.code)
+        walls.append(wall * 1000)
+        totals.append(sum(cum for _, _, cum, depth in rows if depth == 0) / 1000)
+        last = rows
+
+    loaded = {name for name, *_ in last}
+    forbidden = sorted(m for m in FORBIDDEN if m in loaded)
+    top = sorted(last, key=lambda r: r[1], reverse=True)[:args.top]
+    result = {
+        "code": args.code,
+        "runs": len(walls),
+        "import_ms_median": round(statistics.median(totals), 1),
+        "process_ms_median": round(statistics.median(walls), 1),
+        "budget_ms": args.budget_ms,
+        "modules": len(loaded),
+        "forbidden_loaded": forbidden,
+        "top_self_ms": [{"module": n, "self_ms": round(s / 1000, 2), "cumulative_ms": round(c / 1000, 2)}
+                        for n, s, c, _ in top],
+    }
+    result["ok"] = result["import_ms_median"] <= args.budget_ms and not forbidden
+
+    print(f"import: {result['import_ms_median']} ms (median of {result['runs']}), "
+          f"process: {result['process_ms_median']} ms, budget: {args.budget_ms} ms, "
+          f"modules: {result['modules']}")
+    for row in result["top_self_ms"]:
+        print(f"  {row['self_ms']:8.2f} ms  {row['cumulative_ms']:8.2f} ms  {row['module']}")
+    if forbidden:
+        print("eagerly imported: " + ", ".join(forbidden))
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    sys.exit(0 if result["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+
+"""
+Локальный HTTP-прокси для проверки пула прокси (bot/proxies.py) без сети.
+
+    python benchmarks/proxy_stub.py --port 8766 --delay 0.05
+
+Понимает GET/POST с абсолютным URL (http://...) и CONNECT для https.
+srv.state.delay — задержка перед ответом, srv.state.broken = True — прокси
+рвёт соединения (для проверки вывода из ротации), srv.state.requests — счётчик.
+"""
+
+import argparse
+import select
+import socket
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class ProxyState:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.broken = False
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+
+# прямые запросы к апстриму, без системных прокси из окружения
+_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+
+class Handler(BaseHTTPRequestHandler):
+    state = ProxyState()
+
+    def log_message(self, *args):
+        pass
+
+    def _pre(self) -> bool:
+        self.state.count()
+        if self.state.delay:
+            time.sleep(self.state.delay)
+        if self.state.broken:
+            self.close_connection = True
+            try:
+                self.connection.shutdown(socket.SHUT_RDWR)
+            except Exception:
+                pass
+            return False
+        return True
+
+    def _forward(self, method: str):
+        if not self._pre():
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else None
+        headers = {k: v for k, v in self.headers.items()
+                   if k.lower() not in ("proxy-connection", "proxy-authorization", "connection", "host")}
+        req = urllib.request.Request(self.path, data=body, headers=headers, method=method)
+        try:
+            with _opener.open(req, timeout=30) as r:
+                status, rheaders, data = r.status, r.headers.items(), r.read()
+        except urllib.error.HTTPError as e:
+            status, rheaders, data = e.code, e.headers.items(), e.read()
+        except Exception as e:
+            data = str(e).encode()
+            status, rheaders = 502, [("Content-Type", "text/plain")]
+        self.send_response(status)
+        for k, v in rheaders:
+            if k.lower() not in ("transfer-encoding", "connection", "content-length"):
+                self.send_header(k, v)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._forward("GET")
+
+    def do_POST(self):
+        self._forward("POST")
+
+    def do_CONNECT(self):
+        if not self._pre():
+            return
+        host, _, port = self.path.partition(":")
+        try:
+            upstream = socket.create_connection((host, int(port or 443)), timeout=30)
+        except Exception:
+            self.send_error(502)
+            return
+        self.send_response(200, "Connection established")
+        self.end_headers()
+        self.close_connection = True
+        conns = [self.connection, upstream]
+        try:
+            while True:
+                ready, _, err = select.select(conns, [], conns, 30)
+                if err or not ready:
+                    break
+                for s in ready:
+                    data = s.recv(65536)
+                    if not data:
+                        return
+                    (upstream if s is self.connection else self.connection).sendall(data)
+        finally:
+            upstream.close()
+
+
+def serve(host: str = "127.0.0.1", port: int = 8766, delay: float = 0.0) -> ThreadingHTTPServer:
+    """Запускает прокси в фоне; srv.state — ProxyState, srv.shutdown() для остановки."""
+    state = ProxyState(delay)
+    handler = type("ProxyHandler", (Handler,), {"state": state})
+    srv = ThreadingHTTPServer((host, port), handler)
+    srv.daemon_threads = True
+    srv.state = state
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8766)
+    ap.add_argument("--delay", type=float, default=0.0)
+    args = ap.parse_args()
+    srv = serve(args.host, args.port, args.delay)
+    print(f"Proxy stand-in on http://{args.host}:{args.port}/")
+    threading.Event().wait()
@@ -0,0 +1,44 @@
+
+"""
+Запись страниц форума в benchmarks/corpus (для forum_stub).
+
+    python benchmarks/record.py thread https://forum.matrp.ru/threads/....123/
+    python benchmarks/record.py forum  https://forum.matrp.ru/forums/....45/
+    python benchmarks/record.py member https://forum.matrp.ru/members/....678/
+
+Страница грузится сессией трекера (куки из config.py) и сохраняется как
+corpus/<kind>.html. Перед коммитом проверь, что в записи нет _xfToken и
+личных данных.
+"""
+
+import argparse
+import os
+import re
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("kind", choices=("thread", "forum", "member"))
+    ap.add_argument("url")
+    args = ap.parse_args()
+
+    from bot.forum_tracker import ForumTracker
+
+    html = ForumTracker(None).fetch_html(args.url)
+    if not html:
+        raise SystemExit("не удалось загрузить страницу")
+    html = re.sub(r'(name="_xfToken" value=")[^"]*', r"\1", html)
+    html = re.sub(r'(data-csrf=")[^"]*', r"\1", html)
+
+    path = os.path.join(HERE, "corpus", args.kind + ".html")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(html)
+    print(f"saved {path} ({len(html.encode('utf-8')) // 1024} KB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+
+"""
+Офлайн-бенчмарк трекера: записанные страницы форума + фейковый VK API.
+
+    python benchmarks/run.py
+    python benchmarks/run.py --sizes 10,100 --cycles 3 --changed 0.2 --out results.json
+
+Поднимает forum_stub (corpus/*.html) и vk_stub в этом процессе, затем для
+каждого размера (число отслеживаемых URL) запускает отдельный процесс бота:
+настоящие ForumTracker.check_all и VKBot.send, VK-запросы уходят в vk_stub.
+Первый цикл "холодный" (все ссылки новые -> уведомление каждому подписчику),
+затем --cycles циклов, перед каждым из которых на форуме меняется доля
+--changed страниц.
+
+Результат — JSON (--out): время цикла, URL/с, уведомлений/с, запросов и байт
+к форуму, пиковый RSS процесса бота, плюс скорость парсеров (страниц/с).
+--parse-workers N — бот парсит в пуле из N процессов (PARSE_WORKERS), а
+скорость парсинга темы дополнительно меряется через пул на 1..N процессах.
+--forum-rps R — общий лимит запросов к форуму (FORUM_RPS); во время циклов
+после холодного параллельно идут запросы "команды", по очереди в полосе
+interactive и background, — в результате их p50/p95 по полосам.
+--no-light — стенд без threads/<id>/latest и JSON-партиалов (опрос полными
+страницами, как на форуме без этих эндпоинтов).
+Ограничение vk_api в 3 запроса/с по умолчанию выключено (--vk-rps-delay 0),
+чтобы мерить сам бот, а не лимит VK. Размер 1000 на текущих парсерах
+занимает несколько минут.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+THREAD_SHARE = 0.8
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux — КБ, macOS — байты
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_version() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT,
+                              capture_output=True, text=True, timeout=10).stdout.strip()
+    except Exception:
+        return ""
+
+
+def _get_json(url: str) -> dict:
+    import requests
+    return requests.get(url, timeout=10).json()
+
+
+def bench_urls(forum_url: str, n: int):
+    """n ссылок: ~80% тем, остальное разделы."""
+    out = []
+    for i in range(n):
+        if i < n * THREAD_SHARE:
+            out.append(f"{forum_url}/threads/bench-thread-{i}.{100000 + i}/")
+        else:
+            out.append(f"{forum_url}/forums/bench-forum-{i}.{500 + i}/")
+    return out
+
+
+def make_bot(forum_url: str, vk_url: str, rps_delay: float = 0.0):
+    """VKBot + ForumTracker, направленные на стенды. Импорт bot.* — только после BOT_DB."""
+    from requests.adapters import HTTPAdapter
+
+    import bot.forum_tracker as ft
+    import bot.vk_bot as vb
+
+    ft.FORUM_BASE = forum_url
+    vb.VK_TOKEN = vb.VK_TOKEN or "bench"
+
+    class _ToStub(HTTPAdapter):
+        def send(self, request, **kwargs):
+            request.url = vk_url + "/method/" + request.url.split("/method/", 1)[1]
+            return super().send(request, **kwargs)
+
+    vk = vb.VKBot(connect=False)
+    vk.vk_session.http.mount("https://api.vk.ru/", _ToStub())
+    vk.vk_session.http.mount("https://api.vk.com/", _ToStub())
+    vk.vk_session.RPS_DELAY = rps_delay
+    tracker = ft.ForumTracker("", "", "", vk)
+    vk.handler.tracker = tracker
+    return vk, tracker
+
+
+def _p(values, q):
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q * len(values)))], 3) if values else None
+
+
+def probe_lanes(tracker, forum_url: str, stop) -> dict:
+    """Запросы "команды" посреди цикла: по очереди в полосе interactive и background."""
+    from bot.scheduler import BACKGROUND, INTERACTIVE, lane
+
+    lat = {"interactive": [], "background": []}
+    i = 0
+    while not stop.is_set():
+        name, value = (("interactive", INTERACTIVE), ("background", BACKGROUND))[i % 2]
+        # ссылки вне отслеживаемых — мимо общего кэша страниц
+        url = f"{forum_url}/threads/bench-probe-{i}.{900000 + i}/"
+        t0 = time.perf_counter()
+        with lane(value):
+            tracker.fetch_page(url)
+        lat[name].append(time.perf_counter() - t0)
+        i += 1
+        stop.wait(0.1)
+    return lat
+
+
+def run_size(args) -> dict:
+    """Дочерний процесс: один размер, холодный цикл + args.cycles циклов."""
+    import requests
+
+    from bot.logging_setup import setup_logging
+    setup_logging(level="WARNING")
+    from bot import storage
+
+    storage.init_db()
+    vk, tracker = make_bot(args.forum_url, args.vk_url, args.vk_rps_delay)
+    tracker.parser.start()
+    for i, url in enumerate(bench_urls(args.forum_url, args.child)):
+        for p in range(args.peers):
+            storage.add_track(2000000001 + (i + p) % 50, url, "thread" if "/threads/" in url else "forum")
+
+    cycles = []
+    tracker.set_metrics_callback(cycles.append)
+
+    lanes = {"interactive": [], "background": []}
+
+    def one(label, probe=False):
+        f0 = _get_json(args.forum_url + "/_bench/stats")
+        v0 = _get_json(args.vk_url + "/_bench/stats")
+        stop = threading.Event()
+        res = {}
+        if probe:
+            th = threading.Thread(target=lambda: res.update(probe_lanes(tracker, args.forum_url, stop)))
+            th.start()
+        t0 = time.perf_counter()
+        tracker.check_all()
+        dt = time.perf_counter() - t0
+        if probe:
+            stop.set()
+            th.join()
+            for k, v in res.items():
+                lanes[k].extend(v)
+        f1 = _get_json(args.forum_url + "/_bench/stats")
+        v1 = _get_json(args.vk_url + "/_bench/stats")
+        c = cycles[-1] if cycles else {}
+        return {
+            "cycle": label,
+            "seconds": round(dt, 3),
+            "urls_per_s": round(args.child / dt, 1) if dt else None,
+            "notifications": c.get("notifications", 0),
+            "notifications_per_s": round(c.get("notifications", 0) / dt, 1) if dt else None,
+            "vk_messages": v1["messages"] - v0["messages"],
+            "vk_calls": sum(v1["calls"].values()) - sum(v0["calls"].values()),
+            "forum_requests": f1["requests"] - f0["requests"],
+            "forum_bytes": f1["bytes"] - f0["bytes"],
+            "parse_ms": c.get("parse_ms"),
+            "errors": c.get("errors", 0),
+        }
+
+    runs = [one("cold")]
+    for k in range(args.cycles):
+        requests.post(args.forum_url + "/_bench/tick", timeout=10)
+        runs.append(one(f"changed-{k + 1}", probe=args.forum_rps > 0))
+
+    steady = [r["seconds"] for r in runs[1:]] or [runs[0]["seconds"]]
+    return {
+        "urls": args.child,
+        "peers_per_url": args.peers,
+        "cycles": runs,
+        "cycle_seconds_median": round(statistics.median(steady), 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "lanes": {k: {"requests": len(v), "p50": _p(v, 0.5), "p95": _p(v, 0.95)}
+                  for k, v in lanes.items() if v},
+    }
+
+
+def bench_parse(seconds: float = 1.0) -> dict:
+    """Страниц/с для каждого парсера на страницах из corpus."""
+    from forum_stub import load_corpus
+    from bot.forum_tracker import parse_thread_posts, parse_forum_topics
+    from bot.profiles import parse_member_profile
+
+    pages = load_corpus()
+    cases = {
+        "thread": lambda: parse_thread_posts(pages["thread"], "https://forum.matrp.ru/threads/x.1/"),
+        "forum": lambda: parse_forum_topics(pages["forum"], "https://forum.matrp.ru/forums/x.1/"),
+        "member": lambda: parse_member_profile(pages["member"], "https://forum.matrp.ru/members/x.1/"),
+    }
+    out = {}
+    for name, fn in cases.items():
+        fn()
+        n, t0 = 0, time.perf_counter()
+        while time.perf_counter() - t0 < seconds:
+            fn()
+            n += 1
+        dt = time.perf_counter() - t0
+        out[name] = {
+            "pages_per_s": round(n / dt, 1),
+            "ms_per_page": round(dt / n * 1000, 2),
+            "kb_per_page": round(len(pages[name].encode("utf-8")) / 1024, 1),
+        }
+    return out
+
+
+def bench_parse_pool(workers: int, seconds: float = 1.0) -> dict:
+    """Страниц темы/с через ParsePool на 1, 2, 4 ... workers процессах."""
+    from concurrent.futures import ThreadPoolExecutor
+    from forum_stub import load_corpus
+    from bot.forum_tracker import parse_thread_page
+    from bot.parse_pool import ParsePool
+
+    html = load_corpus()["thread"]
+    url = "https://forum.matrp.ru/threads/x.1/"
+    counts = sorted({1, workers} | {k for k in (2, 4, 8, 16) if k < workers})
+    out = {}
+    for n in counts:
+        pool = ParsePool(n)
+        pool.start()
+        done = [0]
+        stop = time.perf_counter() + seconds
+
+        def feed():
+            while time.perf_counter() < stop:
+                pool.run(parse_thread_page, html, url, None)
+                done[0] += 1
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(n * 2) as ex:
+            for _ in range(n * 2):
+                ex.submit(feed)
+        dt = time.perf_counter() - t0
+        pool.shutdown()
+        out[str(n)] = {"pages_per_s": round(done[0] / dt, 1)}
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="10,100,1000")
+    ap.add_argument("--cycles", type=int, default=2)
+    ap.add_argument("--changed", type=float, default=0.1, help="доля страниц с новым постом на цикл")
+    ap.add_argument("--peers", type=int, default=1, help="подписчиков (бесед) на ссылку")
+    ap.add_argument("--vk-delay", type=float, default=0.0, help="задержка ответа фейкового VK, сек")
+    ap.add_argument("--vk-rps-delay", type=float, default=0.0, help="vk_api RPS_DELAY (0.34 — как в проде)")
+    ap.add_argument("--parse-seconds", type=float, default=1.0)
+    ap.add_argument("--parse-workers", type=int, default=0, help="PARSE_WORKERS для бота (0 — парсинг в процессе)")
+    ap.add_argument("--forum-rps", type=float, default=0.0, help="FORUM_RPS для бота (0 — без общего лимита)")
+    ap.add_argument("--no-light", action="store_true", help="стенд без latest-редиректов и JSON-партиалов")
+    ap.add_argument("--out", default=os.path.join(HERE, "results.json"))
+    ap.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    ap.add_argument("--forum-url", help=argparse.SUPPRESS)
+    ap.add_argument("--vk-url", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child is not None:
+        sys.path.insert(0, ROOT)
+        print(json.dumps(run_size(args)))
+        return
+
+    import forum_stub
+    import vk_stub
+
+    forum = forum_stub.serve(port=0, changed=args.changed, light=not args.no_light)
+    vk = vk_stub.serve(port=0, delay=args.vk_delay)
+    forum_url = "http://127.0.0.1:%d" % forum.server_address[1]
+    vk_url = "http://127.0.0.1:%d" % vk.server_address[1]
+
+    sys.path.insert(0, ROOT)
+    result = {
+        "version": git_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "ts": int(time.time()),
+        "params": {k: getattr(args, k) for k in ("sizes", "cycles", "changed", "peers", "vk_delay", "vk_rps_delay", "parse_workers", "forum_rps", "no_light")},
+        "parse": bench_parse(args.parse_seconds),
+        "sizes": [],
+    }
+    for name, r in result["parse"].items():
+        print(f"parse {name:<7} {r['pages_per_s']:>8} pages/s  {r['ms_per_page']:>7} ms/page")
+    if args.parse_workers:
+        result["parse_pool"] = bench_parse_pool(args.parse_workers, args.parse_seconds)
+        for n, r in result["parse_pool"].items():
+            print(f"parse pool {n:>3} workers {r['pages_per_s']:>8} thread pages/s")
+
+    for n in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, BOT_DB=os.path.join(tmp, "bench.db"), PYTHONPATH=ROOT,
+                       PARSE_WORKERS=str(args.parse_workers), FORUM_RPS=str(args.forum_rps))
+            cmd = [sys.executable, os.path.abspath(__file__), "--child", str(n),
+                   "--forum-url", forum_url, "--vk-url", vk_url,
+                   "--cycles", str(args.cycles), "--peers", str(args.peers),
+                   "--vk-rps-delay", str(args.vk_rps_delay), "--forum-rps", str(args.forum_rps)]
+            p = subprocess.run(cmd, cwd=tmp, env=env, capture_output=True, text=True)
+        if p.returncode != 0:
+            print(p.stderr[-2000:], file=sys.stderr)
+            raise SystemExit(f"benchmark for {n} urls failed")
+        r = json.loads(p.stdout.strip().splitlines()[-1])
+        result["sizes"].append(r)
+        cold = r["cycles"][0]
+        print(f"urls {n:>5}: cold {cold['seconds']}s ({cold['notifications_per_s']} notif/s), "
+              f"changed-cycle median {r['cycle_seconds_median']}s, peak RSS {r['peak_rss_mb']} MB")
+        for name, l in r.get("lanes", {}).items():
+            print(f"  {name:<11} fetch p50 {l['p50']}s p95 {l['p95']}s ({l['requests']} requests)")
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print("saved", args.out)
+
+    forum.shutdown()
+    vk.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+
+"""
+Фейковый VK API для бенчмарков (POST /method/<name>, как api.vk.ru).
+
+    python benchmarks/vk_stub.py --port 8766 --delay 0.01
+
+Понимает messages.send (peer_id или peer_ids), execute (считает вызовы
+API.messages.send в code), groups.getById, groups.getLongPollServer;
+на остальное отвечает {"response": 1}. GET /_bench/stats — счётчики.
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class VKState:
+    def __init__(self):
+        self.calls = Counter()
+        self.messages = 0
+        self.bytes = 0
+        self._msg_id = 0
+        self._lock = threading.Lock()
+
+    def record(self, method: str, messages: int, nbytes: int) -> int:
+        with self._lock:
+            self.calls[method] += 1
+            self.messages += messages
+            self.bytes += nbytes
+            self._msg_id += messages
+            return self._msg_id
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"calls": dict(self.calls), "messages": self.messages, "bytes": self.bytes}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    delay = 0.0
+    state = VKState()
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, obj, status: int = 200):
+        body = json.dumps(obj, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/_bench/stats":
+            self._json(self.state.snapshot())
+        else:
+            self._json({"error": {"error_code": 3, "error_msg": "Unknown method passed"}}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        params = {k: v[-1] for k, v in parse_qs(raw.decode("utf-8", "replace")).items()}
+        if not self.path.startswith("/method/"):
+            self._json({"error": {"error_code": 3, "error_msg": "Unknown method passed"}}, 404)
+            return
+        method = self.path[len("/method/"):].split("?", 1)[0]
+        if self.delay:
+            time.sleep(self.delay)
+
+        if method == "messages.send":
+            peers = [p for p in (params.get("peer_ids") or "").split(",") if p]
+            last = self.state.record(method, len(peers) or 1, len(raw))
+            if peers:
+                resp = [{"peer_id": int(p), "message_id": last - len(peers) + i + 1}
+                        for i, p in enumerate(peers)]
+            else:
+                resp = last
+            self._json({"response": resp})
+        elif method == "execute":
+            n = (params.get("code") or "").count("API.messages.send")
+            self.state.record(method, n, len(raw))
+            self._json({"response": [1] * n})
+        elif method == "groups.getById":
+            self.state.record(method, 0, len(raw))
+            self._json({"response": [{"id": 1, "name": "bench", "screen_name": "bench"}]})
+        elif method == "groups.getLongPollServer":
+            self.state.record(method, 0, len(raw))
+            host, port = self.server.server_address[:2]
+            self._json({"response": {"key": "bench", "server": f"http://{host}:{port}/lp", "ts": "1"}})
+        else:
+            self.state.record(method, 0, len(raw))
+            self._json({"response": 1})
+
+
+def serve(host: str = "127.0.0.1", port: int = 8766, delay: float = 0.0) -> ThreadingHTTPServer:
+    """Запускает фейковый VK API в фоне; srv.state — VKState."""
+    Handler.delay = delay
+    Handler.state = VKState()
+    srv = ThreadingHTTPServer((host, port), Handler)
+    srv.daemon_threads = True
+    srv.state = Handler.state
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8766)
+    ap.add_argument("--delay", type=float, default=0.0)
+    args = ap.parse_args()
+    serve(args.host, args.port, args.delay)
+    print(f"VK API stub on http://{args.host}:{args.port}/method/")
+    threading.Event().wait()
@@ -3,11 +3,10 @@ import re
 import time
 from typing import Optional, Dict
 from urllib.parse import urljoin
-from bs4 import BeautifulSoup
 import requests
-from .utils import normalize_url, log_info, log_error
-import datetime
+from .utils import normalize_url, log_info, log_error, make_soup
 from .forum_tracker import build_cookies  
+from .profiles import ProfileCache
 
 try:
     from config import FORUM_BASE, XF_LOGIN, XF_PASS
@@ -18,7 +17,8 @@ except Exception:
 
 class Account:
     def __init__(self, login: str = XF_LOGIN, password: str = XF_PASS, session: Optional[requests.Session] = None):
-        self.login = login
+        # не self.login: атрибут затенял метод login()
+        self.username = login
         self.password = password
         self.session = session or requests.Session()
         self.session.headers.update({
@@ -26,12 +26,10 @@ class Account:
         })
         self.logged = False
         self.last_login_ts = 0
+        self.profiles = ProfileCache(self._load_profile)
 
-    def _debug(self, msg: str):
-        try:
-            log_info(msg)
-        except Exception:
-            print(f"[ACCOUNT] {msg}")
+    def _debug(self, msg: str, *args):
+        log_info(msg, *args)
 
     def login_if_needed(self, force: bool = False) -> bool:
         if not force and self.logged and time.time() - self.last_login_ts < 60*30:
@@ -39,7 +37,7 @@ class Account:
         try:
             return self.login()
         except Exception as e:
-            self._debug(f"login_if_needed error: {e}")
+            self._debug("login_if_needed error: %s", e)
             return False
 
     def login(self) -> bool:
@@ -49,13 +47,13 @@ class Account:
         login_url = urljoin(FORUM_BASE, "/index.php?login/login")
         page = self.session.get(FORUM_BASE, timeout=15)
         if page.status_code != 200:
-            self._debug(f"login: fetch base failed {page.status_code}")
-        soup = BeautifulSoup(page.text or "", "html.parser")
+            self._debug("login: fetch base failed %s", page.status_code)
+        soup = make_soup(page.text)
         t = soup.find("input", {"name": "_xfToken"})
         token = t.get("value") if t else ""
 
         payload = {
-            "login": self.login,
+            "login": self.username,
             "password": self.password,
             "remember": "1",
             "_xfWithData": "1",
@@ -74,10 +72,10 @@ class Account:
             self.logged = bool(logged)
             if self.logged:
                 self.last_login_ts = time.time()
-            self._debug(f"Login attempt -> logged={self.logged} status={getattr(r,'status_code',None)}")
+            self._debug("Login attempt -> logged=%s status=%s", self.logged, getattr(r, 'status_code', None))
             return self.logged
         except Exception as e:
-            self._debug(f"login error: {e}")
+            self._debug("login error: %s", e)
             self.logged = False
             return False
 
@@ -89,8 +87,8 @@ class Account:
         """
         Return dictionary with available profile info.
         profile_url_or_id may be '/index.php?members/...' or numeric id.
+        Results are cached by member id (see bot.profiles.ProfileCache).
         """
-        out = {}
         try:
             if profile_url_or_id.isdigit():
                 url = urljoin(FORUM_BASE, f"/index.php?members/{profile_url_or_id}/")
@@ -98,10 +96,17 @@ class Account:
                 url = normalize_url(profile_url_or_id)
                 if not url.startswith(FORUM_BASE):
                     url = urljoin(FORUM_BASE, profile_url_or_id)
+            return self.profiles.get(url) or {}
+        except Exception as e:
+            return {"error": str(e)}
+
+    def _load_profile(self, url: str) -> Dict:
+        out = {}
+        try:
             r = self.session.get(url, timeout=15)
             if r.status_code != 200:
                 return {"error": f"HTTP {r.status_code}"}
-            soup = BeautifulSoup(r.text or "", "html.parser")
+            soup = make_soup(r.text)
             out["display_name"] = (soup.select_one(".p-body-header h1") or soup.select_one(".message-name") or soup.select_one(".avatar-name")).get_text(strip=True) if soup.select_one(".p-body-header h1") else ""
           
             stats = {}
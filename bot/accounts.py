@@ -0,0 +1,207 @@
+
+"""
+Пул аккаунтов форума: у каждого своя сессия (куки), свой SessionManager
+и свой бюджет запросов. Отслеживаемые ссылки раскладываются по аккаунтам
+консистентным хешированием — при добавлении/падении аккаунта переезжает
+только его доля ссылок. Постинг (post_message, react_to_post) всегда идёт
+с основного аккаунта (XF_* из config.py).
+
+config.py:
+    FORUM_ACCOUNTS = [
+        {"name": "reader1", "xf_user": "...", "xf_session": "...", "xf_tfa_trust": "..."},
+        {"name": "reader2", "login": "...", "password": "...", "rps": 1.5},
+    ]
+    FORUM_ACCOUNT_RPS = 2   # запросов/с на аккаунт по умолчанию, 0 — без лимита
+"""
+
+from __future__ import annotations
+
+import bisect
+import hashlib
+import logging
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import requests
+
+from . import metrics
+from .session import SessionManager, RELOGIN_BACKOFF
+
+try:
+    from config import FORUM_ACCOUNTS
+except Exception:
+    FORUM_ACCOUNTS = []
+
+try:
+    from config import FORUM_ACCOUNT_RPS
+except Exception:
+    FORUM_ACCOUNT_RPS = 0
+
+try:
+    from config import FORUM_BASE, XF_LOGIN, XF_PASS
+except Exception:
+    FORUM_BASE = ""
+    XF_LOGIN = ""
+    XF_PASS = ""
+
+RING_VNODES = 64
+
+log = logging.getLogger(__name__)
+
+ACCOUNT_REQUESTS = metrics.counter("forum_account_requests_total", "Forum requests by account", ("account",))
+ACCOUNT_UP = metrics.gauge("forum_account_up", "1 if the forum account is in rotation", ("account",))
+FAILOVER_TOTAL = metrics.counter("forum_account_failover_total", "URLs moved off an account with a dead session", ("account",))
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+def shard_key(url: str) -> str:
+    """Страницы одной темы (page-N) закрепляются за одним аккаунтом."""
+    return re.sub(r"page-\d+/?$", "", url.split("#", 1)[0]).rstrip("/")
+
+
+class RateBudget:
+    """Token bucket: rps запросов/с, всплеск до burst. rps <= 0 — без лимита."""
+
+    def __init__(self, rps: float = 0, burst: float = 0):
+        self.rps = float(rps or 0)
+        self.burst = float(burst or max(1.0, self.rps))
+        self._tokens = self.burst
+        self._ts = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rps <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._ts) * self.rps)
+                self._ts = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rps
+            time.sleep(wait)
+
+
+class ForumAccount:
+    def __init__(self, name: str, session: requests.Session, login: str = "", password: str = "",
+                 rps: float = 0, posting: bool = False):
+        self.name = name
+        self.session = session
+        self.sessions = SessionManager(session, login, password, name=name)
+        self.budget = RateBudget(rps)
+        self.posting = posting
+        self.down_until = 0.0
+        session.hooks["response"].append(self._observe)
+        ACCOUNT_UP.set(1, account=name)
+
+    def _observe(self, r, *args, **kwargs):
+        # hook обязан вернуть None, иначе requests подменит ответ
+        self.sessions.observe(r)
+
+    @property
+    def up(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def status(self) -> Dict:
+        st = self.sessions.status()
+        st.update(name=self.name, up=self.up, posting=self.posting, rps=self.budget.rps)
+        return st
+
+
+def _cookie_domain() -> Optional[str]:
+    try:
+        return FORUM_BASE.replace("https://", "").replace("http://", "").split("/")[0].split(":")[0] or None
+    except Exception:
+        return None
+
+
+def make_session(headers: Dict, cookies: Dict[str, str]) -> requests.Session:
+    s = requests.Session()
+    s.headers.update(headers)
+    domain = _cookie_domain()
+    for k, v in cookies.items():
+        if not v:
+            continue
+        try:
+            s.cookies.set(k, v, domain=domain)
+        except Exception:
+            s.cookies.set(k, v)
+    return s
+
+
+class AccountPool:
+    def __init__(self, accounts: List[ForumAccount]):
+        if not accounts:
+            raise ValueError("AccountPool needs at least one account")
+        self.accounts = accounts
+        self.posting = next((a for a in accounts if a.posting), accounts[0])
+        self._ring = sorted(
+            ((_hash(f"{a.name}#{i}"), a) for a in accounts for i in range(RING_VNODES)),
+            key=lambda x: x[0],
+        )
+        self._keys = [h for h, _ in self._ring]
+
+    @classmethod
+    def from_config(cls, main_session: requests.Session, extra: Iterable[Dict] = None) -> "AccountPool":
+        """main_session — сессия трекера (основной аккаунт, он же для постинга)."""
+        accounts = [ForumAccount("main", main_session, XF_LOGIN, XF_PASS,
+                                 rps=FORUM_ACCOUNT_RPS, posting=True)]
+        headers = dict(main_session.headers)
+        for i, cfg in enumerate(FORUM_ACCOUNTS if extra is None else extra):
+            try:
+                name = str(cfg.get("name") or f"acc{i + 1}")
+                cookies = {k: cfg.get(k, "") for k in ("xf_user", "xf_session", "xf_tfa_trust", "xf_csrf")}
+                accounts.append(ForumAccount(
+                    name, make_session(headers, cookies),
+                    cfg.get("login", ""), cfg.get("password", ""),
+                    rps=cfg.get("rps", FORUM_ACCOUNT_RPS),
+                ))
+            except Exception:
+                log.exception("bad FORUM_ACCOUNTS entry #%d", i)
+        if len(accounts) > 1:
+            log.info("forum account pool: %s", ", ".join(a.name for a in accounts))
+        return cls(accounts)
+
+    def __iter__(self):
+        return iter(self.accounts)
+
+    def __len__(self):
+        return len(self.accounts)
+
+    def pick(self, url: str) -> ForumAccount:
+        """Первый живой аккаунт по кольцу от хеша ссылки; если живых нет — владелец."""
+        if len(self.accounts) == 1:
+            return self.accounts[0]
+        start = bisect.bisect(self._keys, _hash(shard_key(url)))
+        for j in range(len(self._ring)):
+            acc = self._ring[(start + j) % len(self._ring)][1]
+            if acc.up:
+                return acc
+        return self._ring[start % len(self._ring)][1]
+
+    def fail(self, acc: ForumAccount, seconds: float = RELOGIN_BACKOFF):
+        """Сессия аккаунта мертва и перелогин не помог — выводим из ротации."""
+        if len(self.accounts) == 1:
+            return
+        acc.down_until = time.monotonic() + seconds
+        ACCOUNT_UP.set(0, account=acc.name)
+        FAILOVER_TOTAL.inc(account=acc.name)
+        log.warning("forum account %s is down for %ss, its URLs fail over", acc.name, seconds)
+
+    def shard(self, urls: Iterable[str]) -> Dict[ForumAccount, List[str]]:
+        out: Dict[ForumAccount, List[str]] = {}
+        for u in urls:
+            out.setdefault(self.pick(u), []).append(u)
+        for a in self.accounts:
+            ACCOUNT_UP.set(1 if a.up else 0, account=a.name)
+        return out
+
+    def status(self) -> List[Dict]:
+        return [a.status() for a in self.accounts]
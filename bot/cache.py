@@ -0,0 +1,110 @@
+
+"""
+Потокобезопасный LRU-кэш с TTL и singleflight.
+
+Записи старше ttl не отдаются через get(), но остаются в кэше до
+вытеснения по LRU — их можно достать через get_entry() (например, чтобы
+отдать устаревшее значение и обновить его в фоне).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    def __init__(self, maxsize: int = 256, ttl: float = 300.0):
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = float(ttl)
+        self._data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default=None):
+        """Свежее значение (моложе ttl) или default."""
+        entry = self.get_entry(key)
+        if entry is None or entry[1] > self.ttl:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return entry[0]
+
+    def get_entry(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """(value, age_sec) без проверки ttl, либо None."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            self._data.move_to_end(key)
+            value, stored = item
+            return value, time.monotonic() - stored
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return item[0] if item else default
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self.get_entry(key)
+        return entry is not None and entry[1] <= self.ttl
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Один вызов fn на ключ: пока он идёт, остальные вызовы с тем же ключом
+    ждут и получают его результат (или его исключение).
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """(результат, shared): shared=True — результат чужого вызова."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.value, False
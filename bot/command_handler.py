@@ -2,11 +2,11 @@
 from __future__ import annotations
 
 import re
-import traceback
+import logging
 import sqlite3
 import os
 import json
-from bs4 import BeautifulSoup
+import threading
 from typing import List, Tuple, Optional, Dict
 
 # локальные импорты
@@ -15,16 +15,19 @@ from .storage import (
     add_warn, get_warns, clear_warns,
     add_ban, remove_ban, is_banned, update_last
 )
-from .deepseek_ai import ask_ai
 from .permissions import is_admin
-from .utils import normalize_url, detect_type
-from .forum_tracker import ForumTracker, parse_forum_topics, parse_thread_posts
+from .utils import normalize_url, detect_type, make_soup
+from .forum_tracker import ForumTracker
+from .page_cache import PAGE_CACHE_TTL
+from .scheduler import INTERACTIVE, lane as forum_lane
+from .profiles import ProfileCache, parse_member_profile
+from . import metrics, storage
 from config import FORUM_BASE
 
 # путь к БД (для stats)
 DB = os.path.join(os.path.dirname(os.path.dirname(__file__)), "bot_data.db")
 
-# папка для JSON шаблонов
+# старый JSON с шаблонами (только для миграции в БД)
 TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
 TEMPLATES_FILE = os.path.join(TEMPLATES_DIR, "templates.json")
 
@@ -41,6 +44,26 @@ REACTIONS = {
     "🏆 Лучший": 10
 }
 
+# команды, у которых есть своя метка в command_seconds (остальное -> "other")
+KNOWN_COMMANDS = frozenset((
+    "/track", "/debugtopics", "/debugcheck", "/untrack", "/list", "/check",
+    "/checkfa", "/ai", "/otvet", "/debug_otvet", "/debug_forum", "/tlist",
+    "/tlistall", "/checkcookies", "/fast", "/testproxy", "/reaction",
+    "/addsh", "/removesh", "/shablon", "/profile", "/checkpr",
+    "/kick", "/ban", "/unban", "/mute", "/unmute",
+    "/warn", "/warns", "/clearwarns", "/stats", "/help", "/profile_cycle",
+))
+
+log = logging.getLogger(__name__)
+
+COMMAND_SECONDS = metrics.histogram(
+    "command_seconds", "Command handler latency per command", ("command",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+# /ai: ответ отправляется в VK кусками примерно такого размера по мере генерации
+AI_FLUSH_CHARS = 700
+
 #-------------УТИЛИТЫ /FAST---------
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 
@@ -64,13 +87,6 @@ PREFIX_CHANGE_URL = (
 )
 
 
-def load_fast_rules():
-    path = os.path.join(FAST_DATA_DIR, "fast_rules.json")
-
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-
 def get_last_post(posts):
     if not posts:
         return None
@@ -78,7 +94,7 @@ def get_last_post(posts):
 
 
 def parse_fast_nickname(html):
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
 
     el = soup.select_one(
         'dl.pairs.pairs--columns.pairs--fixedSmall.'
@@ -117,106 +133,101 @@ def detect_decision(text, rules):
 
 
 
-# ----------------- Утилиты шаблонов (JSON) -----------------
-def load_fast_rules():
-    with open(os.path.join(FAST_DATA_DIR, "fast_rules.json"), "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def load_fast_status():
-    with open(os.path.join(FAST_DATA_DIR, "fast_status.json"), "r", encoding="utf-8") as f:
-        return json.load(f)
+# ----------------- Данные /fast (JSON) -----------------
+_json_cache: Dict[str, Tuple[float, object]] = {}
 
 
-def _ensure_templates_file():
-    if not os.path.exists(TEMPLATES_DIR):
-        try:
-            os.makedirs(TEMPLATES_DIR, exist_ok=True)
-        except Exception:
-            pass
-    if not os.path.exists(TEMPLATES_FILE):
-        try:
-            with open(TEMPLATES_FILE, "w", encoding="utf-8") as f:
-                json.dump({}, f, ensure_ascii=False, indent=2)
-        except Exception:
-            pass
+def _load_json_cached(name: str):
+    """data/<name>: читается при первом /fast и перечитывается только при изменении файла."""
+    path = os.path.join(FAST_DATA_DIR, name)
+    mtime = os.path.getmtime(path)
+    cached = _json_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    _json_cache[path] = (mtime, data)
+    return data
 
+def load_fast_rules():
+    return _load_json_cached("fast_rules.json")
 
-def load_templates() -> Dict[str, Dict[str, str]]:
-    _ensure_templates_file()
-    try:
-        with open(TEMPLATES_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            if isinstance(data, dict):
-                return data
-    except Exception:
-        pass
-    return {}
+def load_fast_status():
+    return _load_json_cached("fast_status.json")
 
 
-def save_templates(data: Dict[str, Dict[str, str]]) -> bool:
-    _ensure_templates_file()
+# ----------------- Утилиты шаблонов -----------------
+# Шаблоны хранятся в bot_data.db (storage.chat_templates); data/templates.json
+# переносится туда один раз при старте (migrate_templates_json).
+def add_template_for_peer(peer_id: int, name: str, text: str) -> bool:
     try:
-        with open(TEMPLATES_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        storage.add_template(peer_id, name, text)
         return True
     except Exception:
+        log.exception("add_template failed")
         return False
 
 
-def add_template_for_peer(peer_id: int, name: str, text: str) -> bool:
-    data = load_templates()
-    key = str(peer_id)
-    if key not in data:
-        data[key] = {}
-    data[key][name] = text
-    return save_templates(data)
-
-
 def remove_template_for_peer(peer_id: int, name: str) -> bool:
-    data = load_templates()
-    key = str(peer_id)
-    if key in data and name in data[key]:
-        del data[key][name]
-        # если пусто — удалить ключ
-        if not data[key]:
-            del data[key]
-        return save_templates(data)
-    return False
+    try:
+        return storage.remove_template(peer_id, name)
+    except Exception:
+        log.exception("remove_template failed")
+        return False
 
 
 def get_template(peer_id: int, name: str) -> Optional[str]:
-    data = load_templates()
-    key = str(peer_id)
-    if key in data:
-        return data[key].get(name)
-    return None
+    return storage.get_template(peer_id, name)
 
 
 def list_templates(peer_id: int) -> List[str]:
-    data = load_templates()
-    key = str(peer_id)
-    if key in data:
-        return list(data[key].keys())
-    return []
+    return storage.list_templates(peer_id)
 
 
 
 class CommandHandler:
-    def __init__(self, vk):
+    def __init__(self, vk, tracker=None):
         self.vk = vk
+        # трекер из main.py; если не передан — создаётся при первом обращении
+        self._tracker = tracker
+        self._tracker_lock = threading.Lock()
 
         try:
-            # основной корректный запуск трекера
-            self.tracker = ForumTracker(vk)
-        except Exception as e:
-            print(f"[TRACKER INIT ERROR] {e}")
-            # если не удалось — не создаём трекер вообще
-            self.tracker = None
+            n = storage.migrate_templates_json(TEMPLATES_FILE)
+            if n:
+                log.info("templates migrated from %s: %d", TEMPLATES_FILE, n)
+        except Exception:
+            log.exception("templates migration failed")
 
         self._last_msg = None
+        # /profile и /checkpr: кэш по id участника
+        self.profiles = ProfileCache(self._parse_profile)
 
   
+    @property
+    def tracker(self):
+        if self._tracker is None:
+            with self._tracker_lock:
+                if self._tracker is None:
+                    try:
+                        self._tracker = ForumTracker(self.vk)
+                    except Exception as e:
+                        log.error("[TRACKER INIT ERROR] %s", e)
+        return self._tracker
+
+    @tracker.setter
+    def tracker(self, value):
+        self._tracker = value
+
     def handle(self, text: str, peer_id: int, user_id: int):
+        words = (text or "").split(maxsplit=1)
+        cmd = words[0].lower() if words else ""
+        with COMMAND_SECONDS.time(command=cmd if cmd in KNOWN_COMMANDS else "other"):
+            # запросы к форуму из команды обгоняют очередь фонового опроса
+            with forum_lane(INTERACTIVE):
+                return self._handle(text, peer_id, user_id)
+
+    def _handle(self, text: str, peer_id: int, user_id: int):
         try:
             txt = (text or "").strip()
             if not txt:
@@ -282,7 +293,7 @@ class CommandHandler:
             if cmd == "/fast":
                 return self.cmd_fast(peer_id, parts)
 
-            if cmd == "testproxy":
+            if cmd == "/testproxy":
                 return self.cmd_testproxy(peer_id, parts)
 
 
@@ -308,7 +319,7 @@ class CommandHandler:
             # --- админ команды ---
             admin_cmds = (
                 "/kick", "/ban", "/unban", "/mute", "/unmute",
-                "/warn", "/warns", "/clearwarns", "/stats"
+                "/warn", "/warns", "/clearwarns", "/stats", "/profile_cycle"
             )
             if cmd in admin_cmds and not is_admin(getattr(self.vk, 'api', None), peer_id, user_id):
                 self.vk.send(peer_id, "❌ У вас нет прав для этой команды.")
@@ -323,6 +334,7 @@ class CommandHandler:
             if cmd == "/warns": return self.cmd_warns(peer_id, parts)
             if cmd == "/clearwarns": return self.cmd_clearwarns(peer_id, parts)
             if cmd == "/stats": return self.cmd_stats(peer_id)
+            if cmd == "/profile_cycle": return self.cmd_profile_cycle(peer_id, parts)
             if cmd == "/help": return self.cmd_help(peer_id)
 
             
@@ -333,7 +345,7 @@ class CommandHandler:
                 self.vk.send(peer_id, f"Ошибка: {e}")
             except Exception:
                 pass
-            traceback.print_exc()
+            log.exception("command %r failed", text)
 
    
     def cmd_debug_otvet(self, peer_id, parts):
@@ -351,10 +363,37 @@ class CommandHandler:
             r = self.tracker.check_cookies()
         except Exception as e:
             return self.vk.send(peer_id, f"Ошибка check_cookies: {e}")
+        sess = r.get("session") or {}
+        accounts = r.get("accounts") or []
+        pool = ""
+        if len(accounts) > 1:
+            pool = "Аккаунты:\n" + "".join(
+                f"• {a['name']}: {'в ротации' if a['up'] else 'выведен'}, вход={a['logged_in']}, "
+                f"{a['uptime_s']} с, перелогинов {a['relogins']}\n"
+                for a in accounts
+            )
+        worker = r.get("worker")
+        if worker:
+            pool += (f"Воркер {worker['worker_id']}: шардов {worker['shards']}/{worker['total']}, "
+                     f"живых воркеров {worker['alive']}\n")
+        for h in r.get("throttle") or []:
+            pool += (f"Форум {h['host']}: цепь {h['state']}"
+                     f"{(' ещё ' + str(h['open_for_s']) + ' с') if h['state'] == 'open' else ''}, "
+                     f"лимит {h['limit']} (в полёте {h['inflight']}), ошибок подряд {h['fails']}"
+                     f"{(', ' + h['reason']) if h['reason'] else ''}\n")
+        light = r.get("light")
+        if light:
+            pool += "Лёгкий опрос: " + ", ".join(f"{k} {'вкл' if v else 'выкл'}" for k, v in light.items()) + "\n"
+        sched = r.get("scheduler")
+        if sched and sched.get("rps"):
+            pool += f"Бюджет: {sched['rps']} зап/с, очередь {sched['queued']}\n"
         msg = (
             "🔍 Проверка cookies\n"
             f"Статус: {r.get('status')}\n"
-            f"Авторизация: {r.get('logged_in')}\n\n"
+            f"Авторизация: {r.get('logged_in')}\n"
+            f"Сессия: {sess.get('uptime_s', 0)} с без разлогина, перелогинов: {sess.get('relogins', 0)}"
+            f"{(', ошибка: ' + sess['last_error']) if sess.get('last_error') else ''}\n"
+            f"{pool}\n"
             f"Cookies:\n{r.get('cookies_sent')}\n\n"
             f"HTML:\n{r.get('html_sample')}"
         )
@@ -405,22 +444,10 @@ class CommandHandler:
 
         
             elif typ == "forum":
-                html = self.tracker.fetch_html(clean_url)
-                topics = parse_forum_topics(html, clean_url)
+                topics = self.tracker.fetch_topics(clean_url, newest_only=True)
                 if topics:
-            
-                    sortable = []
-                    for t in topics:
-                        dt = t.get("date") or ""
-                        tid = int(t.get("tid", 0))
-                        sortable.append((dt, tid, t))
-                    
-                    sortable.sort(key=lambda x: (x[0], x[1]))
-
-                    last_topic = sortable[-1][2]
-                    last_tid = sortable[-1][1]
-                    last_date = sortable[-1][0]
-
+                    last_tid = topics[0].tid
+                    last_date = topics[0].created
                     latest = f"{last_tid};;{last_date}"
 
         except Exception:
@@ -467,8 +494,18 @@ class CommandHandler:
     def cmd_testproxy(self, peer_id, parts):
         """
         /testproxy <proxy>
+        /testproxy — состояние пула прокси (FORUM_PROXIES)
         """
         if len(parts) < 2:
+            pool = self.tracker.proxies.status() if self.tracker else []
+            if pool:
+                return self.vk.send(peer_id, "🌐 Пул прокси:\n" + "\n".join(
+                    f"{'🟢' if p['up'] else '🔴'} {p['proxy']}: "
+                    f"{p['latency_ms'] if p['latency_ms'] is not None else '—'} мс, "
+                    f"успех {round(p['success'] * 100)}%"
+                    f"{(' — ' + p['reason']) if not p['up'] and p['reason'] else ''}"
+                    for p in pool
+                ))
             return self.vk.send(
                 peer_id,
                 "Использование:\n/testproxy ip:port\n/testproxy user:pass@ip:port"
@@ -564,20 +601,16 @@ class CommandHandler:
 
         rules = load_fast_rules()
 
-    # ───────── Загружаем тему
-        html = self.tracker.fetch_html(url)
+    # ───────── Загружаем тему (через общий кэш страниц)
+        html = self.tracker.fetch_html(url, max_stale=PAGE_CACHE_TTL)
         if not html:
             return self.vk.send(
                 peer_id,
                 "❌ Не удалось загрузить тему."
             )
 
-    # ───────── Все посты (последняя страница)
-        posts = parse_thread_posts(
-            html,
-            url,
-            self.tracker.session
-        )
+    # ───────── Последний пост темы (первая страница — из того же кэша)
+        posts = self.tracker.fetch_posts_since(url, max_stale=PAGE_CACHE_TTL)
 
         if not posts:
             return self.vk.send(
@@ -671,10 +704,34 @@ class CommandHandler:
     def cmd_ai(self, peer_id, parts):
         if len(parts) < 2:
             return self.vk.send(peer_id, "Использование: /ai <текст>")
+        prompt = " ".join(parts[1:])
+        # не держим поток longpoll, пока модель генерирует ответ
+        threading.Thread(target=self._ai_worker, args=(peer_id, prompt), daemon=True).start()
+
+    def _ai_worker(self, peer_id, prompt):
+        # клиент DeepSeek грузится только при первом /ai
+        from .deepseek_ai import ask_ai_stream
+
+        buf = ""
         try:
-            ans = ask_ai(parts[1])
-            self.vk.send(peer_id, ans)
+            for chunk in ask_ai_stream(prompt):
+                buf += chunk
+                if len(buf) < AI_FLUSH_CHARS:
+                    continue
+                # режем по границе абзаца/предложения, хвост копим дальше
+                cut = max(buf.rfind("\n", AI_FLUSH_CHARS // 2), buf.rfind(". ", AI_FLUSH_CHARS // 2))
+                if cut <= 0:
+                    cut = len(buf)
+                else:
+                    cut += 1
+                self.vk.send(peer_id, buf[:cut].strip())
+                buf = buf[cut:]
+            if buf.strip():
+                self._send_long(peer_id, buf.strip())
         except Exception as e:
+            # уже пришедший текст отдаём как есть, ошибку — отдельным сообщением
+            if buf.strip():
+                self._send_long(peer_id, buf.strip())
             self.vk.send(peer_id, f"AI Ошибка: {e}")
 
 
@@ -709,12 +766,11 @@ class CommandHandler:
         if "forums" not in url.lower():
             return self.vk.send(peer_id, "❌ Это не ссылка на раздел.")
         try:
-            html = self.tracker.fetch_html(url)
+            topics = self.tracker.fetch_topics(url)
         except Exception as e:
             return self.vk.send(peer_id, f"Ошибка fetch_html: {e}")
-        if not html:
+        if topics is None:
             return self.vk.send(peer_id, "❌ Не удалось загрузить HTML раздела.")
-        topics = parse_forum_topics(html, url)
         if not topics:
             return self.vk.send(peer_id, "⚠️ Темы не найдены.")
         # берём первые 5 (в порядке parse)
@@ -733,12 +789,11 @@ class CommandHandler:
         if "forums" not in url.lower():
             return self.vk.send(peer_id, "❌ Это не ссылка на раздел.")
         try:
-            html = self.tracker.fetch_html(url)
+            topics = self.tracker.fetch_topics(url)
         except Exception as e:
             return self.vk.send(peer_id, f"Ошибка fetch_html: {e}")
-        if not html:
+        if topics is None:
             return self.vk.send(peer_id, "❌ Не удалось загрузить раздел.")
-        topics = parse_forum_topics(html, url)
         if not topics:
             return self.vk.send(peer_id, "⚠️ Темы не найдены.")
         # отправляем чанками
@@ -834,15 +889,21 @@ class CommandHandler:
 
     def cmd_profile(self, peer_id, parts):
         """
-        /profile <url> - показать информацию о профиле (если доступно)
+        /profile <url|id> [url|id ...] - показать информацию о профиле (если доступно)
         """
         if len(parts) < 2:
-            return self.vk.send(peer_id, "Использование: /profile <profile_url>")
-        url = normalize_url(parts[1])
-        if not url.startswith(FORUM_BASE):
-            return self.vk.send(peer_id, f"❌ URL должен быть на {FORUM_BASE}")
+            return self.vk.send(peer_id, "Использование: /profile <profile_url|id> [ещё ...]")
+        targets = " ".join(parts[1:]).split()
+        for t in targets:
+            if not t.isdigit() and not normalize_url(t).startswith(FORUM_BASE):
+                return self.vk.send(peer_id, f"❌ URL должен быть на {FORUM_BASE}")
+        targets = [t if t.isdigit() else normalize_url(t) for t in targets]
+
+        if len(targets) > 1:
+            return self._profile_batch(peer_id, targets)
+
         try:
-            info = self._parse_profile(url)
+            info = self.profiles.get(targets[0])
             if not info:
                 return self.vk.send(peer_id, "⚠️ Не удалось извлечь информацию о профиле.")
             lines = [
@@ -862,6 +923,19 @@ class CommandHandler:
         except Exception as e:
             self.vk.send(peer_id, f"Ошибка profile: {e}")
 
+    def _profile_batch(self, peer_id, targets):
+        lines = [f"👥 Профили ({len(targets)}):\n"]
+        for target, info in self.profiles.get_many(targets):
+            if not info or info.get("error"):
+                lines.append(f"⚠️ {target} — не удалось загрузить")
+                continue
+            lines.append(
+                f"👤 {info['username']} (ID {info['user_id']}) • "
+                f"📝 {info['message_count']} • ⭐ {info['reactions']} • "
+                f"⏱ {info['last_activity']}"
+            )
+        self._send_long(peer_id, "\n".join(lines))
+
     def cmd_checkpr(self, peer_id, parts):
         """
         /checkpr <url> - посмотреть чужой профиль (как /profile, алиас)
@@ -869,75 +943,10 @@ class CommandHandler:
         return self.cmd_profile(peer_id, parts)
 
     def _parse_profile(self, url: str):
-        from bs4 import BeautifulSoup
-        import re
-
         html = self.tracker.fetch_html(url)
         if not html:
             return None
-
-        soup = BeautifulSoup(html, "html.parser")
-
-        data = {
-            "username": "—",
-            "user_id": "—",
-            "registered": "—",
-            "message_count": "—",
-            "reactions": "—",
-            "points": "—",
-            "last_activity": "—",
-            "about": ""
-        }
-
-    # 👤 Ник
-        name = soup.select_one(".username, h1.p-title-value")
-        if name:
-            data["username"] = name.get_text(strip=True)
-
-    # 🆔 ID
-        m = re.search(r"\.(\d+)/?$", url)
-        if m:
-            data["user_id"] = m.group(1)
-
-    # 📊 Статы (сообщения, реакции, баллы)
-        for dl in soup.select(".memberHeader-stats dl"):
-            dt = dl.find("dt")
-            dd = dl.find("dd")
-            if not dt or not dd:
-                continue
-
-            key = dt.get_text(strip=True).lower()
-            val = dd.get_text(strip=True).replace(",", "")
-
-            if "сообщ" in key:
-                data["message_count"] = val
-            elif "реакц" in key:
-                data["reactions"] = val
-            elif "балл" in key:
-                data["points"] = val
-
-    # 📅 Регистрация
-        reg = soup.find("dt", string="Регистрация")
-        if reg:
-            time_el = reg.find_next("time")
-            if time_el:
-                data["registered"] = time_el.get_text(strip=True)
-
-    # ⏱ Активность
-        act = soup.find("dt", string="Активность")
-        if act:
-            time_el = act.find_next("time")
-            if time_el:
-                data["last_activity"] = time_el.get_text(strip=True)
-
-    # ✉️ О себе
-        about = soup.select_one(
-            ".memberHeader-blurb, .p-profile-about, .userAbout"
-        )
-        if about:
-            data["about"] = about.get_text(" ", strip=True)[:800]
-
-        return data
+        return parse_member_profile(html, url)
 
 
   
@@ -1029,6 +1038,24 @@ class CommandHandler:
         except Exception as e:
             self.vk.send(peer_id, f"Ошибка stats: {e}")
 
+    def cmd_profile_cycle(self, peer_id, parts):
+        from .profiling import PROFILE_MAX_CYCLES, format_report
+
+        try:
+            n = int(parts[1]) if len(parts) > 1 else 1
+        except ValueError:
+            return self.vk.send(peer_id, f"Использование: /profile_cycle [1-{PROFILE_MAX_CYCLES}]")
+        if not self.tracker:
+            return self.vk.send(peer_id, "❌ Трекер не запущен.")
+        armed = self.tracker.profiler.arm(
+            n, source=f"vk:{peer_id}",
+            on_done=lambda report: self._send_long(peer_id, format_report(report)),
+        )
+        if not armed:
+            return self.vk.send(peer_id, "⏳ Профилирование уже идёт, дождитесь результата.")
+        self.vk.send(peer_id, f"🔬 Следующие {armed} цикл(ов) трекера пройдут под профилировщиком. "
+                              "Результат придёт сюда и будет в /debug панели.")
+
     def cmd_help(self, peer_id):
         self.vk.send(
             peer_id,
@@ -1036,10 +1063,10 @@ class CommandHandler:
             "/tlist <url>\n/tlistall <url>\n"
             "/otvet <url> <text>\n/ai <text>\n"
             "/addsh <name> <text>\n/removesh <name>\n/shablon <name> <thread_url>\n"
-            "/profile <url>\n/checkpr <url>\n"
+            "/profile <url|id> [...]\n/checkpr <url>\n"
             "/kick <id>\n/ban <id>\n/unban <id>\n"
             "/mute <id> <sec>\n/unmute <id>\n"
-            "/warn <id>\n/warns <id>\n/clearwarns <id>\n/stats"
+            "/warn <id>\n/warns <id>\n/clearwarns <id>\n/stats\n/profile_cycle [N]"
         )
         
     def cmd_debugtopics(self, peer_id, parts):
@@ -1051,14 +1078,12 @@ class CommandHandler:
             return self.vk.send(peer_id, "❌ Это не ссылка на раздел.")
 
         try:
-            html = self.tracker.fetch_html(url)
+            topics = self.tracker.fetch_topics(url)
         except Exception as e:
             return self.vk.send(peer_id, f"Ошибка fetch_html: {e}")
 
-        if not html:
+        if topics is None:
             return self.vk.send(peer_id, "❌ Не удалось загрузить страницу.")
-
-        topics = parse_forum_topics(html, url)
         if not topics:
             return self.vk.send(peer_id, "⚠️ Темы не найдены.")
 
@@ -1088,10 +1113,9 @@ class CommandHandler:
             return self.vk.send(peer_id, f"❌ Только {FORUM_BASE}")
 
         try:
-            html = self.tracker.fetch_html(url)
-            if not html:
+            topics = self.tracker.fetch_topics(url)
+            if topics is None:
                 return self.vk.send(peer_id, "❌ Не удалось загрузить страницу (check cookies).")
-            topics = parse_forum_topics(html, url)
             if not topics:
                 return self.vk.send(peer_id, "⚠️ Темы не найдены.")
        
@@ -1160,7 +1184,8 @@ class CommandHandler:
             url = payload["url"]
             reaction_id = payload["reaction_id"]
 
-            ok, msg = self.tracker.react_to_post(url, reaction_id)
+            with forum_lane(INTERACTIVE):
+                ok, msg = self.tracker.react_to_post(url, reaction_id)
 
             if ok:
                 self.vk.edit_message(
@@ -1207,6 +1232,6 @@ class CommandHandler:
             try:
                 self.vk.send(peer_id, ch)
             except Exception:
-                print(f"[CMD] Failed to send chunk to {peer_id}")
+                log.warning("[CMD] Failed to send chunk to %s", peer_id)
 
 
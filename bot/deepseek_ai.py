@@ -1,26 +1,178 @@
 
 import os
+import json
+import queue
+import re
+import threading
+from typing import Iterator, Optional
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from .cache import TTLCache
 
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY", "")
 DEEPSEEK_API_URL = os.getenv("DEEPSEEK_API_URL", "https://api.deepseek.example/v1/chat")
+DEEPSEEK_MODEL = os.getenv("DEEPSEEK_MODEL", "gpt-like")
+
+# одновременных запросов к API, размер и время жизни кэша ответов
+DEEPSEEK_MAX_CONCURRENCY = int(os.getenv("DEEPSEEK_MAX_CONCURRENCY", "4"))
+DEEPSEEK_CACHE_SIZE = int(os.getenv("DEEPSEEK_CACHE_SIZE", "256"))
+DEEPSEEK_CACHE_TTL = float(os.getenv("DEEPSEEK_CACHE_TTL", "600"))
+
+
+def normalize_prompt(prompt: str) -> str:
+    return re.sub(r"\s+", " ", (prompt or "").strip().lower())
+
+
+def _extract_answer(data) -> str:
+    if isinstance(data, dict):
+        if data.get("choices"):
+            return data["choices"][0].get("message", {}).get("content", "") or str(data)
+        if data.get("result"):
+            return str(data.get("result"))
+    return str(data)
+
+
+class AIError(Exception):
+    """Ошибка запроса к API (очередь переполнена, сеть, HTTP, обрыв ответа)."""
+
+
+class DeepSeekClient:
+    """
+    Клиент DeepSeek: одна keep-alive сессия, ограничение параллельности,
+    потоковые ответы (SSE) и LRU+TTL кэш по нормализованному промпту.
+    """
+
+    def __init__(self, api_key: str = DEEPSEEK_API_KEY, api_url: str = DEEPSEEK_API_URL,
+                 model: str = DEEPSEEK_MODEL, max_concurrency: int = DEEPSEEK_MAX_CONCURRENCY,
+                 cache_size: int = DEEPSEEK_CACHE_SIZE, cache_ttl: float = DEEPSEEK_CACHE_TTL,
+                 timeout=(5, 60), queue_timeout: float = 30):
+        self.api_key = api_key
+        self.api_url = api_url
+        self.model = model
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, max_concurrency))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        })
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+
+    def _payload(self, prompt: str, max_tokens: int, stream: bool) -> dict:
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+            "stream": stream,
+        }
+
+    def ask(self, prompt: str, max_tokens: int = 512) -> str:
+        try:
+            return "".join(self.stream(prompt, max_tokens))
+        except AIError as e:
+            return f"AI error: {e}"
+
+    def stream(self, prompt: str, max_tokens: int = 512) -> Iterator[str]:
+        """
+        Отдаёт ответ кусками по мере прихода. Ответ из кэша отдаётся целиком
+        одним куском. Ошибка (в том числе посреди ответа) — исключение AIError:
+        уже отданные куски остаются у вызывающего, об ошибке он сообщает сам.
+        HTTP читает отдельный поток: слот занят только на время чтения
+        ответа API, а не пока вызывающий отправляет куски дальше.
+        """
+        if not self.api_key:
+            yield "AI not configured. Set DEEPSEEK_API_KEY env var."
+            return
+
+        key = (normalize_prompt(prompt), max_tokens)
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise AIError("слишком много запросов, попробуйте позже")
+        chunks = queue.Queue()
+        threading.Thread(target=self._read, args=(prompt, max_tokens, key, chunks),
+                         name="deepseek-read", daemon=True).start()
+        while True:
+            item = chunks.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise AIError(str(item)) from item
+            yield item
+
+    def _read(self, prompt: str, max_tokens: int, key, out: "queue.Queue"):
+        """Читает ответ API в out (куски, затем None или исключение) и освобождает слот."""
+        parts = []
+        try:
+            r = self.session.post(self.api_url, json=self._payload(prompt, max_tokens, True),
+                                  timeout=self.timeout, stream=True)
+            with r:
+                r.raise_for_status()
+                if "text/event-stream" not in r.headers.get("Content-Type", ""):
+                    # API не умеет stream — обычный JSON-ответ
+                    text = _extract_answer(r.json())
+                    parts.append(text)
+                    out.put(text)
+                else:
+                    # text/* без charset requests считает latin-1
+                    if "charset" not in r.headers.get("Content-Type", ""):
+                        r.encoding = "utf-8"
+                    for chunk in self._iter_sse(r):
+                        parts.append(chunk)
+                        out.put(chunk)
+        except Exception as e:
+            out.put(e)
+            return
+        finally:
+            self._slots.release()
+
+        answer = "".join(parts)
+        if answer:
+            self.cache.set(key, answer)
+        out.put(None)
+
+    @staticmethod
+    def _iter_sse(r) -> Iterator[str]:
+        for line in r.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            try:
+                obj = json.loads(data)
+                delta = obj["choices"][0].get("delta") or obj["choices"][0].get("message") or {}
+            except Exception:
+                continue
+            text = delta.get("content")
+            if text:
+                yield text
+
+
+_client: Optional[DeepSeekClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> DeepSeekClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = DeepSeekClient()
+        return _client
+
 
 def ask_ai(prompt: str, max_tokens: int = 512) -> str:
-    if not DEEPSEEK_API_KEY:
-        return "AI not configured. Set DEEPSEEK_API_KEY env var."
-    try:
-        payload = {"model": "gpt-like", "messages": [{"role": "user", "content": prompt}], "max_tokens": max_tokens}
-        headers = {"Authorization": f"Bearer {DEEPSEEK_API_KEY}", "Content-Type": "application/json"}
-        r = requests.post(DEEPSEEK_API_URL, json=payload, headers=headers, timeout=20)
-        r.raise_for_status()
-        data = r.json()
-
-        if isinstance(data, dict):
-         
-            if data.get("choices"):
-                return data["choices"][0].get("message", {}).get("content", "") or str(data)
-            if data.get("result"):
-                return str(data.get("result"))
-        return str(data)
-    except Exception as e:
-        return f"AI error: {e}"
+    return get_client().ask(prompt, max_tokens)
+
+
+def ask_ai_stream(prompt: str, max_tokens: int = 512) -> Iterator[str]:
+    return get_client().stream(prompt, max_tokens)
@@ -1,21 +1,35 @@
 
 from __future__ import annotations
 
+import hashlib
+import os
 import re
+import logging
 import threading
 import time
 import requests
-from bs4 import BeautifulSoup
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Tuple
 from urllib.parse import urljoin
 from .utils import (
     normalize_url, detect_type,
-    extract_thread_id, extract_post_id_from_article,
-    log_info, log_error
+    extract_thread_id, extract_forum_id, make_soup, slice_regions,
 )
-from .storage import list_all_tracks, update_last
-import traceback
-import datetime
+from .records import Page, Post, Topic, post_id_of, int_id
+from .render import RenderCache, template_for
+from .storage import list_all_tracks, update_last_many, outbox_put
+from . import metrics
+from .profiling import CycleProfiler
+from .session import page_logged_in
+from .accounts import AccountPool, ForumAccount, ACCOUNT_REQUESTS
+from .proxies import ProxyPool
+from .parse_pool import ParsePool
+from .page_cache import PageCache, PAGE_CACHE_TTL
+from .cache import SingleFlight
+from .scheduler import BACKGROUND, POSTING, ForumScheduler, lane
+from .throttle import ForumThrottle, is_challenge, overloaded, retry_after
+from .light_poll import (LATEST, PARTIAL, PARTIAL_HEADERS, PARTIAL_PARAMS, LightEndpoints,
+                         latest_url, parse_latest_location, partial_content, partial_logged_in)
+from collections import deque, OrderedDict
 
 UA = (
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -43,21 +57,43 @@ try:
 except Exception:
     POLL = DEFAULT_POLL
 
+# сколько последних циклов check_all хранить для графика в панели
+CYCLE_HISTORY = 120
 
-def debug(msg: str):
-    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    try:
-        log_info(str(msg))
-    except Exception:
-        print(f"[{now}] [DEBUG] {msg}")
+# догон пропущенных постов: сколько страниц темы листать назад,
+# до скольких новых постов слать по одному (дальше — одна сводка)
+CATCHUP_MAX_PAGES = 5
+CATCHUP_SINGLE_MAX = 3
 
+# разобранные страницы по хешу байтов: та же страница -> тот же результат без разбора
+PARSE_MEMO_SIZE = 2048
 
-def warn(msg: str):
-    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    try:
-        log_error(str(msg))
-    except Exception:
-        print(f"[{now}] [WARNING] {msg}")
+# лента whats-new/posts вместо N страниц разделов: включается, когда
+# отслеживаемых разделов не меньше FEED_MIN_SECTIONS (0 — выключено)
+FEED_MIN_SECTIONS = int(os.getenv("FEED_MIN_SECTIONS", "3"))
+FEED_MAX_PAGES = int(os.getenv("FEED_MAX_PAGES", "3"))
+
+FETCH_SECONDS = metrics.histogram("forum_fetch_seconds", "Latency of forum page fetches")
+FETCH_TOTAL = metrics.counter("forum_fetch_total", "Forum page fetches by HTTP status", ("status",))
+PARSE_SECONDS = metrics.histogram("forum_parse_seconds", "Time spent in forum page parsers", ("parser",))
+PROCESS_TOTAL = metrics.counter("tracker_process_total", "_process_url outcomes", ("outcome",))
+CYCLE_SECONDS = metrics.histogram("tracker_cycle_seconds", "Duration of check_all cycles",
+                                  buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 60, 120))
+PARSE_MEMO = metrics.counter("forum_parse_memo_total", "Parse results reused for byte-identical pages", ("result",))
+URLS_DUE = metrics.gauge("tracker_urls_due", "Tracked URLs in the last check_all cycle")
+SLICE_TOTAL = metrics.counter("forum_parse_slice_total", "Pages parsed from the sliced list region vs. in full", ("parser", "result"))
+FEED_SECTIONS = metrics.counter("tracker_feed_sections_total", "Forum sections resolved from the whats-new feed", ("result",))
+
+
+log = logging.getLogger(__name__)
+
+
+def debug(msg: str, *args):
+    log.debug(msg, *args)
+
+
+def warn(msg: str, *args):
+    log.warning(msg, *args)
 
 
 
@@ -73,98 +109,150 @@ def build_cookies() -> dict:
 
 
 
-def parse_thread_posts(html: str, page_url: str, session=None) -> List[Dict]:
+# контейнеры, которые нужны парсерам (плюс блок pageNav) — остальное не разбирается
+SLICE_REGIONS = {
+    "thread": ("js-replyNewMessageContainer",),
+    "forum": ("structItemContainer",),
+    "whats_new": ("structItemContainer",),
+}
+
+
+# в процессе пула исходы нарезки копятся здесь и уходят родителю (_pool_call)
+_slices = threading.local()
+
+
+def _count_slice(parser: str, result: str):
+    seen = getattr(_slices, "seen", None)
+    if seen is not None:
+        seen.append((parser, result))
+    else:
+        SLICE_TOTAL.inc(parser=parser, result=result)
+
+
+def _pool_call(fn, *args, **kwargs):
+    """Запуск парсера в процессе пула: (результат, [(parser, sliced|full)]) — счётчики пула родитель не видит."""
+    _slices.seen = []
+    try:
+        return fn(*args, **kwargs), _slices.seen
+    finally:
+        _slices.seen = None
+
+
+def _page_soup(html, parser: str, found: Callable, encoding: str = None):
     """
-    Улучшенный парсер постов с поддержкой ПОСЛЕДНЕЙ страницы темы.
+    soup только по нужному куску страницы (slice_regions); если маркеров нет
+    или в куске found(soup) ничего не нашёл — разбор всей страницы.
+    html может быть bytes: тогда декодируется только вырезанный кусок.
     """
-    soup = BeautifulSoup(html or "", "html.parser")
+    part = slice_regions(html, SLICE_REGIONS[parser])
+    if part is not None:
+        soup = make_soup(part, encoding=encoding)
+        if found(soup):
+            _count_slice(parser, "sliced")
+            return soup
+    _count_slice(parser, "full")
+    return make_soup(html, encoding=encoding)
 
- 
+
+_CHARSET = re.compile(r"charset=[\"']?([\w.:-]+)", re.I)
+
+
+def response_encoding(r) -> Optional[str]:
+    """Кодировка из Content-Type без угадывания (r.encoding у requests для text/* — ISO-8859-1)."""
+    m = _CHARSET.search(r.headers.get("Content-Type", "") or "")
+    return m.group(1) if m else None
+
+
+def _has_posts(soup) -> bool:
+    return soup.select_one("article.message-body, article[data-post-id], article[id^='js-post-']") is not None
+
+
+def _has_topics(soup) -> bool:
+    return soup.select_one(".structItem") is not None
+
+
+def _last_page_num(soup) -> int:
     last_page = 1
-    pages = soup.select(".pageNav-page")
-    for p in pages:
+    for p in soup.select(".pageNav-page"):
         try:
-            num = int(p.get_text(strip=True))
-            last_page = max(last_page, num)
+            last_page = max(last_page, int(p.get_text(strip=True)))
         except:
             pass
+    return last_page
 
-    
-    if last_page > 1 and session:
-        if page_url.endswith("/"):
-            url_last = f"{page_url}page-{last_page}/"
-        else:
-            url_last = f"{page_url}/page-{last_page}/"
 
-        try:
-            r = session.get(url_last, timeout=15)
-            if r.status_code == 200:
-                html = r.text
-                soup = BeautifulSoup(html or "", "html.parser")
-        except Exception as e:
-            warn(f"Error loading last page: {e}")
+def thread_page_url(page_url: str, page: int) -> str:
+    if page <= 1:
+        return page_url
+    if page_url.endswith("/"):
+        return f"{page_url}page-{page}/"
+    return f"{page_url}/page-{page}/"
 
 
-  
+def _post_nodes(soup) -> List[tuple]:
+    """[(id, article.message-body)] в порядке страницы; только id, без текста."""
     posts_nodes = soup.select("article.message-body.js-selectToQuote")
     if not posts_nodes:
         posts_nodes = soup.select("article[data-post-id], article[id^='js-post-']")
 
-    out: List[Dict] = []
-
+    nodes = []
     for msg in posts_nodes:
         try:
-            pid = (
-                msg.get("data-lb-id")
-                or msg.get("data-id")
-                or msg.get("data-post-id")
-                or ""
-            )
-
-            if not pid:
-                art = msg.find_parent("article")
-                if art:
-                    pid = extract_post_id_from_article(str(art))
+            nodes.append((post_id_of(msg), msg))
+        except Exception as e:
+            warn("parse_thread_posts error: %s", e)
+    return nodes
 
-            pid = str(pid)
 
-            user = (
-                msg.find_previous("a", class_="username")
-                or msg.find_previous("h4", class_="message-name")
-                or msg.find_previous("span", class_="username")
-            )
-            author = user.get_text(strip=True) if user else "Неизвестно"
+def _newer_than(nodes, since_id) -> List[tuple]:
+    floor = int_id(since_id) or 0
+    return [(pid, msg) for pid, msg in nodes if (int_id(pid) or 0) > floor]
 
-            t = msg.find_previous("time")
-            date = t.get("datetime") if t else ""
 
-            body = (
-                msg.select_one("div.bbWrapper")
-                or msg.select_one("div.message-userContent.lbContainer.js-lbContainer")
-                or msg.select_one("div.message-userContent")
-            )
+def _materialize_posts(nodes, page_url: str) -> List[Post]:
+    out: List[Post] = []
+    base = page_url.rstrip("/")
+    for pid, msg in nodes:
+        try:
+            out.append(Post(pid, f"{base}#post-{pid}", msg).materialize())
+        except Exception as e:
+            warn("parse_thread_posts error: %s", e)
+            continue
+    return out
 
-            text = body.get_text("\n", strip=True) if body else msg.get_text("\n", strip=True)
-            text = re.sub(r"\n{2,}", "\n", text).strip()
 
-            link = page_url.rstrip("/") + f"#post-{pid}"
+@metrics.timed(PARSE_SECONDS, parser="thread")
+def parse_thread_posts(html: str, page_url: str, session=None,
+                       since_id=None, newest_only: bool = False) -> List[Post]:
+    """
+    Улучшенный парсер постов с поддержкой ПОСЛЕДНЕЙ страницы темы.
 
-            out.append({
-                "id": pid,
-                "author": author,
-                "date": date,
-                "text": text,
-                "link": link,
-            })
+    У всех постов страницы читается только id; автор, дата и текст
+    собираются лишь для тех, что нужны вызывающему:
+      newest_only=True — только последний пост;
+      since_id=N       — только посты с id > N.
+    """
+    soup = _page_soup(html, "thread", _has_posts)
 
+    last_page = _last_page_num(soup)
+    if last_page > 1 and session:
+        try:
+            r = session.get(thread_page_url(page_url, last_page), timeout=15)
+            if r.status_code == 200:
+                soup = _page_soup(r.content, "thread", _has_posts, response_encoding(r))
         except Exception as e:
-            warn(f"parse_thread_posts error: {e}")
-            continue
+            warn("Error loading last page: %s", e)
 
-    return out
+    nodes = _post_nodes(soup)
+    if newest_only:
+        nodes = nodes[-1:]
+    elif since_id is not None:
+        nodes = _newer_than(nodes, since_id)
+
+    return _materialize_posts(nodes, page_url)
 
 def parse_fast_nickname(html: str) -> str:
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
 
     el = soup.select_one(
         ".pairs.pairs--columns.pairs--fixedSmall.pairs--customField dd"
@@ -178,102 +266,200 @@ def parse_fast_nickname(html: str) -> str:
 
 
 
-def parse_forum_topics(html: str, base_url: str) -> List[Dict]:
+def _topic_tid(it, classes) -> Optional[int]:
+    # TID из класса js-threadListItem-XXXXX
+    for c in classes:
+        if isinstance(c, str) and c.startswith("js-threadListItem-"):
+            return int_id(c.replace("js-threadListItem-", ""))
+
+    # fallback через ссылку в title блоке
+    title_a = it.select_one(".structItem-title a[data-preview-url], .structItem-title a[href]")
+    if title_a:
+        href_tmp = title_a.get("href", "")
+        m = re.search(r"\.(\d+)/?$", href_tmp)
+        if not m:
+            m = re.search(r"/threads/[^/]+\.(\d+)/?", href_tmp)
+        if m:
+            return int(m.group(1))
+    return None
+
+
+def _build_topic(it, classes, tid: int, created: str, base_url: str) -> Optional[Topic]:
+    # Заголовок: берем превью-ссылку (реальный заголовок), иначе labelLink
+    title_el = it.select_one(".structItem-title a[data-preview-url]") or \
+               it.select_one(".structItem-title a.labelLink") or \
+               it.select_one(".structItem-title a[href]")
+
+    if not title_el:
+        return None
+
+    title = title_el.get_text(" ", strip=True)
+    href = title_el.get("href", "") or ""
+
+    # Убираем prefix_id
+    href = href.split("&prefix_id")[0].split("?prefix_id")[0]
+
+    # Абсолютный URL
+    if href.startswith("http"):
+        url = href
+    else:
+        root = base_url.split("/index.php")[0]
+        url = urljoin(root + "/", href.lstrip("/"))
+
+    # Нормализуем в формат threads/<slug>.<tid>/
+    m_full = re.search(r"/threads/([^/]+)\.(\d+)/?", url)
+    if m_full:
+        slug = m_full.group(1)
+        tid = int(m_full.group(2))
+        url = f"https://forum.matrp.ru/threads/{slug}.{tid}/"
+    else:
+        url = f"https://forum.matrp.ru/threads/topic.{tid}/"
+
+    auth_el = it.select_one(".structItem-minor .username, a.username")
+    author = auth_el.get_text(strip=True) if auth_el else "Unknown"
+
+    pinned = any("pinned" in c or "sticky" in c or "structItem--pinned" in c for c in classes)
+
+    return Topic(tid, title, author, url, pinned, created)
+
+
+@metrics.timed(PARSE_SECONDS, parser="forum")
+def parse_forum_topics(html, base_url: str, since_tid=None,
+                       newest_only: bool = False, encoding: str = None) -> List[Topic]:
     """
-    Надёжный парсер тем MatRP. Возвращает список словарей с полями:
+    Надёжный парсер тем MatRP. Возвращает список Topic с полями:
       tid, title, author, url, pinned, created
+
+    У всех блоков читаются только tid и дата; заголовок, ссылка и автор
+    собираются для выбранных тем:
+      newest_only=True — одна самая свежая по (created, tid);
+      since_tid=N      — темы с tid > N.
     """
-    soup = BeautifulSoup(html or "", "html.parser")
-    topics: List[Dict] = []
+    soup = _page_soup(html, "forum", _has_topics, encoding)
+    topics: List[Topic] = []
 
     blocks = soup.select(".structItem")
     if not blocks:
         return topics
 
     seen = set()
+    heads = []
 
     for it in blocks:
         try:
-            tid = None
             classes = it.get("class", []) or []
+            tid = _topic_tid(it, classes)
+            if not tid or tid in seen:
+                continue
+            seen.add(tid)
 
-            # TID из класса js-threadListItem-XXXXX
-            for c in classes:
-                if isinstance(c, str) and c.startswith("js-threadListItem-"):
-                    tid = c.replace("js-threadListItem-", "")
-                    break
+            time_el = it.select_one("time")
+            created = time_el.get("datetime", "").strip() if time_el else ""
+            heads.append((created, tid, it, classes))
+        except Exception:
+            continue
 
-            # fallback через ссылку в title блоке
-            title_a = it.select_one(".structItem-title a[data-preview-url], .structItem-title a[href]")
-            if not tid and title_a:
-                href_tmp = title_a.get("href", "")
-                m = re.search(r"\.(\d+)/?$", href_tmp)
-                if not m:
-                    m = re.search(r"/threads/[^/]+\.(\d+)/?", href_tmp)
-                if m:
-                    tid = m.group(1)
-
-            if not tid:
-                continue
+    if newest_only:
+        # самая свежая тема; если её блок битый — следующая по свежести
+        heads.sort(key=lambda h: (h[0] or "", h[1]), reverse=True)
+        for created, tid, it, classes in heads:
+            try:
+                t = _build_topic(it, classes, tid, created, base_url)
+            except Exception:
+                t = None
+            if t:
+                return [t]
+        return topics
 
-            tid = int(tid)
-            if tid in seen:
-                continue
-            seen.add(tid)
+    if since_tid is not None:
+        floor = int_id(since_tid) or 0
+        heads = [h for h in heads if h[1] > floor]
 
-            # Заголовок: берем превью-ссылку (реальный заголовок), иначе labelLink
-            title_el = it.select_one(".structItem-title a[data-preview-url]") or \
-                       it.select_one(".structItem-title a.labelLink") or \
-                       it.select_one(".structItem-title a[href]")
+    for created, tid, it, classes in heads:
+        try:
+            t = _build_topic(it, classes, tid, created, base_url)
+        except Exception:
+            continue
+        if t:
+            topics.append(t)
 
-            if not title_el:
-                continue
+    return topics
 
-            title = title_el.get_text(" ", strip=True)
-            href = title_el.get("href", "") or ""
 
-            # Убираем prefix_id
-            href = href.split("&prefix_id")[0].split("?prefix_id")[0]
 
-            # Абсолютный URL
-            if href.startswith("http"):
-                url = href
-            else:
-                root = base_url.split("/index.php")[0]
-                url = urljoin(root + "/", href.lstrip("/"))
-
-            # Нормализуем в формат threads/<slug>.<tid>/
-            m_full = re.search(r"/threads/([^/]+)\.(\d+)/?", url)
-            if m_full:
-                slug = m_full.group(1)
-                tid = int(m_full.group(2))
-                url = f"https://forum.matrp.ru/threads/{slug}.{tid}/"
-            else:
-                url = f"https://forum.matrp.ru/threads/topic.{tid}/"
 
-         
-            auth_el = it.select_one(".structItem-minor .username, a.username")
-            author = auth_el.get_text(strip=True) if auth_el else "Unknown"
 
-          
-            pinned = any("pinned" in c or "sticky" in c or "structItem--pinned" in c for c in classes)
+@metrics.timed(PARSE_SECONDS, parser="whats_new")
+def parse_whats_new(html, base_url: str, encoding: str = None):
+    """
+    Лента whats-new/posts: [(forum_id, Topic, дата последнего поста)] и
+    ссылка на следующую страницу (или ""). Темы без ссылки на раздел
+    пропускаются — их не к чему привязать.
+    """
+    soup = _page_soup(html, "whats_new", _has_topics, encoding)
+    items = []
+    seen = set()
+    for it in soup.select(".structItem"):
+        try:
+            classes = it.get("class", []) or []
+            tid = _topic_tid(it, classes)
+            if not tid or tid in seen:
+                continue
+            seen.add(tid)
 
-            
-            time_el = it.select_one("time")
-            created = time_el.get("datetime", "").strip() if time_el else ""
+            forum_a = it.select_one(".structItem-parts a[href*='forums'], .structItem-minor a[href*='forums']")
+            fid = extract_forum_id(forum_a.get("href", "")) if forum_a else ""
+            if not fid:
+                continue
+
+            start_el = it.select_one(".structItem-startDate time") or it.select_one("time")
+            created = start_el.get("datetime", "").strip() if start_el else ""
+            latest_el = it.select_one(".structItem-latestDate")
+            if latest_el is not None and latest_el.name != "time":
+                latest_el = latest_el.find("time")
+            latest = latest_el.get("datetime", "").strip() if latest_el else created
 
-            topics.append({
-                "tid": tid,
-                "title": title,
-                "author": author,
-                "url": url,
-                "pinned": pinned,
-                "created": created
-            })
+            t = _build_topic(it, classes, tid, created, base_url)
+            if t:
+                items.append((fid, t, latest))
         except Exception:
             continue
 
-    return topics
+    nxt = soup.select_one("a.pageNav-jump--next")
+    next_url = urljoin(base_url, nxt.get("href", "")) if nxt and nxt.get("href") else ""
+    return items, next_url
+
+
+# -----------------------------------------------------------------
+# Компактные версии парсеров для пула процессов (bot/parse_pool.py):
+# на вход байты страницы и кодировка, на выход кортежи — дешёвые для
+# pickle, без узлов bs4.
+# -----------------------------------------------------------------
+def _topic_tuple(t: Topic) -> tuple:
+    return (t.tid, t.title, t.author, t.url, t.pinned, t.created)
+
+
+@metrics.timed(PARSE_SECONDS, parser="thread")
+def parse_thread_page(html, page_url: str, since_id=None, encoding: str = None) -> tuple:
+    """
+    (последняя страница темы, постов на странице, новых постов, [(id, author, date, text)]).
+    В списке посты с id > since_id, а если таких нет (или since_id не задан) — последний.
+    """
+    soup = _page_soup(html, "thread", _has_posts, encoding)
+    nodes = _post_nodes(soup)
+    fresh = nodes[-1:] if since_id is None else _newer_than(nodes, since_id)
+    n_fresh = len(fresh) if since_id is not None else 0
+    posts = [Post(pid, "", msg) for pid, msg in (fresh or nodes[-1:])]
+    return _last_page_num(soup), len(nodes), n_fresh, [(p.id, p.author, p.date, p.text) for p in posts]
+
+
+def parse_forum_page(html, base_url: str, newest_only: bool = False, encoding: str = None) -> List[tuple]:
+    return [_topic_tuple(t) for t in parse_forum_topics(html, base_url, newest_only=newest_only, encoding=encoding)]
+
+
+def parse_feed_page(html, base_url: str, encoding: str = None) -> tuple:
+    items, next_url = parse_whats_new(html, base_url, encoding)
+    return [(fid, _topic_tuple(t), latest) for fid, t, latest in items], next_url
 
 
 
@@ -281,9 +467,11 @@ def parse_forum_topics(html: str, base_url: str) -> List[Dict]:
 
 class ForumTracker:
 
-    def test_forum_proxy(proxy: str, timeout=15) -> dict:
+    @staticmethod
+    def test_forum_proxy(proxy: str, timeout=15, url: str = None) -> dict:
         """
         proxy format: ip:port OR user:pass@ip:port
+        url — страница для проверки (по умолчанию главная форума)
         """
 
         proxies = {
@@ -298,7 +486,7 @@ class ForumTracker:
 
         try:
             r = requests.get(
-                FORUM_BASE,
+                url or FORUM_BASE,
                 headers=headers,
                 proxies=proxies,
                 timeout=timeout,
@@ -310,7 +498,7 @@ class ForumTracker:
                     "reason": f"HTTP {r.status_code}",
             }
 
-            soup = BeautifulSoup(r.text, "html.parser")
+            soup = make_soup(r.text)
 
         # Проверка, что это реально XenForo форум
             if not (
@@ -338,9 +526,29 @@ class ForumTracker:
     def __init__(self, *args):
         self.interval = POLL
         self._running = False
-        self._keepalive_running = True
         self.vk = None
 
+        # метрики циклов check_all (для панели)
+        self._local = threading.local()
+        self._cycle_lock = threading.Lock()
+        self._metrics_callback = None
+        self.metrics_history = deque(maxlen=CYCLE_HISTORY)
+        # /profile_cycle: следующие N циклов под cProfile + tracemalloc
+        self.profiler = CycleProfiler()
+        self.render_cache = RenderCache()
+        # PARSE_WORKERS > 0: страницы цикла разбираются в пуле процессов
+        self.parser = ParsePool()
+        self._parsed: "OrderedDict[tuple, object]" = OrderedDict()
+        self._parsed_lock = threading.Lock()
+        self._no_vk_logged = False
+        self._parse_flight = SingleFlight()
+        # общий кэш страниц + слияние одновременных запросов (команды и цикл)
+        self.pages = PageCache(self._fetch_page)
+        # дата последнего поста, до которой лента whats-new уже прочитана
+        self._feed_seen_until = ""
+        # режим воркеров (bot/workers.py): свои шарды ссылок, уведомления — в outbox
+        self.worker = None
+
         self.session = requests.Session()
         self.session.headers.update({
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/143.0.0.0 Safari/537.36",
@@ -394,49 +602,277 @@ class ForumTracker:
         else:
             raise TypeError("ForumTracker expected (vk) or (XF_USER, XF_TFA_TRUST, XF_SESSION, vk)")
 
-    
+        # self.session — основной аккаунт (постинг); чтение шардируется по пулу.
+        # У каждой сессии свой SessionManager (разлогин + перелогин).
+        self.accounts = AccountPool.from_config(self.session)
+        self.sessions = self.accounts.posting.sessions
+        for acc in self.accounts:
+            acc.session.hooks["response"].append(self._on_response)
+        # опрос может идти через пул прокси (FORUM_PROXIES); постинг — всегда напрямую
+        self.proxies = ProxyPool.from_config(probe=self.test_forum_proxy)
+        # общий бюджет запросов с полосами: команды > постинг > фоновый опрос
+        self.scheduler = ForumScheduler()
+        # AIMD по параллельности + circuit breaker по хосту (429/5xx/Cloudflare/таймауты)
+        self.throttle = ForumThrottle()
+        # threads/<id>/latest и JSON-партиалы вместо полных страниц в цикле
+        self.light = LightEndpoints()
+
         if hasattr(self.vk, "set_trigger"):
             try:
                 self.vk.set_trigger(self.force_check)
             except Exception:
                 pass
 
-    
-        threading.Thread(target=self._keepalive_loop, daemon=True).start()
 
     # -----------------------------------------------------------------
     # Утилиты доступа к сети через session
     # -----------------------------------------------------------------
-    def fetch_html(self, url: str, timeout: int = 15) -> str:
+    def fetch_page(self, url: str, timeout: int = 15, account: ForumAccount = None,
+                   max_stale: float = 0) -> Optional[Page]:
+        """
+        Страница через общий кэш (PageCache): одновременные запросы одной
+        ссылки — один GET; max_stale > 0 — годится страница из кэша не старше
+        max_stale секунд (для команд). С явным account (постинг) — мимо кэша.
+        Возвращает Page (байты + объявленная кодировка) или None.
+        """
+        if not url:
+            return None
+        if account is not None:
+            return self._fetch_page(url, timeout, account)
+        return self.pages.get(url, max_stale, fetch=lambda: self._fetch_page(url, timeout))
+
+    def _fetch_page(self, url: str, timeout: int = 15, account: ForumAccount = None) -> Optional[Page]:
         """
-        Загрузить HTML используя self.session (с куками).
+        Загрузить страницу сессией аккаунта, за которым закреплена ссылка
+        (account — явно, например основной для постинга). Если сессия
+        умерла и перелогин не помог, ссылка переезжает на следующий аккаунт.
+        Без явного account запрос идёт через пул прокси, если он задан.
         """
         if not url:
-            return ""
+            return None
 
         try:
             url = normalize_url(url)
         except Exception:
             pass
 
-        debug(f"[FETCH] GET {url}")
+        acc = account or self.accounts.pick(url)
+        proxied = account is None
+        for attempt in (1, 2):
+            r = self._get(acc, url, timeout, proxied)
+            if r is None:
+                return None
+            if r.status_code == 200:
+                if page_logged_in(r.content) is False:
+                    if acc.sessions.relogin():
+                        debug("[FETCH] retry after re-login: %s", url)
+                        r = self._get(acc, url, timeout, proxied)
+                        if r is None:
+                            return None
+                        if r.status_code != 200:
+                            warn("HTTP %s for %s", r.status_code, url)
+                            return None
+                    elif account is None and attempt == 1 and len(self.accounts) > 1:
+                        self.accounts.fail(acc)
+                        nxt = self.accounts.pick(url)
+                        if nxt is not acc:
+                            acc = nxt
+                            continue
+                return Page(url, r.content, response_encoding(r))
+            if r.status_code != 304:
+                warn("HTTP %s for %s", r.status_code, url)
+            return None
+        return None
+
+    def fetch_html(self, url: str, timeout: int = 15, account: ForumAccount = None,
+                   max_stale: float = 0) -> str:
+        """То же, что fetch_page, но строкой (для команд); "" при ошибке."""
+        page = self.fetch_page(url, timeout, account, max_stale)
+        return page.text if page else ""
+
+    def probe_latest(self, url: str) -> Optional[Tuple[int, int]]:
+        """(id последнего поста, номер последней страницы) по редиректу threads/<id>/latest; None — не вышло."""
+        if not self.light.usable(LATEST):
+            return None
+        r = self._get(self.accounts.pick(url), latest_url(url), 15, proxied=True, allow_redirects=False)
+        if r is None:
+            # сеть или разомкнутая цепь — не вина эндпоинта
+            return None
+        location = r.headers.get("Location", "") if r.is_redirect else ""
+        if "login" in location:
+            return None
+        found = parse_latest_location(location)
+        if found is None:
+            self.light.miss(LATEST)
+        return found
+
+    def fetch_partial(self, url: str) -> Optional[Page]:
+        """Страница темы через _xfResponseType=json (без обвязки); не вышло — полная страница."""
+        if self.light.usable(PARTIAL):
+            acc = self.accounts.pick(url)
+            r = self._get(acc, url, 15, proxied=True, params=PARTIAL_PARAMS, headers=PARTIAL_HEADERS)
+            if r is not None and r.status_code == 200 and partial_logged_in(r.content) is False:
+                # гостевой партиал: как в _fetch_page — перелогин и ещё раз,
+                # не помогло — полная страница (там же переезд на другой аккаунт)
+                r = None
+                if acc.sessions.relogin():
+                    debug("[FETCH] partial retry after re-login: %s", url)
+                    r = self._get(acc, url, 15, proxied=True, params=PARTIAL_PARAMS, headers=PARTIAL_HEADERS)
+                    if r is not None and r.status_code == 200 and partial_logged_in(r.content) is False:
+                        r = None
+                if r is None:
+                    self.light.miss(PARTIAL)
+                    return self.fetch_page(url)
+            content = partial_content(r.content) if r is not None and r.status_code == 200 else None
+            if content is not None:
+                self.light.ok(PARTIAL)
+                return Page(url, content, "utf-8")
+            if r is not None:
+                self.light.miss(PARTIAL)
+        return self.fetch_page(url)
+
+    def _enter(self, host, min_lane: int = BACKGROUND) -> Optional[str]:
+        """Токен планировщика и слот хоста; None — цепь разомкнута, токен возвращён."""
+        self.scheduler.acquire(min_lane)
+        slot = host.enter()
+        if slot is None:
+            self.scheduler.refund()
+            self._cycle_add("breaker_skips")
+        return slot
+
+    def _get(self, acc: ForumAccount, url: str, timeout: int, proxied: bool = False, **kwargs):
+        """
+        GET сессией аккаунта; proxied — через прокси из пула, при его ошибке ещё
+        раз через другой (или напрямую). Пока цепь хоста разомкнута — None без запроса.
+        kwargs — в session.get (allow_redirects, params, headers).
+        """
+        host = self.throttle.host(url)
+        px = None
+        for attempt in (1, 2):
+            slot = self._enter(host)
+            if slot is None:
+                debug("[FETCH] circuit %s for %s, skip %s", host.state, host.host, url)
+                return None
+            r = None
+            # итог для leave(): (ok, latency, Retry-After, причина); по умолчанию — нейтральный
+            outcome = (None, None, None, "")
+            try:
+                acc.budget.acquire()
+                px = self.proxies.pick(exclude=px) if proxied else None
+                debug("[FETCH] GET %s (%s%s)", url, acc.name, f" via {px.label}" if px else "")
+                ACCOUNT_REQUESTS.inc(account=acc.name)
+                t0 = time.perf_counter()
+                try:
+                    if px is not None:
+                        r = acc.session.get(url, timeout=timeout, proxies=px.proxies, **kwargs)
+                    else:
+                        r = acc.session.get(url, timeout=timeout, **kwargs)
+                except Exception as e:
+                    FETCH_SECONDS.observe(time.perf_counter() - t0)
+                    FETCH_TOTAL.inc(status="error")
+                    self._count_request("error")
+                    warn("fetch_html error: %s", e)
+                    # обрыв через прокси — проблема прокси, а не форума
+                    outcome = (None if px is not None else False, None, None, type(e).__name__)
+                else:
+                    dt = time.perf_counter() - t0
+                    FETCH_SECONDS.observe(dt)
+                    FETCH_TOTAL.inc(status=getattr(r, "status_code", "ERR"))
+                    self._count_request(r.status_code)
+                    debug("[FETCH] %s -> %s", url, getattr(r, "status_code", "ERR"))
+                    bad = overloaded(r)
+                    reason = f"HTTP {r.status_code}" + (" challenge" if is_challenge(r) else "")
+                    outcome = (not bad, dt, retry_after(r) if bad else None, reason)
+            finally:
+                host.leave(slot, *outcome)
+            if r is None:
+                if px is None:
+                    return None
+                self.proxies.report(px, False, reason=outcome[3])
+                continue
+            if px is not None:
+                # 403/429/5xx через прокси — скорее всего бан/перегрузка самого прокси
+                px_bad = r.status_code in (403, 407, 429) or r.status_code >= 500
+                self.proxies.report(px, not px_bad, outcome[1], f"HTTP {r.status_code}")
+            return r
+        return None
+
+    def _post(self, url: str, min_lane: int = BACKGROUND, **kwargs):
+        """
+        POST основной сессией через те же ворота, что и _get: токен, слот хоста,
+        circuit breaker и Retry-After. Цепь разомкнута — RuntimeError без запроса.
+        """
+        host = self.throttle.host(url)
+        slot = self._enter(host, min_lane)
+        if slot is None:
+            raise RuntimeError(f"форум недоступен: цепь {host.host} {host.state}")
+        outcome = (None, None, None, "")
         try:
-            r = self.session.get(url, timeout=timeout)
-            debug(f"[FETCH] {url} -> {getattr(r, 'status_code', 'ERR')}")
-            if getattr(r, "status_code", 0) == 200:
-                return r.text
-            warn(f"HTTP {getattr(r, 'status_code', 'ERR')} for {url}")
-            return ""
-        except Exception as e:
-            warn(f"fetch_html error: {e}")
-            return ""
+            t0 = time.perf_counter()
+            try:
+                r = self.session.post(url, **kwargs)
+            except Exception as e:
+                outcome = (False, None, None, type(e).__name__)
+                raise
+            dt = time.perf_counter() - t0
+            bad = overloaded(r)
+            reason = f"HTTP {r.status_code}" + (" challenge" if is_challenge(r) else "")
+            outcome = (not bad, dt, retry_after(r) if bad else None, reason)
+            return r
+        finally:
+            host.leave(slot, *outcome)
 
-    def get(self, url: str, **kwargs):
+    # -----------------------------------------------------------------
+    # Метрики циклов
+    # -----------------------------------------------------------------
+    def set_metrics_callback(self, fn: Callable[[Dict], None]):
+        """fn(metrics) вызывается после каждого цикла check_all."""
+        self._metrics_callback = fn
+
+    def _cycle_add(self, key: str, n: float = 1):
+        cycle = getattr(self._local, "cycle", None)
+        if cycle is not None:
+            with self._cycle_lock:
+                cycle[key] = cycle.get(key, 0) + n
+
+    def _count_request(self, status):
+        """
+        Исход запроса цикла — только здесь (из _get): ошибка сети или HTTP >= 400 —
+        errors, 304 — not_modified. _process_url по last_status решает, что
+        сказать про пустую страницу, и сам ничего не досчитывает.
+        """
+        self._local.last_status = status
+        if status == 304:
+            self._cycle_add("not_modified")
+        elif status == "error" or status >= 400:
+            self._cycle_add("errors")
+
+    def _on_response(self, r, *args, **kwargs):
+        """response-hook сессий: байты для текущего цикла (исходы — _count_request)."""
+        if getattr(self._local, "cycle", None) is None:
+            return
         try:
-            return self.session.get(url, **kwargs)
-        except Exception as e:
-            warn(f"session.get error: {e}")
-            raise
+            self._cycle_add("bytes", len(r.content or b""))
+        except Exception:
+            pass
+
+    def _publish_cycle(self, cycle: Dict):
+        self.metrics_history.append(cycle)
+        log.info("[CYCLE] %s ms, urls %s/%s", cycle["duration_ms"],
+                 cycle["urls_checked"], cycle["urls_due"], extra={"cycle": cycle})
+        if self._metrics_callback:
+            try:
+                self._metrics_callback(dict(cycle))
+            except Exception as e:
+                warn("metrics callback error: %s", e)
+
+    def get(self, url: str, **kwargs):
+        """GET основным аккаунтом через общий шлюз (_get); цепь разомкнута — RuntimeError."""
+        timeout = kwargs.pop("timeout", 15)
+        r = self._get(self.accounts.posting, url, timeout, **kwargs)
+        if r is None:
+            raise RuntimeError(f"forum unavailable: {url}")
+        return r
 
     def react_to_post(self, post_url: str, reaction_id: int):
         try:
@@ -453,11 +889,12 @@ class ForumTracker:
 
             data = {
                 "reaction_id": reaction_id,
-                "_xfToken": self.cookies.get("xf_csrf", "")
+                "_xfToken": self.session.cookies.get("xf_csrf", "")
             }
 
-            r = self.session.post(
+            r = self._post(
                 react_url,
+                POSTING,
                 data=data,
                 headers={
                     "referer": post_url,
@@ -479,19 +916,20 @@ class ForumTracker:
         if self._running:
             return
         self._running = True
+        self.parser.start()
+        if self.worker is not None:
+            self.worker.start()
         threading.Thread(target=self._loop, daemon=True).start()
-        try:
-            log_info(f"ForumTracker started (interval={self.interval})")
-        except Exception:
-            debug(f"ForumTracker started (interval={self.interval})")
+        self.proxies.start()
+        log.info("ForumTracker started (interval=%s)", self.interval)
 
     def stop(self):
         self._running = False
-        self._keepalive_running = False
-        try:
-            log_info("ForumTracker stopped")
-        except Exception:
-            debug("ForumTracker stopped")
+        self.proxies.stop()
+        self.parser.shutdown()
+        if self.worker is not None:
+            self.worker.stop()
+        log.info("ForumTracker stopped")
 
     def force_check(self):
         threading.Thread(target=self.check_all, daemon=True).start()
@@ -500,188 +938,469 @@ class ForumTracker:
         while self._running:
             try:
                 self.check_all()
-            except Exception as e:
-                warn(f"loop error: {e}")
-                traceback.print_exc()
+            except Exception:
+                log.exception("loop error")
             time.sleep(self.interval)
 
     def check_all(self):
+        with self.profiler.cycle():
+            return self._check_all()
+
+    def _check_all(self):
         rows = list_all_tracks()
+        if self.worker is not None:
+            rows = [r for r in rows if self.worker.owns(r[1])]
         if not rows:
             return
         by_url = {}
         for peer_id, url, typ, last_id in rows:
             by_url.setdefault(url, []).append((peer_id, typ, last_id))
-        for url, subs in by_url.items():
-            try:
-                self._process_url(url, subs)
-            except Exception as e:
-                warn(f"_process_url error for {url}: {e}")
-                traceback.print_exc()
 
-
-    def _process_url(self, url: str, subscribers):
+        started = time.time()
+        t0 = time.perf_counter()
+        cycle = {
+            "urls_due": len(by_url),
+            "urls_checked": 0,
+            "bytes": 0,
+            "parse_ms": 0.0,
+            "not_modified": 0,
+            "notifications": 0,
+            "errors": 0,
+            "feed_sections": 0,
+        }
+        self._local.cycle = cycle
+        try:
+            forums = {u: subs for u, subs in by_url.items() if detect_type(u) == "forum"}
+            resolved = set()
+            if FEED_MIN_SECTIONS and len(forums) >= FEED_MIN_SECTIONS:
+                try:
+                    resolved = self._check_feed(forums)
+                except Exception:
+                    cycle["errors"] += 1
+                    log.exception("whats-new feed error")
+                cycle["feed_sections"] = len(resolved)
+                cycle["urls_checked"] += len(resolved)
+
+            pending = [u for u in by_url if u not in resolved]
+            shards = list(self.accounts.shard(pending).values()) if len(self.accounts) > 1 else [pending]
+            if len(shards) <= 1:
+                self._run_urls(pending, by_url, cycle)
+            else:
+                # по потоку на аккаунт: бюджеты запросов у аккаунтов свои
+                threads = [threading.Thread(target=self._run_urls, args=(urls, by_url, cycle), daemon=True)
+                           for urls in shards]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+        finally:
+            self._local.cycle = None
+
+        cycle["ts"] = int(started)
+        cycle["duration_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        cycle["parse_ms"] = round(cycle["parse_ms"], 1)
+        CYCLE_SECONDS.observe(cycle["duration_ms"] / 1000)
+        URLS_DUE.set(cycle["urls_due"])
+        self._publish_cycle(cycle)
+
+
+    def fetch_whats_new(self):
+        """
+        Лента whats-new/posts по страницам, пока не дойдём до уже прочитанного
+        (или FEED_MAX_PAGES). Возвращает (items, complete) или None, если
+        ленту получить не удалось. complete=False — окно ленты могло не
+        покрыть всё, что случилось с прошлого цикла.
+        """
+        url = FORUM_BASE.rstrip("/") + "/whats-new/posts/"
+        items = []
+        complete = False
+        for _ in range(FEED_MAX_PAGES):
+            page = self.fetch_page(url)
+            if not page:
+                return None if not items else (items, False)
+            page_items, url = self._parse("whats_new", parse_feed_page, page, FORUM_BASE)
+            page_items = [(fid, Topic(*t), latest) for fid, t, latest in page_items]
+            if not page_items and not items:
+                # не та страница (редирект на логин, другая вёрстка)
+                return None
+            items.extend(page_items)
+            oldest = min((latest for _, _, latest in page_items if latest), default="")
+            if not url or (self._feed_seen_until and oldest and oldest <= self._feed_seen_until):
+                complete = True
+                break
+
+        newest = max((latest for _, _, latest in items if latest), default="")
+        if newest > self._feed_seen_until:
+            self._feed_seen_until = newest
+        return items, complete
+
+    def _check_feed(self, forums: Dict[str, list]) -> set:
+        """
+        Разделы по одной ленте whats-new: события раскладываются по forum id.
+        Возвращает ссылки, которые решены лентой; остальные грузятся как раньше.
+        """
+        feed = self.fetch_whats_new()
+        if feed is None:
+            FEED_SECTIONS.inc(len(forums), result="fallback")
+            return set()
+        items, complete = feed
+
+        by_forum: Dict[str, List[Topic]] = {}
+        for fid, topic, _ in items:
+            by_forum.setdefault(fid, []).append(topic)
+
+        resolved = set()
+        for url, subs in forums.items():
+            fid = extract_forum_id(url)
+            topics = by_forum.get(fid) if fid else None
+            if not fid or (not topics and not complete):
+                FEED_SECTIONS.inc(result="fallback")
+                continue
+            outcome = "unchanged"
+            if topics:
+                newest = max(topics, key=lambda t: (t.created or "", t.tid))
+                outcome = self._notify_forum(normalize_url(url), subs, newest)
+                if outcome == "unchanged" and not complete:
+                    # в ленте только старые темы раздела, а окно неполное
+                    FEED_SECTIONS.inc(result="fallback")
+                    continue
+            FEED_SECTIONS.inc(result="resolved")
+            PROCESS_TOTAL.inc(outcome=outcome)
+            resolved.add(url)
+        return resolved
+
+    def _run_urls(self, urls: List[str], by_url: Dict[str, list], cycle: Dict):
+        """
+        С пулом парсеров ссылки идут в 2*PARSE_WORKERS потоков: пока одни ждут
+        форум, страницы других разбираются в процессах пула.
+        """
+        n = min(len(urls), self.parser.workers * 2)
+        if n <= 1:
+            return self._run_batch(urls, by_url, cycle)
+        threads = [threading.Thread(target=self._run_batch, args=(urls[i::n], by_url, cycle), daemon=True)
+                   for i in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def _run_batch(self, urls: List[str], by_url: Dict[str, list], cycle: Dict):
+        # рабочие потоки цикла тоже в профиле /profile_cycle (в потоке цикла — ничего не делает)
+        with self.profiler.thread():
+            self._local.cycle = cycle
+            try:
+                for url in urls:
+                    try:
+                        PROCESS_TOTAL.inc(outcome=self._process_url(url, by_url[url]) or "done")
+                    except Exception:
+                        PROCESS_TOTAL.inc(outcome="error")
+                        self._cycle_add("errors")
+                        log.exception("_process_url error for %s", url)
+                    self._cycle_add("urls_checked")
+            finally:
+                self._local.cycle = None
+
+    def _process_url(self, url: str, subscribers) -> str:
+        """Проверяет одну ссылку; возвращает исход (для метрик)."""
         url = normalize_url(url)
 
         if not url.startswith(FORUM_BASE):
-            debug(f"[process] skipping non-forum url: {url}")
-            return
-
-        html = self.fetch_html(url)
-        if not html:
-            warn(f"failed to fetch: {url}")
-            return
+            debug("[process] skipping non-forum url: %s", url)
+            return "skipped"
 
         typ = detect_type(url)
+        cursors = {}
+        page_no = 1
+        partial = False
+        if typ == "thread":
+            cursors = {peer_id: int_id(last) for peer_id, _, last in subscribers}
+            known = [c for c in cursors.values() if c]
+            # у всех подписчиков есть курсор — сначала дешёвый редирект latest
+            latest = self.probe_latest(url) if known and len(known) == len(cursors) else None
+            if latest is not None:
+                latest_id, page_no = latest
+                if latest_id <= min(known):
+                    self.light.ok(LATEST, "unchanged")
+                    return "unchanged"
+                self.light.ok(LATEST, "changed")
+                partial = True
+
+        self._local.last_status = None
+        page = self.fetch_partial(thread_page_url(url, page_no)) if partial else self.fetch_page(url)
+        if not page:
+            # ошибка уже посчитана в _get (_count_request); 304 — не ошибка
+            if self._local.last_status == 304:
+                return "not_modified"
+            warn("failed to fetch: %s", url)
+            return "fetch_failed"
 
-        
         if typ == "thread":
-            posts = parse_thread_posts(html, url, self.session)
+            posts = self.fetch_posts_since(url, min(known) if known else None, page=page,
+                                           page_no=page_no, partial=partial)
             if not posts:
-                return
-
-            newest = posts[-1]
-            try:
-                newest_id = int(newest["id"])
-            except Exception:
-             
-                newest_id = newest["id"]
-
-            for peer_id, _, last in subscribers:
-                try:
-                    last_id = int(last) if last is not None else 0
-                except Exception:
-                
-                    last_id = 0
-
-                send_msg = False
-         
-                if isinstance(newest_id, int) and isinstance(last_id, int):
-                    send_msg = newest_id > last_id
+                return "empty"
+
+            newest_id = int_id(posts[-1].id)
+            index = {p.id: i for i, p in enumerate(posts)}
+            outbox = {}
+            moved = []
+            for peer_id, cursor in cursors.items():
+                if cursor:
+                    fresh = [p for p in posts if (int_id(p.id) or 0) > cursor]
                 else:
-           
-                    send_msg = str(newest["id"]) != str(last)
-
-                if send_msg:
-                    msg = (
-                        f"📝 Новый пост\n"
-                        f"👤 {newest['author']}  •  {newest['date']}\n\n"
-                        f"{(newest['text'][:1500] + '...') if len(newest['text'])>1500 else newest['text']}\n\n"
-                        f"🔗 {newest['link']}"
-                    )
-                    try:
-                        self.vk.send(peer_id, msg)
-                    except Exception as e:
-                        warn(f"vk send error (thread): {e}")
+                    # курсора нет (не удалось снять при /track) — только последний пост
+                    fresh = posts[-1:]
+                if not fresh:
+                    continue
+
+                if len(fresh) <= CATCHUP_SINGLE_MAX:
+                    for p in fresh:
+                        text = self.render_cache.render("post", p.id, template_for(peer_id, "post"), p)
+                        outbox.setdefault((index[p.id], text), []).append(peer_id)
+                else:
+                    key = (fresh[0].id, fresh[-1].id)
+                    text = self.render_cache.render("digest", key, template_for(peer_id, "digest"), fresh)
+                    outbox.setdefault((index[fresh[-1].id], text), []).append(peer_id)
+                moved.append((peer_id, newest_id if newest_id is not None else posts[-1].id))
 
-                    try:
-                        update_last(peer_id, url, str(newest_id))
-                    except Exception as e:
-                        warn(f"update_last error (thread): {e}")
+            outcome = "notified" if outbox else "unchanged"
+            self._deliver(outbox)
 
-            return
+            try:
+                update_last_many(url, moved)
+            except Exception as e:
+                warn("update_last error (thread): %s", e)
+
+            return outcome
 
         
         if typ == "forum":
-            topics = parse_forum_topics(html, url)
+            topics = self._parse("forum", parse_forum_page, page, url, True)
             if not topics:
-                return
+                return "empty"
 
+            return self._notify_forum(url, subscribers, Topic(*topics[0]))
 
-            sortable = []
-            for t in topics:
-                created = t.get("created") or ""
+        debug("[process] unknown type for %s: %s", url, typ)
+        return "unknown_type"
+
+ 
+    def _notify_forum(self, url: str, subscribers, last_topic: Topic) -> str:
+        """Сравнивает самую свежую тему раздела с курсорами подписчиков и рассылает."""
+        last_created = last_topic.created or ""
+        last_tid = last_topic.tid
+
+        outbox = {}
+        moved = []
+        for peer_id, _, last_saved in subscribers:
+            saved_tid = 0
+            saved_date = ""
+
+            if last_saved and ";;" in str(last_saved):
+                parts = str(last_saved).split(";;", 1)
                 try:
-                    tid_i = int(t.get("tid", 0))
+                    saved_tid = int(parts[0])
+                except Exception:
+                    saved_tid = 0
+                saved_date = parts[1]
+            else:
+                try:
+                    saved_tid = int(last_saved)
                 except Exception:
-                    tid_i = 0
-                sortable.append((created, tid_i, t))
-
-
-                sortable.sort(key=lambda x: (x[0] or "", x[1]))
-
-  
-                last_created, last_tid, last_topic = sortable[-1][0], sortable[-1][1], sortable[-1][2]
-
-                for peer_id, _, last_saved in subscribers:
                     saved_tid = 0
-                    saved_date = ""
 
-                    if last_saved and ";;" in str(last_saved):
-                        parts = str(last_saved).split(";;", 1)
-                        try:
-                           saved_tid = int(parts[0])
-                        except Exception:
-                           saved_tid = 0
-                        saved_date = parts[1]
-                    else:
-                        try:
-                            saved_tid = int(last_saved)
-                        except Exception:
-                            saved_tid = 0
+            is_new = False
 
-                    is_new = False
+            if last_created and saved_date:
+                try:
+                    if last_created > saved_date:
+                        is_new = True
+                except Exception:
+                    pass
 
+            if not is_new:
+                if last_tid > saved_tid:
+                    is_new = True
 
-                    if last_created and saved_date:
-                        try:
-       
-                            if last_created > saved_date:
-                                is_new = True
-                        except Exception:
-                            pass
+            if not is_new:
+                continue
 
+            text = self.render_cache.render("topic", last_tid, template_for(peer_id, "topic"), last_topic)
+            outbox.setdefault((0, text), []).append(peer_id)
+            moved.append((peer_id, f"{last_tid};;{last_created}"))
 
-                    if not is_new:
-                        if last_tid > saved_tid:
-                            is_new = True
+        self._deliver(outbox)
+        try:
+            update_last_many(url, moved)
+        except Exception as e:
+            warn("update_last error (forum): %s", e)
 
-                    if not is_new:
-                        continue
+        return "notified" if outbox else "unchanged"
 
-  
-                    msg = (
-                        "🆕 Новая тема в разделе:\n\n"
-                        f"📄 {last_topic.get('title')}\n"
-                        f"👤 {last_topic.get('author')}\n"
-                        f"⏱ {last_created}\n"
-                        f"🔗 {last_topic.get('url')}"
-                    )
-                    try:
-                        self.vk.send(peer_id, msg)
-                    except Exception as e:
-                        warn(f"vk send error (forum): {e}")
+    def _deliver(self, outbox: Dict):
+        """
+        outbox: {(порядок, текст): [peer_id, ...]}. Каждый уникальный текст
+        уходит один раз на группу бесед (send_many -> peer_ids), в порядке
+        событий, чтобы у каждой беседы посты шли по возрастанию.
+        В режиме воркеров всё уходит в общий outbox (одна транзакция).
+        Не бросает: курсоры двигаются после доставки в любом случае, иначе
+        те же посты уходили бы каждый цикл. notifications — только
+        доставленные; без VK (трекеры панели, vk=None) — ничего не шлётся.
+        """
+        if not outbox:
+            return
+        ordered = sorted(outbox.items(), key=lambda kv: kv[0][0])
+        if self.worker is not None:
+            outbox_put([(peers, text) for (_, text), peers in ordered])
+            self._cycle_add("notifications", sum(len(peers) for _, peers in ordered))
+            return
+        if self.vk is None:
+            if not self._no_vk_logged:
+                self._no_vk_logged = True
+                log.info("tracker without VK: notifications are not sent")
+            return
+        for (_, text), peers in ordered:
+            if hasattr(self.vk, "send_many"):
+                sent = self._send_counted(len(peers), self.vk.send_many, peers, text)
+            else:
+                sent = sum(self._send_counted(1, self.vk.send, peer_id, text) for peer_id in peers)
+            self._cycle_add("notifications", sent)
 
-      
-                    try:
-                        update_last(peer_id, url, f"{last_tid};;{last_created}")
-                    except Exception as e:
-                        warn(f"update_last error (forum): {e}")
+    @staticmethod
+    def _send_counted(n: int, fn, *args) -> int:
+        """Сколько из n бесед получили сообщение: результат send/send_many (None у заглушек — все), ошибка — 0."""
+        try:
+            res = fn(*args)
+        except Exception as e:
+            warn("deliver error (%d peers): %s", n, e)
+            return 0
+        return n if res is None else int(res)
 
-                return
-        debug(f"[process] unknown type for {url}: {typ}")
+    def _parse(self, parser: str, fn, page: Page, *args):
+        """
+        fn(page.content, *args, encoding=...) через пул парсеров, время — в parse_ms
+        цикла. forum_parse_seconds и forum_parse_slice_total в пуле пишутся
+        здесь (время — вместе с передачей между процессами), иначе — самим парсером. Если байты нужного куска страницы
+        (slice_regions, без шапки и сайдбаров) не изменились — прошлый
+        результат без разбора.
+        """
+        region = slice_regions(page.content, SLICE_REGIONS[parser]) if parser in SLICE_REGIONS else None
+        digest = hashlib.blake2b(region, digest_size=16).hexdigest() if region is not None else page.digest
+        key = (fn.__name__, digest, args)
+        with self._parsed_lock:
+            hit = self._parsed.get(key)
+            if hit is not None:
+                self._parsed.move_to_end(key)
+        if hit is not None:
+            PARSE_MEMO.inc(result="hit")
+            return hit
+        PARSE_MEMO.inc(result="miss")
+
+        def compute():
+            t0 = time.perf_counter()
+            try:
+                if self.parser.workers:
+                    res, slices = self.parser.run(_pool_call, fn, page.content, *args, encoding=page.encoding)
+                    for name, result in slices:
+                        SLICE_TOTAL.inc(parser=name, result=result)
+                else:
+                    res = fn(page.content, *args, encoding=page.encoding)
+                with self._parsed_lock:
+                    self._parsed[key] = res
+                    while len(self._parsed) > PARSE_MEMO_SIZE:
+                        self._parsed.popitem(last=False)
+                return res
+            finally:
+                dt = time.perf_counter() - t0
+                if self.parser.workers:
+                    PARSE_SECONDS.observe(dt, parser=parser)
+                self._cycle_add("parse_ms", dt * 1000)
+
+        # одна и та же страница, разобранная одновременно командой и циклом, — один разбор
+        res, _ = self._parse_flight.do(key, compute)
+        return res
+
+    def fetch_posts_since(self, url: str, since_id=None, page: Page = None,
+                          max_stale: float = 0, page_no: int = 1, partial: bool = False) -> List[Post]:
+        """
+        Посты темы с id > since_id по возрастанию, а если таких нет — последний.
+        Начинает с последней страницы; если на ней всё новое, листает назад,
+        пока не встретит уже доставленный пост (не дальше CATCHUP_MAX_PAGES).
+        Автор/дата/текст достаются только у новых постов (parse_thread_page).
+        page — уже загруженная страница номер page_no (после latest — сразу
+        последняя); partial — остальные страницы через JSON-партиалы.
+        """
+        def load(u):
+            return self.fetch_partial(u) if partial else self.fetch_page(u, max_stale=max_stale)
+
+        first = page or self.fetch_page(url, max_stale=max_stale)
+        if not first:
+            return []
+        page, n_nodes, n_fresh, rows = self._parse("thread", parse_thread_page, first, url, since_id)
+        page = max(page, page_no)
+
+        if page > page_no:
+            last = load(thread_page_url(url, page))
+            if last:
+                _, n_nodes, n_fresh, rows = self._parse("thread", parse_thread_page, last, url, since_id)
+        if not n_nodes:
+            return []
+
+        if since_id is not None and n_fresh:
+            seen = {r[0] for r in rows}
+            all_new = n_fresh == n_nodes
+            walked = 1
+            while all_new and page > 1 and walked < CATCHUP_MAX_PAGES:
+                page -= 1
+                walked += 1
+                prev = load(thread_page_url(url, page))
+                if not prev:
+                    break
+                _, prev_nodes, prev_n, prev_rows = self._parse("thread", parse_thread_page, prev, url, since_id)
+                prev_fresh = [r for r in prev_rows[:prev_n] if r[0] not in seen]
+                if not prev_fresh:
+                    break
+                seen.update(r[0] for r in prev_fresh)
+                rows = prev_fresh + rows
+                all_new = prev_n == prev_nodes
 
- 
-    def manual_fetch_posts(self, url: str) -> List[Dict]:
+        base = url.rstrip("/")
+        return [Post(pid, f"{base}#post-{pid}", None, author, date, text) for pid, author, date, text in rows]
+
+    def manual_fetch_posts(self, url: str, max_stale: float = PAGE_CACHE_TTL) -> List[Post]:
+        """Все посты последней страницы темы (/checkfa); страницы — через общий кэш."""
         url = normalize_url(url)
-        debug(f"[manual_fetch_posts] URL = {url}")
-        debug(f"[manual_fetch_posts] Cookies = {build_cookies()}")
+        debug("[manual_fetch_posts] URL = %s", url)
         if not url.startswith(FORUM_BASE):
             raise ValueError("URL outside FORUM_BASE")
-        html = self.fetch_html(url)
-        if not html:
+        page = self.fetch_page(url, max_stale=max_stale)
+        if not page:
             raise RuntimeError("Failed to fetch page (check cookies)")
-        posts = parse_thread_posts(html, url, self.session)
-        debug(f"[manual_fetch_posts] Parsed posts = {len(posts)}")
+        last_page, _, _, rows = self._parse("thread", parse_thread_page, page, url, 0)
+        if last_page > 1:
+            last = self.fetch_page(thread_page_url(url, last_page), max_stale=max_stale)
+            if last:
+                _, _, _, rows = self._parse("thread", parse_thread_page, last, url, 0)
+        base = url.rstrip("/")
+        posts = [Post(pid, f"{base}#post-{pid}", None, author, date, text) for pid, author, date, text in rows]
+        debug("[manual_fetch_posts] Parsed posts = %d", len(posts))
         return posts
 
+    def fetch_topics(self, url: str, newest_only: bool = False,
+                     max_stale: float = PAGE_CACHE_TTL) -> Optional[List[Topic]]:
+        """Темы раздела для команд (/tlist, /track ...); None — страницу загрузить не удалось."""
+        page = self.fetch_page(url, max_stale=max_stale)
+        if not page:
+            return None
+        return [Topic(*t) for t in self._parse("forum", parse_forum_page, page, normalize_url(url), newest_only)]
+
     def debug_reply_form(self, url: str) -> str:
         url = normalize_url(url)
-        html = self.fetch_html(url)
+        html = self.fetch_html(url, account=self.accounts.posting)
         cookies = build_cookies()
         if not html:
             return "❌ Не удалось загрузить страницу\nCookies: " + str(cookies)
-        soup = BeautifulSoup(html, "html.parser")
+        soup = make_soup(html)
         form = (
             soup.select_one("form[action*='add-reply']") or
             soup.select_one("form.js-quickReply") or
@@ -719,32 +1438,36 @@ class ForumTracker:
     def fetch_latest_post_id(self, url: str) -> Optional[str]:
         """Возвращает id самого свежего поста на thread-странице или None."""
         try:
-            html = self.fetch_html(url)
-            if not html:
-                return None
-            posts = parse_thread_posts(html, url, self.session)
-            if not posts:
-                return None
-            return str(posts[-1]["id"]) if posts else None
+            latest = self.probe_latest(normalize_url(url))
+            if latest is not None:
+                return str(latest[0])
+            posts = self.fetch_posts_since(normalize_url(url), max_stale=PAGE_CACHE_TTL)
+            return str(posts[-1].id) if posts else None
         except Exception:
             return None
 
     def post_message(self, url: str, message: str) -> Dict:
-        debug(f"[POST] Sending to: {url}")
+        # загрузка формы и проверка результата — тоже в полосе постинга
+        with lane(POSTING):
+            return self._post_message(url, message)
+
+    def _post_message(self, url: str, message: str) -> Dict:
+        debug("[POST] Sending to: %s", url)
         url = normalize_url(url)
         if not url.startswith(FORUM_BASE):
             return {"ok": False, "error": "URL outside FORUM_BASE"}
 
         try:
-            debug(f"[POST] Cookies: xf_user={XF_USER[:6]}..., xf_session={XF_SESSION[:6]}..., xf_tfa={XF_TFA_TRUST[:6]}...")
+            debug("[POST] Cookies: xf_user=%s..., xf_session=%s..., xf_tfa=%s...", XF_USER[:6], XF_SESSION[:6], XF_TFA_TRUST[:6])
         except Exception:
             debug("[POST] Cookies: (not available)")
 
-        html = self.fetch_html(url)
-        if not html:
+        # форма и _xfToken — с того же аккаунта, что и отправка; разбор байтов — один раз
+        page = self.fetch_page(url, account=self.accounts.posting)
+        if not page:
             return {"ok": False, "error": "Cannot fetch page"}
 
-        soup = BeautifulSoup(html, "html.parser")
+        soup = make_soup(page.content, encoding=page.encoding)
 
         form = (
             soup.select_one("form[action*='add-reply']") or
@@ -752,14 +1475,14 @@ class ForumTracker:
             soup.select_one("form[data-xf-init*='quick-reply']") or
             soup.select_one("form[action*='post']")
         )
-        debug(f"[POST] Form found: {bool(form)}")
+        debug("[POST] Form found: %s", bool(form))
         if not form:
             return {"ok": False, "error": "Reply form not found"}
 
         action = form.get("action") or url
         if not action.startswith("http"):
             action = urljoin(FORUM_BASE, action.lstrip("/"))
-        debug(f"[POST] Form action: {action}")
+        debug("[POST] Form action: %s", action)
 
         payload: Dict[str, str] = {}
         for inp in form.select("input"):
@@ -786,7 +1509,7 @@ class ForumTracker:
             form.select_one("textarea[data-original-name='message']") or
             form.select_one("textarea")
         )
-        debug(f"[POST] Textarea found: {bool(textarea)}")
+        debug("[POST] Textarea found: %s", bool(textarea))
         if not textarea:
             return {"ok": False, "error": "Textarea not found"}
 
@@ -807,19 +1530,24 @@ class ForumTracker:
         normal_error = None
         multipart_error = None
 
+        def posted() -> bool:
+            # проверка по байтам страницы, без декодирования
+            check = self.fetch_page(url)
+            marker = message.split()[0].encode(check.encoding or "utf-8", "ignore") if check else b""
+            return bool(check) and marker in check.content
+
         debug("[POST] Trying normal mode...")
         try:
-            r = self.session.post(action, data=payload, headers=headers, timeout=25)
-            debug(f"[POST] Normal POST code: {getattr(r, 'status_code', 'ERR')}")
+            r = self._post(action, data=payload, headers=headers, timeout=25)
+            debug("[POST] Normal POST code: %s", getattr(r, 'status_code', 'ERR'))
             if getattr(r, "status_code", 0) in (200, 204, 302):
                 time.sleep(1)
-                check = self.fetch_html(url)
-                if check and message.split()[0] in check:
+                if posted():
                     return {"ok": True, "response": "posted (normal)"}
             normal_error = f"HTTP {getattr(r, 'status_code', 'ERR')}"
         except Exception as e:
             normal_error = str(e)
-        warn(f"[POST] Normal failed: {normal_error}")
+        warn("[POST] Normal failed: %s", normal_error)
 
         debug("[POST] Trying multipart...")
         multipart = {
@@ -832,17 +1560,16 @@ class ForumTracker:
                 multipart[k] = (None, v if v is not None else "")
 
         try:
-            r = self.session.post(action, files=multipart, headers=headers, timeout=25)
-            debug(f"[POST] Multipart code: {getattr(r, 'status_code', 'ERR')}")
+            r = self._post(action, files=multipart, headers=headers, timeout=25)
+            debug("[POST] Multipart code: %s", getattr(r, 'status_code', 'ERR'))
             if getattr(r, "status_code", 0) in (200, 204, 302):
                 time.sleep(1)
-                check = self.fetch_html(url)
-                if check and message.split()[0] in check:
+                if posted():
                     return {"ok": True, "response": "posted (multipart)"}
             multipart_error = f"HTTP {getattr(r, 'status_code', 'ERR')}"
         except Exception as e:
             multipart_error = str(e)
-        warn(f"[POST] Multipart failed: {multipart_error}")
+        warn("[POST] Multipart failed: %s", multipart_error)
 
         return {
             "ok": False,
@@ -852,37 +1579,34 @@ class ForumTracker:
         }
 
     def check_cookies(self) -> Dict:
+        """Запрос главной с текущим jar сессии (теми же куками, что у трекера)."""
         test_url = (FORUM_BASE.rstrip("/") + "/index.php") if FORUM_BASE else "/"
-        headers = {
-            "User-Agent": (
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/122.0.0.0 Safari/537.36"
-            )
-        }
-        cookies = build_cookies()
         try:
-            r = self.session.get(test_url, headers=headers, cookies=cookies, timeout=15)
+            # тем же шлюзом, что и опрос: планировщик, throttle, breaker, бюджет аккаунта
+            r = self._get(self.accounts.posting, test_url, 15)
+            if r is None:
+                return {"ok": False, "error": "circuit open", "throttle": self.throttle.status()}
             html = r.text or ""
-            logged = ("logout" in html.lower()) or ("выйти" in html.lower()) or ('data-logged-in="true"' in html)
+            logged = page_logged_in(html)
+            if logged is None:
+                logged = ("logout" in html.lower()) or ("выйти" in html.lower())
             return {
                 "ok": True,
                 "logged_in": bool(logged),
                 "status": getattr(r, "status_code", None),
-                "cookies_sent": cookies,
+                "cookies_sent": self.sessions.cookies(),
+                "session": self.sessions.status(),
+                "accounts": self.accounts.status(),
+                "proxies": self.proxies.status(),
+                "worker": self.worker.status() if self.worker is not None else None,
+                "throttle": self.throttle.status(),
+                "scheduler": self.scheduler.status(),
+                "light": self.light.status(),
                 "html_sample": html[:500]
             }
         except Exception as e:
             return {"ok": False, "error": str(e)}
 
-    def _keepalive_loop(self):
-        while self._keepalive_running:
-            try:
-                self.fetch_html(FORUM_BASE)
-            except Exception as e:
-                warn(f"keepalive error: {e}")
-            time.sleep(max(60, self.interval * 3))
-
     def debug_forum(self, url: str) -> str:
         out_lines = []
         try:
@@ -899,7 +1623,7 @@ class ForumTracker:
         except Exception as e:
             return f"❌ Ошибка fetch_html: {e}"
 
-        soup = BeautifulSoup(html, "html.parser")
+        soup = make_soup(html)
 
         selectors = [
             ".uix_stickyContainerOuter .structItem",
@@ -958,21 +1682,3 @@ class ForumTracker:
         out_lines.append(" • Если parse пустой — не совпадают классы MatRP.")
 
         return "\n".join(out_lines)
-
-
-def stay_online_loop():
-    """
-    Simple loop to ping FORUM_BASE every 3 minutes to keep session alive.
-    """
-    cookies = build_cookies()
-    url = FORUM_BASE or ""
-    if not url:
-        print("[ONLINE] FORUM_BASE not configured")
-        return
-    while True:
-        try:
-            requests.get(url, cookies=cookies, timeout=10)
-            print("[ONLINE] ping OK")
-        except Exception as e:
-            print("[ONLINE ERROR]", e)
-        time.sleep(180)
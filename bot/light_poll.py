@@ -0,0 +1,146 @@
+
+"""
+Лёгкие эндпоинты XenForo для опроса тем.
+
+Тема без изменений не должна стоить 100-300 КБ HTML:
+
+* threads/<id>/latest — форум отвечает редиректом на последний пост
+  (Location: .../threads/x.1/page-N#post-M). Хватает заголовков: если M не
+  больше курсоров всех подписчиков, страницу не качаем вовсе, иначе сразу
+  берём страницу N, а не первую + последнюю;
+* _xfResponseType=json — та же страница темы без обвязки (шапка, меню,
+  подвал) в html.content JSON-ответа; ею грузится страница N. Маркера
+  data-logged-in в нём нет: вошедшему XenForo добавляет в JSON объект
+  visitor (счётчики алертов), гостю — нет (partial_logged_in).
+
+Разделы и так опрашиваются лентой whats-new/posts (аналог find-new в
+XenForo 2), см. ForumTracker._check_feed.
+
+Если эндпоинт отвечает не так, как ожидается (нет редиректа, нет постов в
+JSON), после LIGHT_POLL_MISSES промахов подряд он выключается на
+LIGHT_POLL_RETRY секунд и опрос идёт полными страницами, как раньше.
+LIGHT_POLL=0 — выключить совсем.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from . import metrics
+from .accounts import shard_key
+from .session import page_logged_in
+
+LIGHT_POLL = os.getenv("LIGHT_POLL", "1").lower() in ("1", "true", "yes")
+LIGHT_POLL_MISSES = int(os.getenv("LIGHT_POLL_MISSES", "3"))
+LIGHT_POLL_RETRY = float(os.getenv("LIGHT_POLL_RETRY", "1800"))
+
+LATEST, PARTIAL = "latest", "json"
+PARTIAL_PARAMS = {"_xfResponseType": "json", "_xfWithData": "1"}
+PARTIAL_HEADERS = {"X-Requested-With": "XMLHttpRequest", "Accept": "application/json"}
+
+log = logging.getLogger(__name__)
+
+LIGHT_TOTAL = metrics.counter(
+    "forum_light_poll_total", "Light XenForo endpoint results: unchanged, changed, ok, miss",
+    ("endpoint", "result"),
+)
+LIGHT_UP = metrics.gauge("forum_light_poll_enabled", "1 if the light endpoint is in use", ("endpoint",))
+
+_POST_ID = re.compile(r"^post-(\d+)$")
+_PAGE_NO = re.compile(r"^page-(\d+)$")
+
+
+def latest_url(url: str) -> str:
+    """threads/x.1/page-3/#post-5 -> threads/x.1/latest"""
+    return shard_key(url) + "/latest"
+
+
+def parse_latest_location(location: str) -> Optional[Tuple[int, int]]:
+    """
+    (id последнего поста, номер страницы) из Location редиректа latest; None — не то.
+    Пост — только из #post-N, страница — только из последнего сегмента пути:
+    в slug темы тоже бывает "post-123" (threads/post-123-pravila.77/page-4#post-9001).
+    """
+    parts = urlsplit(location or "")
+    m = _POST_ID.match(parts.fragment)
+    if not m:
+        return None
+    # /index.php?threads/x.1/page-N — путь XenForo в query
+    path = parts.query.split("&", 1)[0] if parts.path.endswith("index.php") and parts.query else parts.path
+    p = _PAGE_NO.match(path.rstrip("/").rsplit("/", 1)[-1])
+    return int(m.group(1)), int(p.group(1)) if p else 1
+
+
+def partial_content(body: bytes, marker: bytes = b"message-body") -> Optional[bytes]:
+    """html.content из JSON-ответа XenForo (байты utf-8), если в нём есть marker."""
+    try:
+        data = json.loads(body)
+        content = (data.get("html") or {}).get("content")
+    except Exception:
+        return None
+    if not isinstance(content, str):
+        return None
+    content = content.encode("utf-8")
+    return content if marker in content else None
+
+
+def partial_logged_in(body: bytes) -> Optional[bool]:
+    """Как page_logged_in, но для JSON-ответа: visitor есть — вошли, нет — гость; None — не JSON."""
+    try:
+        data = json.loads(body)
+        if isinstance(data.get("visitor"), dict):
+            return True
+        content = (data.get("html") or {}).get("content")
+    except Exception:
+        return None
+    # вместо партиала пришла целая страница — у неё свой маркер
+    state = page_logged_in(content) if isinstance(content, str) else None
+    return False if state is None else state
+
+
+class LightEndpoints:
+    """Какие лёгкие эндпоинты сейчас работают; промахи подряд выключают эндпоинт на время."""
+
+    def __init__(self, enabled: bool = LIGHT_POLL):
+        self.enabled = enabled
+        self._misses: Dict[str, int] = {}
+        self._off_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        for name in (LATEST, PARTIAL):
+            LIGHT_UP.set(1 if enabled else 0, endpoint=name)
+
+    def usable(self, name: str) -> bool:
+        if not self.enabled:
+            return False
+        with self._lock:
+            until = self._off_until.get(name, 0.0)
+            if until and time.monotonic() >= until:
+                # пора попробовать снова
+                self._off_until.pop(name, None)
+                self._misses[name] = 0
+                LIGHT_UP.set(1, endpoint=name)
+            return name not in self._off_until
+
+    def ok(self, name: str, result: str = "ok"):
+        LIGHT_TOTAL.inc(endpoint=name, result=result)
+        with self._lock:
+            self._misses[name] = 0
+
+    def miss(self, name: str):
+        LIGHT_TOTAL.inc(endpoint=name, result="miss")
+        with self._lock:
+            self._misses[name] = self._misses.get(name, 0) + 1
+            if self._misses[name] >= LIGHT_POLL_MISSES and name not in self._off_until:
+                self._off_until[name] = time.monotonic() + LIGHT_POLL_RETRY
+                LIGHT_UP.set(0, endpoint=name)
+                log.warning("light endpoint %s off for %.0fs, polling full pages", name, LIGHT_POLL_RETRY)
+
+    def status(self) -> Dict[str, bool]:
+        return {name: self.usable(name) for name in (LATEST, PARTIAL)}
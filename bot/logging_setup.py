@@ -0,0 +1,186 @@
+
+"""
+Структурированное логирование бота.
+
+- JSON-строки (одна запись = одна строка) в stderr;
+- уровни по модулям: LOG_LEVELS="bot.forum_tracker=WARNING,bot.vk_bot=DEBUG";
+- QueueHandler -> QueueListener: горячие пути только кладут запись в очередь,
+  запись в stderr идёт в отдельном потоке;
+- RateLimitFilter режет повторяющиеся сообщения (один и тот же шаблон
+  msg от одного логгера), например [FETCH] на каждый URL.
+"""
+
+from __future__ import annotations
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+try:
+    import config as _cfg
+except Exception:
+    _cfg = None
+
+# поля LogRecord, которые не нужно дублировать в JSON как extra
+_STD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+def _setting(name: str, default):
+    env = os.getenv(name)
+    if env not in (None, ""):
+        return env
+    return getattr(_cfg, name, default) if _cfg else default
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for k, v in record.__dict__.items():
+            if k not in _STD_ATTRS and not k.startswith("_"):
+                out[k] = v
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Пропускает не больше `per_window` записей с одинаковым (logger, шаблон msg)
+    за `window` секунд. Сколько отброшено — пишется в поле suppressed
+    первой записи следующего окна. WARNING и выше не режутся.
+    Ключи с истёкшим окном выбрасываются при появлении нового ключа (не
+    чаще раза за окно), иначе состояние растёт с каждым новым шаблоном.
+    """
+
+    def __init__(self, per_window: int = 20, window: float = 60.0):
+        super().__init__()
+        self.per_window = per_window
+        self.window = window
+        self._state: Dict[tuple, list] = {}
+        self._pruned = time.monotonic()
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            st = self._state.get(key)
+            if st is None and now - self._pruned >= self.window:
+                self._prune(now)
+            if st is None or now - st[0] >= self.window:
+                suppressed = st[2] if st else 0
+                self._state[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if st[1] < self.per_window:
+                st[1] += 1
+                return True
+            st[2] += 1
+            return False
+
+    def _prune(self, now: float):
+        self._pruned = now
+        for key in [k for k, st in self._state.items() if now - st[0] >= self.window]:
+            del self._state[key]
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Как QueueHandler, но traceback уходит в отдельное поле exc, а не в msg."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.exc_text = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # лучше потерять строку лога, чем блокировать опрос форума
+            pass
+
+
+def parse_levels(spec) -> Dict[str, int]:
+    """'bot.forum_tracker=WARNING,bot=INFO' или dict -> {logger: level}."""
+    if not spec:
+        return {}
+    if isinstance(spec, dict):
+        items = spec.items()
+    else:
+        items = (p.split("=", 1) for p in str(spec).split(",") if "=" in p)
+    out = {}
+    for name, lvl in items:
+        lvl = logging.getLevelName(str(lvl).strip().upper())
+        if isinstance(lvl, int):
+            out[name.strip()] = lvl
+    return out
+
+
+def setup_logging(level=None, levels=None, json_lines=None) -> None:
+    """Идемпотентная настройка root-логгера. Вызывается из main.py / server.py."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        level = level or _setting("LOG_LEVEL", "INFO")
+        levels = levels if levels is not None else _setting("LOG_LEVELS", "")
+        if json_lines is None:
+            json_lines = str(_setting("LOG_JSON", "1")).lower() not in ("0", "false", "no")
+
+        stream = logging.StreamHandler(sys.stderr)
+        if json_lines:
+            stream.setFormatter(JsonFormatter())
+        else:
+            stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+        q: queue.Queue = queue.Queue(maxsize=10000)
+        qh = _QueueHandler(q)
+        qh.addFilter(RateLimitFilter(
+            per_window=int(_setting("LOG_RATE_LIMIT", 20)),
+            window=float(_setting("LOG_RATE_WINDOW", 60)),
+        ))
+
+        root = logging.getLogger()
+        for h in list(root.handlers):
+            root.removeHandler(h)
+        root.addHandler(qh)
+        root.setLevel(logging.getLevelName(str(level).upper()))
+        for name, lvl in parse_levels(levels).items():
+            logging.getLogger(name).setLevel(lvl)
+
+        _listener = logging.handlers.QueueListener(q, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
@@ -0,0 +1,69 @@
+
+"""
+Общий кэш страниц форума для команд и цикла трекера.
+
+Ключ — каноническая ссылка (без #якоря, со слешем на конце). Одновременные
+запросы одной страницы сливаются в один (SingleFlight): пять /checkfa на
+одну жалобу — один GET. Цикл трекера всегда берёт свежую страницу
+(max_stale=0), но кладёт её в кэш; команды соглашаются на страницу не старше
+max_stale секунд (по умолчанию PAGE_CACHE_TTL). Постинг (явный account)
+кэш не использует.
+
+Приоритет полос здесь не действует: если страница уже грузится циклом
+трекера (полоса BACKGROUND), команда присоединяется к этой загрузке и ждёт
+её целиком, в том числе очередь фонового запроса за токеном и слотом хоста.
+Обычно это быстрее новой загрузки (запрос уже в пути), но в худшем случае
+команда ждёт столько же, сколько фоновый запрос.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Callable, Optional
+
+from . import metrics
+from .cache import SingleFlight, TTLCache
+from .records import Page
+from .utils import normalize_url
+
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "128"))
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", "15"))
+
+PAGE_CACHE_TOTAL = metrics.counter("forum_page_cache_total", "Forum page lookups: cache hit, shared in-flight fetch or miss", ("result",))
+
+
+def canonical_url(url: str) -> str:
+    url = normalize_url(url or "").split("#", 1)[0]
+    if url and "?" not in url and not url.endswith("/"):
+        url += "/"
+    return url
+
+
+class PageCache:
+    def __init__(self, fetch: Callable[[str], Optional[Page]],
+                 maxsize: int = PAGE_CACHE_SIZE, ttl: float = PAGE_CACHE_TTL):
+        self._fetch = fetch
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.flight = SingleFlight()
+
+    def get(self, url: str, max_stale: float = 0, fetch: Callable[[], Optional[Page]] = None) -> Optional[Page]:
+        """Страница из кэша, если она не старше max_stale, иначе одна загрузка на всех."""
+        key = canonical_url(url)
+        if max_stale > 0:
+            entry = self.cache.get_entry(key)
+            if entry is not None and entry[1] <= max_stale:
+                PAGE_CACHE_TOTAL.inc(result="hit")
+                return entry[0]
+
+        def load():
+            page = fetch() if fetch is not None else self._fetch(url)
+            if page:
+                self.cache.set(key, page)
+            return page
+
+        page, shared = self.flight.do(key, load)
+        PAGE_CACHE_TOTAL.inc(result="shared" if shared else "miss")
+        return page
+
+    def clear(self):
+        self.cache.clear()
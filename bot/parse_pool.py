@@ -0,0 +1,111 @@
+
+"""
+Пул процессов для парсинга страниц форума.
+
+Парсеры (bs4) — чистый Python и в одном процессе упираются в GIL: большой
+цикл трекера отнимает время у потока longpoll. С PARSE_WORKERS > 0 страница
+уходит в ProcessPoolExecutor, а назад приходят компактные кортежи
+(parse_thread_page / parse_forum_page / parse_feed_page в forum_tracker).
+Процессы стартуют сразу и заранее импортируют парсеры и bs4. 0 — парсинг в
+том же процессе, как раньше; если пул сломался, страница разбирается на месте,
+а пул пересоздаётся при следующем вызове.
+
+Процессы запускаются через forkserver (или spawn), а не fork: к старту пула
+в боте уже работают longpoll, QueueListener логов и /metrics, и fork мог бы
+унести в дочерний процесс захваченную другим потоком блокировку (логгера,
+гистограммы) — и зависнуть на ней. Побочный эффект: дочерний процесс
+импортирует главный скрипт как __mp_main__, поэтому main.py и server.py
+не делают при таком импорте ничего, кроме импортов.
+
+Счётчики, увеличенные в процессе пула, родитель не видит: то, что важно
+(forum_parse_seconds, forum_parse_slice_total), считается в родителе
+(ForumTracker._parse).
+"""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+from . import metrics
+
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "0"))
+
+log = logging.getLogger(__name__)
+
+PARSE_POOL_TASKS = metrics.counter("parse_pool_tasks_total", "Pages parsed via the process pool", ("result",))
+PARSE_POOL_WORKERS = metrics.gauge("parse_pool_workers", "Parser processes in the pool")
+
+
+def _warm():
+    # initializer процесса: импорт парсеров и bs4 до первой страницы
+    from . import forum_tracker
+    forum_tracker.make_soup("<html></html>")
+
+
+def _ping(_=None) -> int:
+    return os.getpid()
+
+
+def _mp_context():
+    # процессы — от однопоточного forkserver, который сам заранее импортирует парсеры
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(["bot.forum_tracker"])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+class ParsePool:
+    def __init__(self, workers: int = PARSE_WORKERS):
+        self.workers = max(0, int(workers or 0))
+        self._ex: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> Optional[ProcessPoolExecutor]:
+        if not self.workers:
+            return None
+        with self._lock:
+            if self._ex is None:
+                try:
+                    ex = ProcessPoolExecutor(self.workers, mp_context=_mp_context(), initializer=_warm)
+                    # все процессы поднимаются сейчас, а не на первой странице цикла
+                    pids = set(ex.map(_ping, range(self.workers * 2)))
+                    self._ex = ex
+                    PARSE_POOL_WORKERS.set(self.workers)
+                    log.info("parse pool: %d workers (%d warmed)", self.workers, len(pids))
+                except Exception:
+                    log.exception("parse pool failed to start, parsing in-process")
+                    return None
+            return self._ex
+
+    def run(self, fn: Callable, *args, **kwargs):
+        """fn(*args, **kwargs) в процессе пула (fn и результат должны пиклиться) или на месте."""
+        ex = self._ex or self.start()
+        if ex is None:
+            return fn(*args, **kwargs)
+        try:
+            res = ex.submit(fn, *args, **kwargs).result()
+            PARSE_POOL_TASKS.inc(result="ok")
+            return res
+        except BrokenProcessPool:
+            log.warning("parse pool broken, restarting")
+            PARSE_POOL_TASKS.inc(result="fallback")
+            with self._lock:
+                if self._ex is ex:
+                    self._ex = None
+                    PARSE_POOL_WORKERS.set(0)
+            ex.shutdown(wait=False)
+            return fn(*args, **kwargs)
+
+    def shutdown(self):
+        with self._lock:
+            ex, self._ex = self._ex, None
+        if ex is not None:
+            ex.shutdown(wait=False, cancel_futures=True)
+            PARSE_POOL_WORKERS.set(0)
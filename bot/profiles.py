@@ -0,0 +1,187 @@
+
+"""
+Кэш профилей форума (по id участника) + пакетная загрузка.
+
+Свежая запись (моложе PROFILE_TTL) отдаётся сразу; устаревшая, но ещё
+годная (моложе PROFILE_STALE_TTL) — тоже сразу, а в фоне запускается
+обновление (stale-while-revalidate). Иначе профиль грузится синхронно.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+from .cache import TTLCache
+from .scheduler import current_lane, lane
+from .utils import make_soup
+
+try:
+    from config import FORUM_BASE
+except Exception:
+    FORUM_BASE = ""
+
+PROFILE_TTL = 300
+PROFILE_STALE_TTL = 3600
+PROFILE_CACHE_SIZE = 512
+PROFILE_BATCH_WORKERS = 4
+PROFILE_BATCH_MAX = 20
+
+log = logging.getLogger(__name__)
+
+
+def member_id(url_or_id: str) -> str:
+    """'123', '.../members/name.123/', '...?members/123/' -> '123' (или '')."""
+    s = (url_or_id or "").strip()
+    if s.isdigit():
+        return s
+    m = re.search(r"members[/=](?:[^/?#]*\.)?(\d+)", s)
+    return m.group(1) if m else ""
+
+
+def member_url(url_or_id: str) -> str:
+    s = (url_or_id or "").strip()
+    if s.isdigit():
+        return urljoin(FORUM_BASE, f"/index.php?members/{s}/")
+    return s
+
+
+def parse_member_profile(html: str, url: str) -> Dict[str, str]:
+    """Разбор страницы участника XenForo (как раньше в CommandHandler._parse_profile)."""
+    soup = make_soup(html)
+
+    data = {
+        "username": "—",
+        "user_id": "—",
+        "registered": "—",
+        "message_count": "—",
+        "reactions": "—",
+        "points": "—",
+        "last_activity": "—",
+        "about": ""
+    }
+
+    # 👤 Ник
+    name = soup.select_one(".username, h1.p-title-value")
+    if name:
+        data["username"] = name.get_text(strip=True)
+
+    # 🆔 ID
+    mid = member_id(url)
+    if mid:
+        data["user_id"] = mid
+
+    # 📊 Статы (сообщения, реакции, баллы)
+    for dl in soup.select(".memberHeader-stats dl"):
+        dt = dl.find("dt")
+        dd = dl.find("dd")
+        if not dt or not dd:
+            continue
+
+        key = dt.get_text(strip=True).lower()
+        val = dd.get_text(strip=True).replace(",", "")
+
+        if "сообщ" in key:
+            data["message_count"] = val
+        elif "реакц" in key:
+            data["reactions"] = val
+        elif "балл" in key:
+            data["points"] = val
+
+    # 📅 Регистрация
+    reg = soup.find("dt", string="Регистрация")
+    if reg:
+        time_el = reg.find_next("time")
+        if time_el:
+            data["registered"] = time_el.get_text(strip=True)
+
+    # ⏱ Активность
+    act = soup.find("dt", string="Активность")
+    if act:
+        time_el = act.find_next("time")
+        if time_el:
+            data["last_activity"] = time_el.get_text(strip=True)
+
+    # ✉️ О себе
+    about = soup.select_one(
+        ".memberHeader-blurb, .p-profile-about, .userAbout"
+    )
+    if about:
+        data["about"] = about.get_text(" ", strip=True)[:800]
+
+    return data
+
+
+class ProfileCache:
+    """
+    loader(url) -> dict | None загружает и разбирает профиль.
+    Ошибки (None или dict с "error") не кэшируются.
+    """
+
+    def __init__(self, loader: Callable[[str], Optional[dict]], ttl: float = PROFILE_TTL,
+                 stale_ttl: float = PROFILE_STALE_TTL, maxsize: int = PROFILE_CACHE_SIZE,
+                 workers: int = PROFILE_BATCH_WORKERS):
+        self.loader = loader
+        self.ttl = ttl
+        self.cache = TTLCache(maxsize=maxsize, ttl=max(ttl, stale_ttl))
+        self.workers = workers
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _load(self, key: str, url: str) -> Optional[dict]:
+        data = self.loader(url)
+        if data and not data.get("error"):
+            self.cache.set(key, data)
+        return data
+
+    def _refresh(self, key: str, url: str):
+        try:
+            self._load(key, url)
+        except Exception as e:
+            log.warning("profile refresh failed for %s: %s", url, e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get(self, url_or_id: str) -> Optional[dict]:
+        url = member_url(url_or_id)
+        key = member_id(url) or url
+        entry = self.cache.get_entry(key)
+        if entry is not None:
+            value, age = entry
+            if age <= self.ttl:
+                return value
+            if age <= self.cache.ttl:
+                with self._lock:
+                    start = key not in self._refreshing
+                    self._refreshing.add(key)
+                if start:
+                    threading.Thread(target=self._refresh, args=(key, url), daemon=True).start()
+                return value
+        return self._load(key, url)
+
+    def get_many(self, urls_or_ids: List[str]) -> List[Tuple[str, Optional[dict]]]:
+        """Параллельно загружает несколько профилей; порядок сохраняется."""
+        items = list(dict.fromkeys(u for u in urls_or_ids if u))[:PROFILE_BATCH_MAX]
+        if not items:
+            return []
+        # полоса — свойство потока: воркеры пула грузят в полосе вызывающего (/profile — INTERACTIVE)
+        caller_lane = current_lane()
+
+        def one(u):
+            try:
+                with lane(caller_lane):
+                    return self.get(u)
+            except Exception as e:
+                return {"error": str(e)}
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(items)))) as ex:
+            return list(zip(items, ex.map(one, items)))
+
+    def invalidate(self, url_or_id: str):
+        url = member_url(url_or_id)
+        self.cache.pop(member_id(url) or url)
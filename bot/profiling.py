@@ -0,0 +1,260 @@
+
+"""
+Профилирование циклов трекера по запросу (/profile_cycle, кнопка в /debug).
+
+CycleProfiler.arm(n) — следующие n циклов check_all идут под cProfile и
+tracemalloc. После последнего в PROFILE_DIR сохраняются <id>.pstats
+(открывается pstats / snakeviz) и <id>.json: топ функций по cumulative
+time и топ мест аллокаций. Панель и бот читают одну и ту же папку.
+
+Цикл профилируется во всех своих потоках: рабочие потоки (_run_urls,
+потоки шардов аккаунтов) оборачиваются в CycleProfiler.thread() — у каждого
+свой Profile, в отчёте они складываются (pstats.Stats.add). Потоки вне цикла
+(команды, longpoll) в отчёт не попадают; на Python 3.12+ cProfile один на
+процесс и видит все потоки, включая их. Разбор в пуле процессов
+(PARSE_WORKERS) виден только как ожидание результата. cProfile/pstats
+импортируются только при профилировании.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "profiles"))
+PROFILE_KEEP = 20
+PROFILE_MAX_CYCLES = 20
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 20
+TRACEMALLOC_FRAMES = 10
+
+log = logging.getLogger(__name__)
+
+_IGNORE_ALLOC = (tracemalloc.Filter(False, tracemalloc.__file__),
+                 tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                 tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"))
+
+
+def _short(path: str) -> str:
+    for marker in ("site-packages" + os.sep, "dist-packages" + os.sep):
+        if marker in path:
+            return path.split(marker, 1)[1]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+    return path[len(root):] if path.startswith(root) else path
+
+
+def top_functions(stats: pstats.Stats, limit: int = TOP_FUNCTIONS) -> List[Dict]:
+    rows = []
+    for (filename, line, func), (cc, nc, tt, ct, _callers) in stats.stats.items():
+        rows.append({
+            "func": f"{_short(filename)}:{line}({func})" if line else func,
+            "ncalls": nc,
+            "tottime": round(tt, 4),
+            "cumtime": round(ct, 4),
+        })
+    rows.sort(key=lambda r: r["cumtime"], reverse=True)
+    return rows[:limit]
+
+
+def top_allocations(snapshot: tracemalloc.Snapshot, limit: int = TOP_ALLOCATIONS) -> List[Dict]:
+    out = []
+    for st in snapshot.filter_traces(_IGNORE_ALLOC).statistics("lineno")[:limit]:
+        frame = st.traceback[0]
+        out.append({"site": f"{_short(frame.filename)}:{frame.lineno}",
+                    "kb": round(st.size / 1024, 1), "count": st.count})
+    return out
+
+
+class CycleProfiler:
+    """Одновременно профилируется только один цикл; параллельные идут как обычно."""
+
+    def __init__(self, out_dir: str = PROFILE_DIR):
+        self.out_dir = out_dir
+        self._lock = threading.Lock()
+        self._busy = threading.Lock()
+        self._remaining = 0
+        self._total = 0
+        self._source = ""
+        self._on_done: Optional[Callable[[Dict], None]] = None
+        self._profile = None
+        # Profile рабочих потоков текущего цикла (thread()), складываются в отчёт
+        self._threads: List = []
+        self._active = False
+        self._local = threading.local()
+        self._cycle_seconds: List[float] = []
+        self._peak = 0
+        self._own_tracemalloc = False
+
+    @property
+    def armed(self) -> int:
+        return self._remaining
+
+    def arm(self, cycles: int = 1, source: str = "", on_done: Optional[Callable[[Dict], None]] = None) -> int:
+        """Профилировать следующие cycles циклов (не больше PROFILE_MAX_CYCLES)."""
+        cycles = max(1, min(int(cycles), PROFILE_MAX_CYCLES))
+        with self._lock:
+            if self._remaining:
+                return 0
+            import cProfile
+
+            self._remaining = self._total = cycles
+            self._source = source
+            self._on_done = on_done
+            self._profile = cProfile.Profile()
+            self._threads = []
+            self._cycle_seconds = []
+            self._peak = 0
+        log.info("profiler armed for %d cycle(s) by %s", cycles, source or "?")
+        return cycles
+
+    @contextmanager
+    def cycle(self):
+        if not self._remaining or not self._busy.acquire(blocking=False):
+            yield
+            return
+        try:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+                self._own_tracemalloc = True
+            tracemalloc.reset_peak()
+            t0 = time.perf_counter()
+            try:
+                self._profile.enable()
+            except ValueError as e:
+                # другой профилировщик уже активен в процессе
+                log.warning("cProfile unavailable: %s", e)
+                self._remaining = 0
+                if self._own_tracemalloc:
+                    tracemalloc.stop()
+                    self._own_tracemalloc = False
+                self._profile = None
+            if self._profile is None:
+                yield
+                return
+            self._active = self._local.on = True
+            try:
+                yield
+            finally:
+                self._active = self._local.on = False
+                self._profile.disable()
+                self._cycle_seconds.append(time.perf_counter() - t0)
+                self._peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+                self._remaining -= 1
+                if self._remaining <= 0:
+                    self._finish(tracemalloc.take_snapshot())
+        finally:
+            self._busy.release()
+
+    @contextmanager
+    def thread(self):
+        """Рабочий поток профилируемого цикла: свой Profile, в отчёте — вместе с потоком цикла."""
+        if not self._active or getattr(self._local, "on", False):
+            yield
+            return
+        import cProfile
+
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            # Python 3.12+: cProfile на sys.monitoring один на процесс и уже видит все потоки
+            yield
+            return
+        self._local.on = True
+        try:
+            yield
+        finally:
+            prof.disable()
+            self._local.on = False
+            with self._lock:
+                self._threads.append(prof)
+
+    def _finish(self, snapshot: tracemalloc.Snapshot):
+        if self._own_tracemalloc:
+            tracemalloc.stop()
+            self._own_tracemalloc = False
+        report_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        import pstats
+
+        stats = pstats.Stats(self._profile)
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for prof in threads:
+            stats.add(prof)
+        report = {
+            "id": report_id,
+            "ts": int(time.time()),
+            "source": self._source,
+            "cycles": self._total,
+            "threads": 1 + len(threads),
+            "cycle_seconds": [round(s, 3) for s in self._cycle_seconds],
+            "peak_kb": round(self._peak / 1024, 1),
+            "functions": top_functions(stats),
+            "allocations": top_allocations(snapshot),
+        }
+        try:
+            os.makedirs(self.out_dir, exist_ok=True)
+            stats.dump_stats(os.path.join(self.out_dir, report_id + ".pstats"))
+            with open(os.path.join(self.out_dir, report_id + ".json"), "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=1)
+            _prune(self.out_dir)
+        except Exception:
+            log.exception("failed to save profile %s", report_id)
+        self._profile = None
+        log.info("profile %s saved (%d cycles)", report_id, self._total)
+        if self._on_done:
+            try:
+                self._on_done(report)
+            except Exception:
+                log.exception("profile on_done callback failed")
+
+
+def _prune(out_dir: str, keep: int = PROFILE_KEEP):
+    ids = sorted(f[:-5] for f in os.listdir(out_dir) if f.endswith(".json"))
+    for rid in ids[:-keep]:
+        for ext in (".json", ".pstats"):
+            try:
+                os.remove(os.path.join(out_dir, rid + ext))
+            except OSError:
+                pass
+
+
+def list_reports(out_dir: str = PROFILE_DIR) -> List[Dict]:
+    """Сохранённые отчёты, новые первыми."""
+    if not os.path.isdir(out_dir):
+        return []
+    out = []
+    for name in sorted(os.listdir(out_dir), reverse=True):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(out_dir, name), "r", encoding="utf-8") as f:
+                out.append(json.load(f))
+        except Exception:
+            continue
+    return out
+
+
+def pstats_path(report_id: str, out_dir: str = PROFILE_DIR) -> Optional[str]:
+    if not report_id or not all(c.isdigit() or c == "-" for c in report_id):
+        return None
+    path = os.path.join(out_dir, report_id + ".pstats")
+    return path if os.path.exists(path) else None
+
+
+def format_report(report: Dict, limit: int = 10) -> str:
+    lines = [f"🔬 Профиль {report['id']}: {report['cycles']} цикл(ов), {report.get('threads', 1)} поток(ов), "
+             f"{', '.join(str(s) for s in report['cycle_seconds'])} с, пик памяти {report['peak_kb']} КБ",
+             "", "Топ по cumulative time:"]
+    for r in report["functions"][:limit]:
+        lines.append(f"{r['cumtime']:.3f}s  {r['ncalls']}×  {r['func']}")
+    lines += ["", "Топ аллокаций:"]
+    for a in report["allocations"][:5]:
+        lines.append(f"{a['kb']} КБ  {a['site']}")
+    return "\n".join(lines)
@@ -0,0 +1,209 @@
+
+"""
+Пул прокси для опроса форума.
+
+Список берётся из config.py (FORUM_PROXIES) и/или файла (FORUM_PROXIES_FILE,
+по прокси на строку, # — комментарий). Фоновый поток раз в
+PROXY_CHECK_INTERVAL секунд параллельно прогоняет все прокси через ту же
+проверку, что и /testproxy (ForumTracker.test_forum_proxy). По каждому прокси
+считаются EWMA задержки и доли успешных запросов — и по проверкам, и по
+обычным запросам трекера. Опрос раскладывается по здоровым прокси случайно
+с весом success / latency; после PROXY_EJECT_AFTER ошибок подряд прокси
+выводится из ротации до следующей успешной проверки. Нет здоровых прокси —
+запросы идут напрямую.
+
+config.py:
+    FORUM_PROXIES = ["1.2.3.4:3128", "user:pass@5.6.7.8:8080"]
+    FORUM_PROXIES_FILE = "data/proxies.txt"
+"""
+
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from . import metrics
+
+try:
+    from config import FORUM_PROXIES
+except Exception:
+    FORUM_PROXIES = []
+
+try:
+    from config import FORUM_PROXIES_FILE
+except Exception:
+    FORUM_PROXIES_FILE = ""
+
+PROXY_CHECK_INTERVAL = 300
+PROXY_CHECK_TIMEOUT = 15
+PROXY_CHECK_WORKERS = 16
+PROXY_EJECT_AFTER = 3
+# вес EWMA для нового замера
+EWMA_ALPHA = 0.3
+
+log = logging.getLogger(__name__)
+
+PROXY_UP = metrics.gauge("forum_proxy_up", "1 if the proxy is in rotation", ("proxy",))
+PROXY_LATENCY = metrics.gauge("forum_proxy_latency_seconds", "EWMA latency of forum requests through the proxy", ("proxy",))
+PROXY_REQUESTS = metrics.counter("forum_proxy_requests_total", "Forum requests through proxies", ("proxy", "result"))
+PROXY_CHECKS = metrics.counter("forum_proxy_checks_total", "Background proxy health checks", ("proxy", "result"))
+
+
+def load_proxies(items=None, path: str = None) -> List[str]:
+    """Список прокси из config и файла, без дублей, в исходном порядке."""
+    raw = list(FORUM_PROXIES if items is None else items)
+    path = FORUM_PROXIES_FILE if path is None else path
+    if path:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                raw.extend(line.split("#", 1)[0] for line in f)
+        except Exception as e:
+            log.warning("proxy list %s not loaded: %s", path, e)
+    out = []
+    for p in raw:
+        p = str(p or "").strip()
+        if p.startswith("http://"):
+            p = p[len("http://"):]
+        if p and p not in out:
+            out.append(p)
+    return out
+
+
+class Proxy:
+    def __init__(self, addr: str):
+        self.addr = addr
+        # в метриках и статусе — без логина/пароля
+        self.label = addr.rsplit("@", 1)[-1]
+        self.proxies = {"http": f"http://{addr}", "https": f"http://{addr}"}
+        self.latency: Optional[float] = None
+        self.success = 1.0
+        self.fails = 0
+        self.ejected = False
+        self.reason = ""
+
+    @property
+    def weight(self) -> float:
+        return self.success / max(self.latency or 1.0, 0.05)
+
+    def record(self, ok: bool, latency: float = None):
+        self.success += EWMA_ALPHA * ((1.0 if ok else 0.0) - self.success)
+        if ok and latency is not None:
+            self.latency = latency if self.latency is None else self.latency + EWMA_ALPHA * (latency - self.latency)
+            PROXY_LATENCY.set(round(self.latency, 3), proxy=self.label)
+        self.fails = 0 if ok else self.fails + 1
+
+    def status(self) -> Dict:
+        return {
+            "proxy": self.label,
+            "up": not self.ejected,
+            "latency_ms": round(self.latency * 1000) if self.latency is not None else None,
+            "success": round(self.success, 2),
+            "reason": self.reason,
+        }
+
+
+class ProxyPool:
+    def __init__(self, addrs: List[str], probe: Callable[..., Dict] = None):
+        """probe(proxy, timeout) -> {"ok", "reason"} — по умолчанию ForumTracker.test_forum_proxy."""
+        self.proxies = [Proxy(a) for a in addrs]
+        self.probe = probe
+        self._lock = threading.Lock()
+        self._running = False
+        self._wake = threading.Event()
+        for p in self.proxies:
+            PROXY_UP.set(1, proxy=p.label)
+
+    @classmethod
+    def from_config(cls, probe: Callable[..., Dict] = None) -> "ProxyPool":
+        addrs = load_proxies()
+        if addrs:
+            log.info("forum proxy pool: %d proxies", len(addrs))
+        return cls(addrs, probe)
+
+    def __len__(self):
+        return len(self.proxies)
+
+    # -----------------------------------------------------------------
+    def pick(self, exclude: Proxy = None) -> Optional[Proxy]:
+        """Случайный здоровый прокси с весом success / latency; None — идти напрямую."""
+        if not self.proxies:
+            return None
+        with self._lock:
+            live = [p for p in self.proxies if not p.ejected and p is not exclude]
+            if not live:
+                return None
+            return random.choices(live, weights=[p.weight for p in live])[0]
+
+    def report(self, proxy: Proxy, ok: bool, latency: float = None, reason: str = ""):
+        """Итог обычного запроса трекера через proxy."""
+        PROXY_REQUESTS.inc(proxy=proxy.label, result="ok" if ok else "error")
+        with self._lock:
+            proxy.record(ok, latency)
+            if not ok:
+                proxy.reason = reason
+                if not proxy.ejected and proxy.fails >= PROXY_EJECT_AFTER:
+                    self._eject(proxy)
+
+    def _eject(self, proxy: Proxy, recheck: bool = True):
+        proxy.ejected = True
+        PROXY_UP.set(0, proxy=proxy.label)
+        log.warning("proxy %s ejected after %d errors: %s", proxy.label, proxy.fails, proxy.reason)
+        if recheck:
+            # не ждём полного интервала — перепроверим раньше
+            self._wake.set()
+
+    # -----------------------------------------------------------------
+    def check_one(self, proxy: Proxy, timeout: float = PROXY_CHECK_TIMEOUT) -> Dict:
+        t0 = time.perf_counter()
+        try:
+            res = self.probe(proxy.addr, timeout=timeout)
+        except Exception as e:
+            res = {"ok": False, "reason": str(e)}
+        dt = time.perf_counter() - t0
+        ok = bool(res.get("ok"))
+        PROXY_CHECKS.inc(proxy=proxy.label, result="ok" if ok else "failed")
+        with self._lock:
+            proxy.record(ok, dt)
+            proxy.reason = res.get("reason", "")
+            if ok and proxy.ejected:
+                proxy.ejected = False
+                PROXY_UP.set(1, proxy=proxy.label)
+                log.info("proxy %s back in rotation (%.0f ms)", proxy.label, dt * 1000)
+            elif not ok and not proxy.ejected:
+                self._eject(proxy, recheck=False)
+        return res
+
+    def check_all(self, timeout: float = PROXY_CHECK_TIMEOUT):
+        """Параллельная проверка всех прокси."""
+        if not self.proxies or self.probe is None:
+            return
+        with ThreadPoolExecutor(max_workers=min(PROXY_CHECK_WORKERS, len(self.proxies))) as ex:
+            list(ex.map(lambda p: self.check_one(p, timeout), self.proxies))
+        log.info("proxy check: %d/%d up", sum(not p.ejected for p in self.proxies), len(self.proxies))
+
+    def start(self, interval: float = PROXY_CHECK_INTERVAL):
+        if self._running or not self.proxies:
+            return
+        self._running = True
+        threading.Thread(target=self._loop, args=(interval,), daemon=True).start()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+
+    def _loop(self, interval: float):
+        while self._running:
+            try:
+                self.check_all()
+            except Exception:
+                log.exception("proxy health check failed")
+            self._wake.wait(interval)
+            self._wake.clear()
+
+    def status(self) -> List[Dict]:
+        with self._lock:
+            return [p.status() for p in self.proxies]
@@ -0,0 +1,179 @@
+
+"""
+Компактные записи постов и тем (вместо dict на каждый элемент страницы).
+
+Post и Topic читаются как словари (p["id"], t.get("tid")), поэтому старый
+код команд работает без изменений. У Post автор, дата и текст вычисляются
+из узла bs4 при первом обращении: для постов, которые никто не читает,
+get_text() не вызывается вовсе.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+from typing import Any, Dict, Optional
+
+from .utils import extract_post_id_from_article
+
+_MISSING = object()
+
+
+class _Record:
+    __slots__ = ()
+    _fields = ()
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key not in self._fields:
+            return default
+        return getattr(self, key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._fields
+
+    def keys(self):
+        return iter(self._fields)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in self._fields}
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class Post(_Record):
+    """Пост темы. node — article.message-body (bs4.Tag) или None для готовых значений."""
+
+    __slots__ = ("id", "link", "_node", "_author", "_date", "_text")
+    _fields = ("id", "author", "date", "text", "link")
+
+    def __init__(self, id: str, link: str, node=None, author: Any = _MISSING,
+                 date: Any = _MISSING, text: Any = _MISSING):
+        self.id = id
+        self.link = link
+        self._node = node
+        self._author = author
+        self._date = date
+        self._text = text
+
+    @property
+    def author(self) -> str:
+        if self._author is _MISSING:
+            node = self._node
+            user = None
+            if node is not None:
+                user = (
+                    node.find_previous("a", class_="username")
+                    or node.find_previous("h4", class_="message-name")
+                    or node.find_previous("span", class_="username")
+                )
+            self._author = user.get_text(strip=True) if user else "Неизвестно"
+        return self._author
+
+    @property
+    def date(self) -> str:
+        if self._date is _MISSING:
+            t = self._node.find_previous("time") if self._node is not None else None
+            self._date = t.get("datetime") if t else ""
+        return self._date
+
+    @property
+    def text(self) -> str:
+        if self._text is _MISSING:
+            msg = self._node
+            if msg is None:
+                self._text = ""
+            else:
+                body = (
+                    msg.select_one("div.bbWrapper")
+                    or msg.select_one("div.message-userContent.lbContainer.js-lbContainer")
+                    or msg.select_one("div.message-userContent")
+                )
+                text = body.get_text("\n", strip=True) if body else msg.get_text("\n", strip=True)
+                self._text = re.sub(r"\n{2,}", "\n", text).strip()
+        return self._text
+
+    def materialize(self) -> "Post":
+        """Вычисляет все поля и отпускает узел (а с ним и весь soup страницы)."""
+        _ = (self.author, self.date, self.text)
+        self._node = None
+        return self
+
+
+class Topic(_Record):
+    __slots__ = ("tid", "title", "author", "url", "pinned", "created")
+    _fields = __slots__
+
+    def __init__(self, tid: int, title: str, author: str, url: str, pinned: bool, created: str):
+        self.tid = tid
+        self.title = title
+        self.author = author
+        self.url = url
+        self.pinned = pinned
+        self.created = created
+
+
+class Page:
+    """
+    Ответ форума как есть: байты и кодировка из Content-Type (None — не
+    объявлена, её найдёт bs4 по <meta>). Парсеры и хеш работают с байтами;
+    text декодируется только если кому-то нужна строка.
+    """
+
+    __slots__ = ("url", "content", "encoding", "_digest")
+
+    def __init__(self, url: str, content: bytes, encoding: Optional[str] = None):
+        self.url = url
+        self.content = content
+        self.encoding = encoding
+        self._digest = None
+
+    @property
+    def digest(self) -> str:
+        if self._digest is None:
+            self._digest = hashlib.blake2b(self.content, digest_size=16).hexdigest()
+        return self._digest
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", "replace")
+
+    def __bool__(self) -> bool:
+        return bool(self.content)
+
+
+def post_id_of(msg) -> str:
+    """
+    id поста по article.message-body: сначала атрибуты самого узла, затем
+    атрибуты родительского article (data-message-id, data-content="post-N",
+    id="js-post-N") — без сериализации всего поста в строку.
+    """
+    pid = msg.get("data-lb-id") or msg.get("data-id") or msg.get("data-post-id")
+    if pid:
+        return str(pid)
+    art = msg.find_parent("article")
+    if art is None:
+        return ""
+    pid = art.get("data-message-id")
+    if pid and str(pid).isdigit():
+        return str(pid)
+    m = re.match(r"post-(\d+)$", art.get("data-content") or "")
+    if m:
+        return m.group(1)
+    m = re.match(r"js-post-(\d+)$", art.get("id") or "")
+    if m:
+        return m.group(1)
+    # нестандартная разметка — старый путь через HTML статьи
+    return extract_post_id_from_article(str(art))
+
+
+def int_id(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,103 @@
+
+"""
+Тексты уведомлений трекера и кэш рендера.
+
+Одно и то же событие (пост, сводка, новая тема) у всех подписчиков ссылки
+рендерится один раз на пару (ключ события, id шаблона), а беседы с
+одинаковым текстом получают его одним messages.send с peer_ids.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple
+
+from . import metrics
+from .records import Post, Topic
+
+DEFAULT_TEMPLATE = "default"
+RENDER_CACHE_SIZE = 1024
+DIGEST_MAX_ITEMS = 15
+
+RENDER_TOTAL = metrics.counter("render_cache_total", "Notification render cache lookups", ("result",))
+
+
+def format_post(p: Post) -> str:
+    text = p.text
+    return (
+        f"📝 Новый пост\n"
+        f"👤 {p.author}  •  {p.date}\n\n"
+        f"{(text[:1500] + '...') if len(text) > 1500 else text}\n\n"
+        f"🔗 {p.link}"
+    )
+
+
+def format_digest(posts: List[Post]) -> str:
+    """Одно сообщение на пачку постов: автор, первая строка, ссылка."""
+    shown = posts[-DIGEST_MAX_ITEMS:]
+    lines = [f"📝 Новых постов: {len(posts)}", ""]
+    if len(posts) > len(shown):
+        lines.append(f"(последние {len(shown)}, ещё {len(posts) - len(shown)} раньше — в теме)")
+        lines.append("")
+    for p in shown:
+        first = p.text.split("\n", 1)[0] if p.text else ""
+        if len(first) > 120:
+            first = first[:120] + "..."
+        lines.append(f"👤 {p.author}: {first}\n🔗 {p.link}\n")
+    return "\n".join(lines).strip()
+
+
+def format_topic(t: Topic) -> str:
+    return (
+        "🆕 Новая тема в разделе:\n\n"
+        f"📄 {t.title}\n"
+        f"👤 {t.author}\n"
+        f"⏱ {t.created}\n"
+        f"🔗 {t.url}"
+    )
+
+
+# вид события -> {id шаблона -> функция рендера}
+TEMPLATES: Dict[str, Dict[str, Callable]] = {
+    "post": {DEFAULT_TEMPLATE: format_post},
+    "digest": {DEFAULT_TEMPLATE: format_digest},
+    "topic": {DEFAULT_TEMPLATE: format_topic},
+}
+
+
+def template_for(peer_id: int, kind: str) -> str:
+    """id шаблона уведомлений беседы; пока у всех бесед формат по умолчанию."""
+    return DEFAULT_TEMPLATE
+
+
+class RenderCache:
+    """LRU (ключ события, id шаблона) -> готовый текст."""
+
+    def __init__(self, maxsize: int = RENDER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def render(self, kind: str, event_key, template_id: str, obj) -> str:
+        key = (kind, event_key, template_id)
+        with self._lock:
+            text = self._data.get(key)
+            if text is not None:
+                self._data.move_to_end(key)
+        if text is not None:
+            RENDER_TOTAL.inc(result="hit")
+            return text
+
+        RENDER_TOTAL.inc(result="miss")
+        fn = TEMPLATES[kind].get(template_id) or TEMPLATES[kind][DEFAULT_TEMPLATE]
+        text = fn(obj)
+        with self._lock:
+            self._data[key] = text
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return text
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
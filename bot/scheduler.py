@@ -0,0 +1,138 @@
+
+"""
+Планировщик запросов к форуму с приоритетными полосами.
+
+Команды модераторов, постинг и фоновый опрос ходят в форум через одни и те
+же сессии. Все запросы берут токен из общего бюджета (FORUM_RPS запросов/с,
+всплеск до FORUM_BURST), а очередь за токенами упорядочена по полосе:
+INTERACTIVE (команды VK) раньше POSTING (ответы и реакции), POSTING раньше
+BACKGROUND (цикл трекера). Внутри полосы — по порядку прихода, так что
+/fast, пришедший посреди большого цикла, ждёт один токен, а не весь цикл.
+
+Полоса — свойство потока: по умолчанию BACKGROUND, команды и постинг
+оборачивают свою работу в `with lane(...)`. Вложенная полоса не
+понижает приоритет: /otvet (команда) постит в полосе INTERACTIVE.
+Новые потоки и пулы полосу не наследуют — её берут через current_lane()
+при отправке задачи и входят в `with lane(...)` в воркере (см.
+ProfileCache.get_many). Очередь за слотом хоста (throttle) тоже по полосам.
+Время ожидания токена по полосам — forum_queue_wait_seconds{lane}.
+FORUM_RPS = 0 — без общего лимита (как раньше), ожидание нулевое.
+
+config.py / окружение:
+    FORUM_RPS = 4
+    FORUM_BURST = 4
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+from . import metrics
+
+try:
+    from config import FORUM_RPS
+except Exception:
+    FORUM_RPS = float(os.getenv("FORUM_RPS", "0"))
+
+try:
+    from config import FORUM_BURST
+except Exception:
+    FORUM_BURST = float(os.getenv("FORUM_BURST", "0"))
+
+INTERACTIVE, POSTING, BACKGROUND = 0, 1, 2
+LANE_NAMES = {INTERACTIVE: "interactive", POSTING: "posting", BACKGROUND: "background"}
+
+QUEUE_WAIT = metrics.histogram(
+    "forum_queue_wait_seconds", "Time a forum request waited for the shared rate budget", ("lane",),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+QUEUE_DEPTH = metrics.gauge("forum_queue_depth", "Forum requests waiting for the shared rate budget", ("lane",))
+
+_local = threading.local()
+
+
+def current_lane() -> int:
+    return getattr(_local, "lane", BACKGROUND)
+
+
+@contextmanager
+def lane(value: int):
+    """Запросы потока внутри блока идут в полосе value (или выше, если уже выше)."""
+    prev = current_lane()
+    _local.lane = min(prev, value)
+    try:
+        yield
+    finally:
+        _local.lane = prev
+
+
+class ForumScheduler:
+    def __init__(self, rps: float = FORUM_RPS, burst: float = FORUM_BURST):
+        self.rps = float(rps or 0)
+        self.burst = float(burst or max(1.0, self.rps))
+        self._tokens = self.burst
+        self._ts = time.monotonic()
+        self._cond = threading.Condition()
+        # (полоса, номер) — голова кучи получает следующий токен
+        self._queue = []
+        self._seq = itertools.count()
+        self._depth = {l: 0 for l in LANE_NAMES}
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._ts) * self.rps)
+        self._ts = now
+
+    def acquire(self, min_lane: int = BACKGROUND) -> float:
+        """Ждать токен в полосе потока (не ниже min_lane); возвращает ожидание в секундах."""
+        lane = min(current_lane(), min_lane)
+        name = LANE_NAMES[lane]
+        if self.rps <= 0:
+            QUEUE_WAIT.observe(0, lane=name)
+            return 0.0
+        t0 = time.monotonic()
+        ticket = (lane, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            self._depth[lane] += 1
+            QUEUE_DEPTH.set(self._depth[lane], lane=name)
+            while True:
+                self._refill()
+                head = self._queue[0] == ticket
+                if head and self._tokens >= 1:
+                    self._tokens -= 1
+                    heapq.heappop(self._queue)
+                    self._depth[lane] -= 1
+                    QUEUE_DEPTH.set(self._depth[lane], lane=name)
+                    # следующий в очереди — новая голова, пусть считает своё ожидание
+                    self._cond.notify_all()
+                    break
+                # голова спит до следующего токена; остальные — до смены головы
+                self._cond.wait((1 - self._tokens) / self.rps if head else None)
+        waited = time.monotonic() - t0
+        QUEUE_WAIT.observe(waited, lane=name)
+        return waited
+
+    def refund(self):
+        """Вернуть токен, если запрос после acquire() так и не ушёл (цепь хоста разомкнута)."""
+        if self.rps <= 0:
+            return
+        with self._cond:
+            self._refill()
+            self._tokens = min(self.burst, self._tokens + 1)
+            self._cond.notify_all()
+
+    def status(self) -> Dict:
+        with self._cond:
+            self._refill()
+            return {
+                "rps": self.rps,
+                "tokens": round(self._tokens, 2),
+                "queued": {LANE_NAMES[k]: v for k, v in self._depth.items()},
+            }
@@ -0,0 +1,169 @@
+
+"""
+Здоровье сессии форума и автоматический перелогин.
+
+SessionManager смотрит на ответы, которые трекер и так получает
+(response-hook): data-logged-in в <html>, редирект на login. Если форум
+отдал страницу гостя, fetch_html зовёт relogin(): вход через
+Account(session=...).login() выполняет один поток, остальные ждут его
+результата и повторяют запрос уже с обновлёнными куками в общем jar.
+Отдельные keepalive-пинги не нужны — форум и так дёргается каждый цикл.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from . import metrics
+
+try:
+    from config import XF_LOGIN, XF_PASS
+except Exception:
+    XF_LOGIN = ""
+    XF_PASS = ""
+
+# после неудачного входа не пробуем чаще, чем раз в RELOGIN_BACKOFF секунд
+RELOGIN_BACKOFF = 120
+RELOGIN_WAIT = 60
+# маркер стоит в <html> — читаем только начало страницы
+HEAD_BYTES = 4096
+
+log = logging.getLogger(__name__)
+
+LOGGED_IN = metrics.gauge("forum_logged_in", "1 if the last forum page was served to a logged-in user", ("account",))
+UPTIME_SECONDS = metrics.gauge("forum_session_uptime_seconds", "Seconds since the forum session was (re)established", ("account",))
+RELOGIN_TOTAL = metrics.counter("forum_relogin_total", "Automatic forum re-login attempts", ("account", "result"))
+
+
+def page_logged_in(html) -> Optional[bool]:
+    """True/False по data-logged-in в начале страницы (str или bytes); None — не страница XenForo."""
+    head = (html or "")[:HEAD_BYTES]
+    if isinstance(head, (bytes, bytearray)):
+        head = head.decode("ascii", "ignore")
+    if 'data-logged-in="true"' in head:
+        return True
+    if 'data-logged-in="false"' in head:
+        return False
+    return None
+
+
+class SessionManager:
+    def __init__(self, session, login: str = XF_LOGIN, password: str = XF_PASS, name: str = "main"):
+        self.session = session
+        self.name = name
+        self.login = login
+        self.password = password
+        self.logged_in: Optional[bool] = None
+        self.since = 0.0
+        self.relogins = 0
+        self.last_error = ""
+        self._lock = threading.Lock()
+        self._inflight: Optional[threading.Event] = None
+        self._inflight_ok = False
+        self._last_attempt = 0.0
+        self._account = None
+
+    # -----------------------------------------------------------------
+    def observe(self, r) -> Optional[bool]:
+        """response-hook: обновляет состояние по ответу; True/False/None как page_logged_in."""
+        try:
+            if r.is_redirect and "login" in r.headers.get("Location", ""):
+                state = False
+            elif r.status_code != 200 or "html" not in r.headers.get("Content-Type", ""):
+                return None
+            else:
+                # байты: не заставляем requests декодировать страницу ради маркера
+                state = page_logged_in(r.content)
+        except Exception:
+            return None
+        if state is not None:
+            self._set(state)
+        return state
+
+    def _set(self, state: bool):
+        if state and not self.logged_in:
+            self.since = time.monotonic()
+        elif not state and self.logged_in:
+            log.warning("forum session %s lost after %.0fs", self.name, self.uptime)
+        self.logged_in = state
+        LOGGED_IN.set(1 if state else 0, account=self.name)
+        UPTIME_SECONDS.set(round(self.uptime), account=self.name)
+
+    @property
+    def uptime(self) -> float:
+        return time.monotonic() - self.since if self.logged_in and self.since else 0.0
+
+    # -----------------------------------------------------------------
+    def relogin(self) -> bool:
+        """
+        Singleflight: первый вызвавший входит, остальные ждут его результата.
+        True — сессия восстановлена, можно повторить запрос.
+        """
+        with self._lock:
+            if self._inflight is not None:
+                ev, leader = self._inflight, False
+            else:
+                if not self.login or not self.password:
+                    self.last_error = "XF_LOGIN/XF_PASS не заданы"
+                    return False
+                if time.monotonic() - self._last_attempt < RELOGIN_BACKOFF:
+                    return False
+                ev = self._inflight = threading.Event()
+                self._last_attempt = time.monotonic()
+                leader = True
+
+        if not leader:
+            ev.wait(RELOGIN_WAIT)
+            return self._inflight_ok
+
+        ok = False
+        try:
+            ok = self._do_login()
+        except Exception as e:
+            self.last_error = str(e)
+            log.exception("forum re-login failed (%s)", self.name)
+        finally:
+            self._inflight_ok = ok
+            RELOGIN_TOTAL.inc(account=self.name, result="ok" if ok else "failed")
+            with self._lock:
+                self._inflight = None
+            ev.set()
+        return ok
+
+    def _do_login(self) -> bool:
+        from .account import Account
+
+        # Account ставит свой User-Agent — трекеру нужен прежний
+        ua = self.session.headers.get("User-Agent")
+        if self._account is None:
+            self._account = Account(self.login, self.password, session=self.session)
+        if ua:
+            self.session.headers["User-Agent"] = ua
+        # протухшие куки из config.py (без домена) иначе уходят вместе с новыми
+        for c in list(self.session.cookies):
+            if c.name in ("xf_session", "xf_user"):
+                self.session.cookies.clear(c.domain, c.path, c.name)
+        ok = self._account.login_if_needed(force=True)
+        if ok:
+            self.relogins += 1
+            self.last_error = ""
+            self._set(True)
+            log.info("forum re-login ok (%s, #%d)", self.name, self.relogins)
+        else:
+            self.last_error = "вход не удался"
+            log.warning("forum re-login failed (%s)", self.name)
+        return ok
+
+    def cookies(self) -> Dict[str, str]:
+        return {c.name: c.value for c in self.session.cookies if c.name.startswith("xf_")}
+
+    def status(self) -> Dict:
+        return {
+            "logged_in": self.logged_in,
+            "uptime_s": round(self.uptime),
+            "relogins": self.relogins,
+            "last_error": self.last_error,
+        }
@@ -2,20 +2,31 @@
 import sqlite3
 import threading
 import os
-from typing import List, Tuple, Optional
+import json
+from typing import Dict, List, Tuple, Optional
+
+from . import metrics
 
 DB = os.getenv("BOT_DB", "bot_data.db")
 _lock = threading.Lock()
 
+QUERY_SECONDS = metrics.histogram("storage_query_seconds", "Latency of bot_data.db queries", ("op",))
+
+
+def _timed(op: str):
+    return metrics.timed(QUERY_SECONDS, op=op)
+
 def _conn():
-  
-    return sqlite3.connect(DB, check_same_thread=False)
+    # busy timeout: в режиме воркеров базу пишут несколько процессов
+    return sqlite3.connect(DB, check_same_thread=False, timeout=30)
 
 def init_db():
     with _lock:
         conn = _conn()
         cur = conn.cursor()
-        
+        # WAL: читатели не блокируют писателя (несколько процессов-воркеров).
+        # WAL и блокировки файла — только локальный диск одной машины, не NFS/SMB
+        cur.execute("PRAGMA journal_mode=WAL")
         cur.execute("""
         CREATE TABLE IF NOT EXISTS tracks (
             peer_id INTEGER NOT NULL,
@@ -44,10 +55,13 @@ def init_db():
             level TEXT,
             msg TEXT
         )""")
+        init_templates_table(conn)
+        init_worker_tables(conn)
         conn.commit()
         conn.close()
 
 
+@_timed("add_track")
 def add_track(peer_id: int, url: str, type_: str):
     with _lock:
         conn = _conn()
@@ -56,6 +70,7 @@ def add_track(peer_id: int, url: str, type_: str):
         conn.commit()
         conn.close()
 
+@_timed("remove_track")
 def remove_track(peer_id: int, url: str):
     with _lock:
         conn = _conn()
@@ -64,6 +79,7 @@ def remove_track(peer_id: int, url: str):
         conn.commit()
         conn.close()
 
+@_timed("list_tracks")
 def list_tracks(peer_id: int) -> List[Tuple[str, str, Optional[str]]]:
     conn = _conn()
     cur = conn.cursor()
@@ -72,6 +88,7 @@ def list_tracks(peer_id: int) -> List[Tuple[str, str, Optional[str]]]:
     conn.close()
     return rows
 
+@_timed("list_all_tracks")
 def list_all_tracks() -> List[Tuple[int, str, str, Optional[str]]]:
     conn = _conn()
     cur = conn.cursor()
@@ -80,6 +97,7 @@ def list_all_tracks() -> List[Tuple[int, str, str, Optional[str]]]:
     conn.close()
     return rows
 
+@_timed("update_last")
 def update_last(peer_id: int, url: str, last_id: str):
     with _lock:
         conn = _conn()
@@ -88,7 +106,21 @@ def update_last(peer_id: int, url: str, last_id: str):
         conn.commit()
         conn.close()
 
+@_timed("update_last_many")
+def update_last_many(url: str, cursors: List[Tuple[int, str]]):
+    """Курсоры всех подписчиков одной ссылки за одну транзакцию: [(peer_id, last_id)]."""
+    if not cursors:
+        return
+    with _lock:
+        conn = _conn()
+        cur = conn.cursor()
+        cur.executemany("UPDATE tracks SET last_id=? WHERE peer_id=? AND url=?",
+                        [(str(last_id), peer_id, url) for peer_id, last_id in cursors])
+        conn.commit()
+        conn.close()
+
 
+@_timed("add_warn")
 def add_warn(peer_id: int, user_id: int):
     with _lock:
         conn = _conn()
@@ -98,6 +130,7 @@ def add_warn(peer_id: int, user_id: int):
         conn.commit()
         conn.close()
 
+@_timed("get_warns")
 def get_warns(peer_id: int, user_id: int) -> int:
     conn = _conn()
     cur = conn.cursor()
@@ -106,6 +139,7 @@ def get_warns(peer_id: int, user_id: int) -> int:
     conn.close()
     return r[0] if r else 0
 
+@_timed("clear_warns")
 def clear_warns(peer_id: int, user_id: int):
     with _lock:
         conn = _conn()
@@ -115,6 +149,7 @@ def clear_warns(peer_id: int, user_id: int):
         conn.close()
 
 # bans
+@_timed("add_ban")
 def add_ban(peer_id: int, user_id: int):
     with _lock:
         conn = _conn()
@@ -123,6 +158,7 @@ def add_ban(peer_id: int, user_id: int):
         conn.commit()
         conn.close()
 
+@_timed("remove_ban")
 def remove_ban(peer_id: int, user_id: int):
     with _lock:
         conn = _conn()
@@ -131,6 +167,7 @@ def remove_ban(peer_id: int, user_id: int):
         conn.commit()
         conn.close()
 
+@_timed("is_banned")
 def is_banned(peer_id: int, user_id: int) -> bool:
     conn = _conn()
     cur = conn.cursor()
@@ -140,6 +177,7 @@ def is_banned(peer_id: int, user_id: int) -> bool:
     return bool(r)
 
 # logs
+@_timed("log_write")
 def log_write(level: str, msg: str):
     try:
         with _lock:
@@ -151,47 +189,271 @@ def log_write(level: str, msg: str):
     except Exception:
         pass
 
-def init_templates_table(conn=None):
+# воркеры: аренда шардов ссылок (leases) с heartbeat и общий outbox уведомлений
+def init_worker_tables(conn=None):
     conn_local = conn or _conn()
     cur = conn_local.cursor()
     cur.execute("""
-    CREATE TABLE IF NOT EXISTS templates (
+    CREATE TABLE IF NOT EXISTS workers (
+        worker_id TEXT PRIMARY KEY,
+        heartbeat REAL NOT NULL
+    )""")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS leases (
         name TEXT PRIMARY KEY,
+        worker_id TEXT NOT NULL,
+        expires REAL NOT NULL
+    )""")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created REAL NOT NULL,
+        peer_ids TEXT NOT NULL,
         text TEXT NOT NULL
     )""")
     conn_local.commit()
     if conn is None:
         conn_local.close()
 
-def add_template(name: str, text: str):
+
+def _immediate(conn):
+    """Транзакция с блокировкой записи сразу — между процессами, не только потоками."""
+    conn.isolation_level = None
+    conn.execute("BEGIN IMMEDIATE")
+
+
+@_timed("worker_heartbeat")
+def worker_heartbeat(worker_id: str, now: float, ttl: float) -> int:
+    """Отмечает воркера живым; возвращает число живых воркеров (heartbeat моложе ttl)."""
     with _lock:
         conn = _conn()
-        cur = conn.cursor()
-        cur.execute("INSERT OR REPLACE INTO templates (name, text) VALUES (?, ?)", (name, text))
+        try:
+            _immediate(conn)
+            conn.execute("INSERT OR REPLACE INTO workers (worker_id, heartbeat) VALUES (?, ?)", (worker_id, now))
+            conn.execute("DELETE FROM workers WHERE heartbeat < ?", (now - ttl,))
+            n = conn.execute("SELECT COUNT(*) FROM workers").fetchone()[0]
+            conn.execute("COMMIT")
+            return n
+        finally:
+            conn.close()
+
+
+@_timed("claim_shards")
+def claim_shards(worker_id: str, total: int, want: int, now: float, ttl: float) -> List[int]:
+    """
+    Продлевает аренду своих шардов, отдаёт лишние сверх want (пришёл новый
+    воркер) и добирает свободные/просроченные (воркер умер). Одна транзакция
+    (BEGIN IMMEDIATE) — исключительность держится на блокировке файла SQLite,
+    поэтому все воркеры — на одной машине.
+    """
+    with _lock:
+        conn = _conn()
+        try:
+            _immediate(conn)
+            conn.execute("UPDATE leases SET expires=? WHERE worker_id=? AND name LIKE 'shard:%'",
+                         (now + ttl, worker_id))
+            rows = conn.execute("SELECT name, worker_id, expires FROM leases WHERE name LIKE 'shard:%'").fetchall()
+            mine = sorted(int(n[6:]) for n, w, _ in rows if w == worker_id)
+            taken = {int(n[6:]) for n, w, exp in rows if w != worker_id and exp >= now}
+            if len(mine) > want:
+                extra, mine = mine[want:], mine[:want]
+                conn.executemany("DELETE FROM leases WHERE name=? AND worker_id=?",
+                                 [(f"shard:{s}", worker_id) for s in extra])
+            elif len(mine) < want:
+                free = [s for s in range(total) if s not in taken and s not in mine][:want - len(mine)]
+                conn.executemany("INSERT OR REPLACE INTO leases (name, worker_id, expires) VALUES (?, ?, ?)",
+                                 [(f"shard:{s}", worker_id, now + ttl) for s in free])
+                mine = sorted(mine + free)
+            conn.execute("COMMIT")
+            return mine
+        finally:
+            conn.close()
+
+
+@_timed("try_lease")
+def try_lease(name: str, worker_id: str, now: float, ttl: float) -> bool:
+    """Единственный держатель именованной аренды (например, отправитель outbox)."""
+    with _lock:
+        conn = _conn()
+        try:
+            _immediate(conn)
+            row = conn.execute("SELECT worker_id, expires FROM leases WHERE name=?", (name,)).fetchone()
+            ok = row is None or row[0] == worker_id or row[1] < now
+            if ok:
+                conn.execute("INSERT OR REPLACE INTO leases (name, worker_id, expires) VALUES (?, ?, ?)",
+                             (name, worker_id, now + ttl))
+            conn.execute("COMMIT")
+            return ok
+        finally:
+            conn.close()
+
+
+@_timed("release_worker")
+def release_worker(worker_id: str):
+    with _lock:
+        conn = _conn()
+        conn.execute("DELETE FROM leases WHERE worker_id=?", (worker_id,))
+        conn.execute("DELETE FROM workers WHERE worker_id=?", (worker_id,))
         conn.commit()
         conn.close()
 
-def remove_template(name: str):
+
+@_timed("list_leases")
+def list_leases() -> List[Tuple[str, str, float]]:
+    conn = _conn()
+    rows = conn.execute("SELECT name, worker_id, expires FROM leases ORDER BY name").fetchall()
+    conn.close()
+    return rows
+
+
+@_timed("outbox_put")
+def outbox_put(items: List[Tuple[List[int], str]]):
+    """[(peer_ids, text)] в порядке отправки."""
+    if not items:
+        return
     with _lock:
         conn = _conn()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM templates WHERE name=?", (name,))
+        conn.executemany("INSERT INTO outbox (created, peer_ids, text) VALUES (strftime('%s','now'), ?, ?)",
+                         [(",".join(str(p) for p in peers), text) for peers, text in items])
         conn.commit()
         conn.close()
 
-def get_template(name: str) -> Optional[str]:
+
+@_timed("outbox_take")
+def outbox_take(limit: int = 100) -> List[Tuple[int, List[int], str]]:
     conn = _conn()
-    cur = conn.cursor()
-    cur.execute("SELECT text FROM templates WHERE name=?", (name,))
-    r = cur.fetchone()
+    rows = conn.execute("SELECT id, peer_ids, text FROM outbox ORDER BY id LIMIT ?", (limit,)).fetchall()
     conn.close()
-    return r[0] if r else None
+    return [(i, [int(p) for p in peers.split(",") if p], text) for i, peers, text in rows]
+
 
-def list_templates() -> List[str]:
+@_timed("outbox_done")
+def outbox_done(ids: List[int]):
+    if not ids:
+        return
+    with _lock:
+        conn = _conn()
+        conn.executemany("DELETE FROM outbox WHERE id=?", [(i,) for i in ids])
+        conn.commit()
+        conn.close()
+
+
+@_timed("outbox_depth")
+def outbox_depth() -> int:
     conn = _conn()
-    cur = conn.cursor()
-    cur.execute("SELECT name FROM templates")
-    rows = [r[0] for r in cur.fetchall()]
+    n = conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
     conn.close()
-    return rows
+    return n
+
+# templates: шаблоны ответов по беседам
+# чтение идёт из кэша в памяти (peer_id -> {name: text}), запись — в БД и в кэш под _lock
+_templates_cache: Dict[int, Dict[str, str]] = {}
 
+
+def init_templates_table(conn=None):
+    conn_local = conn or _conn()
+    cur = conn_local.cursor()
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS chat_templates (
+        peer_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        text TEXT NOT NULL,
+        PRIMARY KEY(peer_id, name)
+    )""")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )""")
+    conn_local.commit()
+    if conn is None:
+        conn_local.close()
+
+def _load_peer_templates(peer_id: int) -> Dict[str, str]:
+    cached = _templates_cache.get(peer_id)
+    if cached is not None:
+        return cached
+    # чтение и заполнение кэша — под _lock: иначе запись, прошедшая между
+    # SELECT и заполнением, потеряется в кэше до перезапуска
+    with _lock:
+        cached = _templates_cache.get(peer_id)
+        if cached is not None:
+            return cached
+        conn = _conn()
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT name, text FROM chat_templates WHERE peer_id=?", (peer_id,))
+            rows = dict(cur.fetchall())
+        finally:
+            conn.close()
+        _templates_cache[peer_id] = rows
+        return rows
+
+@_timed("add_template")
+def add_template(peer_id: int, name: str, text: str):
+    with _lock:
+        conn = _conn()
+        cur = conn.cursor()
+        cur.execute("INSERT OR REPLACE INTO chat_templates (peer_id, name, text) VALUES (?, ?, ?)", (peer_id, name, text))
+        conn.commit()
+        conn.close()
+        if peer_id in _templates_cache:
+            _templates_cache[peer_id] = {**_templates_cache[peer_id], name: text}
+
+@_timed("remove_template")
+def remove_template(peer_id: int, name: str) -> bool:
+    with _lock:
+        conn = _conn()
+        cur = conn.cursor()
+        cur.execute("DELETE FROM chat_templates WHERE peer_id=? AND name=?", (peer_id, name))
+        removed = cur.rowcount > 0
+        conn.commit()
+        conn.close()
+        if peer_id in _templates_cache:
+            rest = dict(_templates_cache[peer_id])
+            rest.pop(name, None)
+            _templates_cache[peer_id] = rest
+    return removed
+
+@_timed("get_template")
+def get_template(peer_id: int, name: str) -> Optional[str]:
+    return _load_peer_templates(peer_id).get(name)
+
+@_timed("list_templates")
+def list_templates(peer_id: int) -> List[str]:
+    return sorted(_load_peer_templates(peer_id))
+
+def migrate_templates_json(path: str) -> int:
+    """
+    Одноразовый перенос data/templates.json ({peer_id: {name: text}}) в chat_templates.
+    Уже существующие в БД шаблоны не перезаписываются. Возвращает число перенесённых.
+    """
+    with _lock:
+        conn = _conn()
+        try:
+            init_templates_table(conn)
+            cur = conn.cursor()
+            cur.execute("SELECT 1 FROM meta WHERE key='templates_json_migrated'")
+            if cur.fetchone():
+                return 0
+            data = {}
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except Exception:
+                # файла нет или в нём пример-заглушка, а не JSON
+                pass
+            rows = []
+            if isinstance(data, dict):
+                for pid, items in data.items():
+                    if not str(pid).lstrip("-").isdigit() or not isinstance(items, dict):
+                        continue
+                    rows.extend((int(pid), str(n), str(t)) for n, t in items.items())
+            cur.executemany("INSERT OR IGNORE INTO chat_templates (peer_id, name, text) VALUES (?, ?, ?)", rows)
+            moved = max(cur.rowcount, 0)
+            cur.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('templates_json_migrated', strftime('%s','now'))")
+            conn.commit()
+            _templates_cache.clear()
+            return moved
+        finally:
+            conn.close()
@@ -0,0 +1,265 @@
+
+"""
+Адаптивный троттлинг и circuit breaker для запросов к форуму, по хостам.
+
+Каждый ответ классифицируется: 429, 5xx, страница проверки Cloudflare и
+таймауты/обрывы — "перегрузка", остальное — успех. На это завязаны:
+
+* AIMD по параллельности: лимит одновременных запросов к хосту растёт на
+  1/лимит за успешный ответ и делится пополам при перегрузке или ответе
+  медленнее THROTTLE_SLOW_SECONDS (не чаще раза за THROTTLE_DECREASE_GAP);
+* circuit breaker: после BREAKER_FAILURES перегрузок подряд цепь
+  размыкается на BREAKER_COOLDOWN секунд (каждое повторное размыкание —
+  вдвое дольше, до BREAKER_MAX_COOLDOWN). Пока цепь разомкнута, запросы к
+  хосту не уходят вовсе (fetch сразу возвращает None). Потом полуоткрытое
+  состояние: проходит один пробный запрос, успех замыкает цепь (лимит
+  начинает расти с 1), ошибка снова размыкает;
+* Retry-After (секунды или HTTP-дата) у 429/503 сразу размыкает цепь на
+  указанное время (не больше RETRY_AFTER_MAX).
+
+Очередь за свободным слотом упорядочена по полосе планировщика
+(scheduler.current_lane), как и очередь за токенами: команда, пришедшая,
+пока фоновый цикл упёрся в лимит хоста, получает первый освободившийся слот.
+
+Ошибки соединения через прокси на хост не списываются — это забота пула
+прокси. Состояние — метрики forum_breaker_state / forum_throttle_limit и
+раздел "Форум" в /checkcookies.
+"""
+
+from __future__ import annotations
+
+import email.utils
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from . import metrics
+from .scheduler import current_lane
+
+THROTTLE_MAX_CONCURRENCY = int(os.getenv("THROTTLE_MAX_CONCURRENCY", "8"))
+THROTTLE_SLOW_SECONDS = float(os.getenv("THROTTLE_SLOW_SECONDS", "8"))
+THROTTLE_DECREASE_GAP = 2.0
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))
+BREAKER_MAX_COOLDOWN = float(os.getenv("BREAKER_MAX_COOLDOWN", "600"))
+RETRY_AFTER_MAX = float(os.getenv("RETRY_AFTER_MAX", "900"))
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+# что вернул enter(): обычный запрос или пробный в полуоткрытом состоянии
+NORMAL, PROBE = "normal", "probe"
+_STATE_VALUE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+log = logging.getLogger(__name__)
+
+BREAKER_STATE = metrics.gauge("forum_breaker_state", "Circuit breaker per host: 0 closed, 1 half-open, 2 open", ("host",))
+THROTTLE_LIMIT = metrics.gauge("forum_throttle_limit", "AIMD concurrency limit per host", ("host",))
+THROTTLE_INFLIGHT = metrics.gauge("forum_throttle_inflight", "Forum requests in flight per host", ("host",))
+THROTTLE_EVENTS = metrics.counter(
+    "forum_throttle_events_total", "Throttle events: backoff, retry_after, open, half_open, close, rejected",
+    ("host", "event"),
+)
+
+_CHALLENGE_MARKERS = (b"/cdn-cgi/challenge-platform", b"cf-browser-verification", b"<title>Just a moment...</title>")
+
+
+def host_of(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+def is_challenge(r) -> bool:
+    """Страница проверки Cloudflare (JS/капча) вместо ответа форума."""
+    headers = getattr(r, "headers", None) or {}
+    if headers.get("cf-mitigated", "").lower() == "challenge":
+        return True
+    if getattr(r, "status_code", 0) not in (403, 429, 503):
+        return False
+    head = (getattr(r, "content", b"") or b"")[:4096]
+    return any(m in head for m in _CHALLENGE_MARKERS)
+
+
+def retry_after(r) -> Optional[float]:
+    """Retry-After в секундах (число или HTTP-дата); None — заголовка нет или он кривой."""
+    value = ((getattr(r, "headers", None) or {}).get("Retry-After") or "").strip()
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def overloaded(r) -> bool:
+    status = getattr(r, "status_code", 0)
+    return status == 429 or status >= 500 or is_challenge(r)
+
+
+class HostThrottle:
+    def __init__(self, host: str, max_concurrency: int = THROTTLE_MAX_CONCURRENCY):
+        self.host = host
+        self.max = max(1, max_concurrency)
+        self.limit = float(self.max)
+        self.inflight = 0
+        self.state = CLOSED
+        self.fails = 0
+        self.cooldown = BREAKER_COOLDOWN
+        self.open_until = 0.0
+        self.reason = ""
+        self._probe = False
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        # (полоса, номер) ждущих слот — голова кучи занимает следующий
+        self._waiting = []
+        self._seq = itertools.count()
+        self._publish()
+
+    def _publish(self):
+        BREAKER_STATE.set(_STATE_VALUE[self.state], host=self.host)
+        THROTTLE_LIMIT.set(round(self.limit, 2), host=self.host)
+        THROTTLE_INFLIGHT.set(self.inflight, host=self.host)
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            self.state = state
+            THROTTLE_EVENTS.inc(host=self.host, event=state if state != CLOSED else "close")
+            log.warning("forum %s: circuit %s%s", self.host, state,
+                        f" for {self.open_until - time.monotonic():.0f}s ({self.reason})" if state == OPEN else "")
+
+    def enter(self) -> Optional[str]:
+        """
+        Занять слот (ждёт, пока параллельных запросов не меньше лимита;
+        очередь — по полосе потока, внутри полосы по порядку прихода).
+        None — цепь разомкнута или пробный запрос уже идёт: запрос не делать.
+        """
+        ticket = (current_lane(), next(self._seq))
+        with self._cond:
+            queued = False
+            try:
+                while True:
+                    if self.state == OPEN:
+                        if time.monotonic() < self.open_until:
+                            THROTTLE_EVENTS.inc(host=self.host, event="rejected")
+                            return None
+                        self._set_state(HALF_OPEN)
+                    if self.state == HALF_OPEN:
+                        if self._probe:
+                            THROTTLE_EVENTS.inc(host=self.host, event="rejected")
+                            return None
+                        self._probe = True
+                        slot = PROBE
+                        break
+                    if not queued:
+                        heapq.heappush(self._waiting, ticket)
+                        queued = True
+                    if self._waiting[0] == ticket and self.inflight < int(self.limit):
+                        slot = NORMAL
+                        break
+                    self._cond.wait()
+            finally:
+                if queued:
+                    self._unqueue(ticket)
+            self.inflight += 1
+            self._publish()
+            return slot
+
+    def _unqueue(self, ticket):
+        if self._waiting[0] == ticket:
+            heapq.heappop(self._waiting)
+        else:
+            self._waiting.remove(ticket)
+            heapq.heapify(self._waiting)
+        # у очереди новая голова — пусть проверит слот
+        self._cond.notify_all()
+
+    def leave(self, slot: str, ok: bool, latency: float = None, wait: float = None, reason: str = ""):
+        """
+        Итог запроса из enter(): ok=False — перегрузка, None — не вина хоста
+        (ошибка прокси), слот просто освобождается; wait — Retry-After в секундах.
+        """
+        with self._cond:
+            self.inflight -= 1
+            now = time.monotonic()
+            probe = slot == PROBE
+            if probe:
+                self._probe = False
+            if ok is None:
+                pass
+            elif ok:
+                self.fails = 0
+                if probe:
+                    self.limit = 1.0
+                    self.cooldown = BREAKER_COOLDOWN
+                    self._set_state(CLOSED)
+                elif latency is not None and latency > THROTTLE_SLOW_SECONDS:
+                    self._decrease(now, "slow")
+                else:
+                    self.limit = min(self.max, self.limit + 1.0 / self.limit)
+            else:
+                self.fails += 1
+                self.reason = reason
+                self._decrease(now, "backoff")
+                if wait is not None:
+                    THROTTLE_EVENTS.inc(host=self.host, event="retry_after")
+                    self._open(now, min(wait, RETRY_AFTER_MAX))
+                elif probe:
+                    self.cooldown = min(BREAKER_MAX_COOLDOWN, self.cooldown * 2)
+                    self._open(now, self.cooldown)
+                elif self.fails >= BREAKER_FAILURES and self.state == CLOSED:
+                    self._open(now, self.cooldown)
+            self._publish()
+            self._cond.notify_all()
+
+    def _decrease(self, now: float, event: str):
+        # одна волна ошибок от параллельных запросов — одно уменьшение
+        if now - self._last_decrease >= THROTTLE_DECREASE_GAP:
+            self._last_decrease = now
+            self.limit = max(1.0, self.limit / 2)
+            THROTTLE_EVENTS.inc(host=self.host, event=event)
+
+    def _open(self, now: float, seconds: float):
+        self.open_until = max(self.open_until, now + seconds)
+        if self.state == OPEN:
+            return
+        self._set_state(OPEN)
+
+    def status(self) -> Dict:
+        with self._cond:
+            return {
+                "host": self.host,
+                "state": self.state,
+                "limit": round(self.limit, 2),
+                "inflight": self.inflight,
+                "fails": self.fails,
+                "open_for_s": max(0, round(self.open_until - time.monotonic())) if self.state == OPEN else 0,
+                "reason": self.reason,
+            }
+
+
+class ForumThrottle:
+    """HostThrottle на каждый хост, к которому ходит трекер."""
+
+    def __init__(self, max_concurrency: int = THROTTLE_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self._hosts: Dict[str, HostThrottle] = {}
+        self._lock = threading.Lock()
+
+    def host(self, url: str) -> HostThrottle:
+        key = host_of(url)
+        with self._lock:
+            h = self._hosts.get(key)
+            if h is None:
+                h = self._hosts[key] = HostThrottle(key, self.max_concurrency)
+            return h
+
+    def status(self) -> list:
+        with self._lock:
+            hosts = list(self._hosts.values())
+        return [h.status() for h in hosts]
@@ -1,9 +1,10 @@
 
 import re
 import sys
+import logging
+from functools import lru_cache
 from urllib.parse import urlparse, parse_qs
-from typing import Optional
-import traceback
+from typing import Optional, Sequence, Union
 
 import requests
 from config import FORUM_BASE
@@ -26,13 +27,13 @@ def fetch_html(url: str) -> str | None:
         r = requests.get(url, headers=HEADERS, timeout=10)
 
         if r.status_code != 200:
-            log_error(f"HTTP {r.status_code} for {url}")
+            log_error("HTTP %s for %s", r.status_code, url)
             return None
 
         return r.text
 
     except Exception as e:
-        log_error(f"fetch_html failed: {e}")
+        log_error("fetch_html failed: %s", e)
         return None
 
 
@@ -70,12 +71,16 @@ def extract_post_id_from_article(article_html: str) -> str:
 
 
 
-def log_info(msg: str):
-    print(f"[UTILS] {msg}", file=sys.stderr)
+def _caller_logger() -> logging.Logger:
+    # логгер модуля, который вызвал log_info/log_error (для уровней по модулям)
+    return logging.getLogger(sys._getframe(2).f_globals.get("__name__", "bot"))
 
-def log_error(msg: str):
-    print(f"\033[91m[UTILS ERROR] {msg}\033[0m", file=sys.stderr)
-    traceback.print_exc()
+def log_info(msg: str, *args):
+    _caller_logger().info(msg, *args)
+
+def log_error(msg: str, *args):
+    # traceback только если мы действительно внутри except
+    _caller_logger().error(msg, *args, exc_info=sys.exc_info()[0] is not None)
 
 def normalize_url(url: str) -> str:
     if not url:
@@ -98,7 +103,7 @@ def is_forum_domain(url: str, forum_base: str) -> bool:
         base = forum_base.lower().rstrip("/")
         return url.startswith(base)
     except Exception as e:
-        log_error(f"is_forum_domain failed: {e}")
+        log_error("is_forum_domain failed: %s", e)
         return False
 
 def detect_type(url: str) -> str:
@@ -160,7 +165,7 @@ def extract_thread_id(url: str) -> str:
         if m:
             return m.group(1)
     except Exception as e:
-        log_error(f"extract_thread_id error: {e}")
+        log_error("extract_thread_id error: %s", e)
     return ""
 
 def extract_forum_id(url: str) -> str:
@@ -174,7 +179,7 @@ def extract_forum_id(url: str) -> str:
         if m:
             return m.group(1)
     except Exception as e:
-        log_error(f"extract_forum_id error: {e}")
+        log_error("extract_forum_id error: %s", e)
     return ""
 
 def truncate_text(s: str, limit: int = 1500) -> str:
@@ -185,6 +190,72 @@ def truncate_text(s: str, limit: int = 1500) -> str:
         return s
     return s[:limit-3] + "..."
 
+def make_soup(markup, parser: str = "html.parser", encoding: Optional[str] = None):
+    """
+    BeautifulSoup с ленивым импортом bs4 (~45 мс) — грузится при первом разборе, а не при старте.
+    markup — str или bytes; encoding — объявленная кодировка байтов (без угадывания).
+    """
+    from bs4 import BeautifulSoup
+    if encoding and isinstance(markup, (bytes, bytearray)):
+        return BeautifulSoup(markup, parser, from_encoding=encoding)
+    return BeautifulSoup(markup or "", parser)
+
+# -----------------------------------------------------------------
+# Нарезка страницы перед разбором: в DOM идут только нужные блоки
+# (список постов / тем и pageNav), без шапки, сайдбаров, футера и скриптов.
+# -----------------------------------------------------------------
+@lru_cache(maxsize=None)
+def _rx(pattern: str, binary: bool):
+    flags = re.I | re.S
+    return re.compile(pattern.encode() if binary else pattern, flags)
+
+
+# теги div внутри <script> и комментариев не считаем
+_DIV_SCAN = r"<script\b.*?</script\s*>|<!--.*?-->|<(/?)div\b"
+
+
+def _div_end(html, start: int, binary: bool) -> int:
+    """Конец элемента div, открытого в start (индекс после </div>), или -1."""
+    depth = 0
+    for m in _rx(_DIV_SCAN, binary).finditer(html, start):
+        if m.group(1) is None:
+            continue
+        depth += -1 if m.group(1) else 1
+        if depth == 0:
+            end = html.find(b">" if binary else ">", m.end())
+            return end + 1 if end >= 0 else -1
+    return -1
+
+
+def slice_regions(html: Union[str, bytes], containers: Sequence[str], nav: bool = True):
+    """
+    Первый div с классом из containers (и первый блок pageNav) — как отдельный
+    кусок HTML того же типа (str/bytes). None, если контейнер не найден или не
+    закрыт: тогда разбирать страницу целиком.
+    """
+    if not html:
+        return None
+    binary = isinstance(html, (bytes, bytearray))
+    parts = []
+    if nav:
+        m = _rx(r'<nav\b[^>]*class="[^"]*\bpageNavWrapper\b', binary).search(html)
+        if m:
+            end = html.find(b"</nav>" if binary else "</nav>", m.end())
+            if end >= 0:
+                parts.append(html[m.start():end + 6])
+    for cls in containers:
+        m = _rx(r'<div\b[^>]*?class="(?:[^"]*\s)?' + re.escape(cls) + r'(?=[\s"])', binary).search(html)
+        if not m:
+            continue
+        end = _div_end(html, m.start(), binary)
+        if end < 0:
+            return None
+        parts.append(html[m.start():end])
+        break
+    else:
+        return None
+    return (b"\n" if binary else "\n").join(parts)
+
 def parse_profile(html: str) -> dict:
     from bs4 import BeautifulSoup
     import re
@@ -1,9 +1,9 @@
 
 import os
+import logging
 import threading
 import time
 import sys
-import traceback
 from typing import Callable
 
 import vk_api
@@ -13,26 +13,55 @@ from vk_api.keyboard import VkKeyboard, VkKeyboardColor
 
 from .command_handler import CommandHandler
 from .storage import init_db
+from . import metrics
 from config import VK_TOKEN
 
 
 VK_MSG_LIMIT = 5500
+VK_PEER_IDS_LIMIT = 100
+
+log = logging.getLogger(__name__)
+
+SEND_SECONDS = metrics.histogram("vk_send_seconds", "Latency of messages.send calls")
+SEND_TOTAL = metrics.counter("vk_send_total", "messages.send calls by result code", ("code",))
+FIRST_EVENT_SECONDS = metrics.gauge("boot_first_event_seconds", "Time from process boot to the first VK longpoll event")
 
 class VKBot:
-    def __init__(self):
+    def __init__(self, tracker=None, connect: bool = True):
+        """
+        tracker — уже созданный ForumTracker, который переиспользует CommandHandler.
+        connect=False: groups.getById и longpoll-сервер запрашиваются в потоке start(),
+        а не в конструкторе (быстрый старт).
+        """
         init_db()
         token = VK_TOKEN
         if not token:
             raise RuntimeError("VK_TOKEN not set in config.py")
         self.vk_session = vk_api.VkApi(token=token)
         self.api = self.vk_session.get_api()
-        gid = self.api.groups.getById()[0]["id"]
-        self.group_id = gid
-        self.longpoll = VkBotLongPoll(self.vk_session, gid)
-        self.handler = CommandHandler(self)
+        self.group_id = None
+        self.longpoll = None
+        self.boot_t0 = time.monotonic()
+        self.listening = threading.Event()
+        self.handler = CommandHandler(self, tracker=tracker)
         self._trigger_check_callback = None
         self._running = False
         self._lp_thread = None
+        if connect:
+            self.connect()
+
+    def connect(self):
+        if self.longpoll is not None:
+            return
+        t0 = time.perf_counter()
+        gid = self.api.groups.getById()[0]["id"]
+        self.group_id = gid
+        self.longpoll = VkBotLongPoll(self.vk_session, gid)
+        log.info("VK connected (group %s) in %.2fs", gid, time.perf_counter() - t0)
+
+    @property
+    def is_alive(self) -> bool:
+        return self._running and self.listening.is_set()
 
     def start(self):
         if self._running:
@@ -40,18 +69,35 @@ class VKBot:
         self._running = True
         self._lp_thread = threading.Thread(target=self._longpoll_loop, daemon=True)
         self._lp_thread.start()
-        print("VK longpoll loop started")
+        log.info("VK longpoll loop started")
 
     def stop(self):
         self._running = False
-       
-        print("VKBot stopped")
+        self.listening.clear()
+        log.info("VKBot stopped")
 
     def _longpoll_loop(self):
-        print("VKBot longpoll listening...")
+        delay = 1
+        while self._running and self.longpoll is None:
+            try:
+                self.connect()
+            except Exception as e:
+                log.warning("VK connect failed: %s (retry in %ss)", e, delay)
+                time.sleep(delay)
+                delay = min(delay * 2, 60)
+        if not self._running:
+            return
+
+        log.info("VKBot longpoll listening (%.2fs since boot)", time.monotonic() - self.boot_t0)
+        self.listening.set()
+        first = True
         for event in self.longpoll.listen():
             if not self._running:
                 break
+            if first:
+                first = False
+                FIRST_EVENT_SECONDS.set(round(time.monotonic() - self.boot_t0, 3))
+                log.info("first VK event %.2fs after boot", time.monotonic() - self.boot_t0)
             try:
                 if event.type == VkBotEventType.MESSAGE_NEW:
                     msg = event.object.message
@@ -62,16 +108,16 @@ class VKBot:
                     if text and text.startswith("/"):
                         try:
                             self.handler.handle(text, peer, from_id)
-                        except Exception as e:
-                            print("Command handler exception:", e)
-                            traceback.print_exc()
-            except Exception as e:
-                print("Longpoll error:", e)
-                traceback.print_exc()
+                        except Exception:
+                            log.exception("Command handler exception")
+            except Exception:
+                log.exception("Longpoll error")
            
                 time.sleep(1)
 
-    def send(self, peer_id: int, text: str, keyboard=None):
+    def send(self, peer_id: int, text: str, keyboard=None) -> bool:
+        """False — VK вернул ошибку (она уже в логе и в vk_send_total)."""
+        t0 = time.perf_counter()
         try:
             params = {
                 "peer_id": peer_id,
@@ -81,8 +127,39 @@ class VKBot:
             if keyboard:
                 params["keyboard"] = keyboard
             self.api.messages.send(**params)
+            SEND_TOTAL.inc(code="ok")
+            return True
         except Exception as e:
-            print("VK send error:", e)
+            # vk_api.exceptions.ApiError несёт код ошибки VK
+            SEND_TOTAL.inc(code=getattr(e, "code", None) or type(e).__name__)
+            log.warning("VK send error: %s", e)
+            return False
+        finally:
+            SEND_SECONDS.observe(time.perf_counter() - t0)
+
+    def send_many(self, peer_ids, text: str) -> int:
+        """Один текст нескольким беседам: messages.send с peer_ids (до 100 за вызов); сколько бесед получили."""
+        peer_ids = list(peer_ids)
+        if len(peer_ids) == 1:
+            return int(self.send(peer_ids[0], text))
+        delivered = 0
+        for i in range(0, len(peer_ids), VK_PEER_IDS_LIMIT):
+            chunk = peer_ids[i:i + VK_PEER_IDS_LIMIT]
+            t0 = time.perf_counter()
+            try:
+                self.api.messages.send(
+                    peer_ids=",".join(str(p) for p in chunk),
+                    message=text,
+                    random_id=0,
+                )
+                SEND_TOTAL.inc(code="ok")
+                delivered += len(chunk)
+            except Exception as e:
+                SEND_TOTAL.inc(code=getattr(e, "code", None) or type(e).__name__)
+                log.warning("VK send_many error (%d peers): %s", len(chunk), e)
+            finally:
+                SEND_SECONDS.observe(time.perf_counter() - t0)
+        return delivered
 
 
     def send_big(self, peer_id: int, text: str):
@@ -118,7 +195,7 @@ class VKBot:
                 self._trigger_check_callback()
                 return True
             except Exception as e:
-                print("trigger_check error:", e)
+                log.warning("trigger_check error: %s", e)
                 return False
         return False
     def longpoll_loop(self):
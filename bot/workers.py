@@ -0,0 +1,172 @@
+
+"""
+Режим воркеров: несколько процессов трекера на одной базе подписок.
+
+Ссылки из tracks (она остаётся источником правды) делятся на WORKER_SHARDS
+шардов по хешу (page-N одной темы — в одном шарде). Каждый воркер раз в
+LEASE_TTL/3 секунд пишет heartbeat и в одной транзакции продлевает аренду
+своих шардов, отдаёт лишние сверх честной доли (ceil(шардов / живых
+воркеров)) и добирает свободные или просроченные. Пришёл воркер — старые
+отдают ему часть шардов; умер — его аренды истекают через LEASE_TTL и
+расходятся по остальным.
+
+Уведомления воркеры не шлют сами, а кладут в таблицу outbox; её разбирает
+один OutboxSender (процесс с VK, main.py), единственность — через аренду
+"sender".
+
+Только одна машина: все процессы открывают один файл BOT_DB. Аренды держатся
+на блокировках SQLite (BEGIN IMMEDIATE) и WAL, а они не работают через
+NFS/SMB — на общем сетевом диске два воркера могут взять один шард или
+испортить базу. Несколько машин потребовали бы другого хранилища аренд.
+
+    WORKER_MODE=1 python main.py   # бот + воркер + отправитель outbox
+    python worker.py               # ещё воркеры, без VK
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import os
+import socket
+import threading
+import time
+from typing import Dict
+
+from . import metrics, storage
+from .accounts import _hash, shard_key
+
+WORKER_MODE = os.getenv("WORKER_MODE", "0").lower() in ("1", "true", "yes")
+WORKER_SHARDS = int(os.getenv("WORKER_SHARDS", "64"))
+LEASE_TTL = float(os.getenv("WORKER_LEASE_TTL", "30"))
+OUTBOX_POLL = 1.0
+OUTBOX_BATCH = 100
+
+log = logging.getLogger(__name__)
+
+WORKERS_ALIVE = metrics.gauge("tracker_workers_alive", "Tracker workers with a fresh heartbeat")
+SHARDS_OWNED = metrics.gauge("tracker_worker_shards", "URL shards leased by this worker")
+OUTBOX_DEPTH = metrics.gauge("outbox_depth", "Notifications waiting in the shared outbox")
+OUTBOX_SENT = metrics.counter("outbox_sent_total", "Outbox rows sent to VK")
+
+
+def url_shard(url: str, shards: int = WORKER_SHARDS) -> int:
+    return _hash(shard_key(url)) % shards
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Worker:
+    def __init__(self, worker_id: str = None, shards: int = WORKER_SHARDS, ttl: float = LEASE_TTL):
+        self.worker_id = worker_id or default_worker_id()
+        self.total = shards
+        self.ttl = ttl
+        self.shards = frozenset()
+        self.alive = 0
+        self._running = False
+        self._stop = threading.Event()
+
+    def owns(self, url: str) -> bool:
+        return url_shard(url, self.total) in self.shards
+
+    def heartbeat(self):
+        now = time.time()
+        self.alive = storage.worker_heartbeat(self.worker_id, now, self.ttl)
+        want = math.ceil(self.total / max(1, self.alive))
+        shards = frozenset(storage.claim_shards(self.worker_id, self.total, want, now, self.ttl))
+        if shards != self.shards:
+            log.info("worker %s: %d/%d shards (%d workers alive)",
+                     self.worker_id, len(shards), self.total, self.alive)
+        self.shards = shards
+        WORKERS_ALIVE.set(self.alive)
+        SHARDS_OWNED.set(len(shards))
+
+    def start(self):
+        """Первый heartbeat — сразу (до первого цикла трекера), дальше в фоне."""
+        if self._running:
+            return
+        self._running = True
+        self._stop.clear()
+        try:
+            self.heartbeat()
+        except Exception:
+            log.exception("worker heartbeat failed")
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def stop(self):
+        self._running = False
+        self._stop.set()
+        try:
+            storage.release_worker(self.worker_id)
+        except Exception:
+            log.exception("worker release failed")
+        self.shards = frozenset()
+
+    def _loop(self):
+        while not self._stop.wait(self.ttl / 3):
+            try:
+                self.heartbeat()
+            except Exception:
+                log.exception("worker heartbeat failed")
+
+    def status(self) -> Dict:
+        return {"worker_id": self.worker_id, "shards": len(self.shards),
+                "total": self.total, "alive": self.alive}
+
+
+class OutboxSender:
+    """Разбирает outbox по порядку id и шлёт через vk.send_many; держит аренду "sender"."""
+
+    def __init__(self, vk, worker_id: str = None, ttl: float = LEASE_TTL):
+        self.vk = vk
+        self.worker_id = worker_id or default_worker_id()
+        self.ttl = ttl
+        self._running = False
+
+    def drain(self) -> int:
+        sent = 0
+        # аренда продлевается на каждую пачку: второй отправитель ждёт её истечения
+        while storage.try_lease("sender", self.worker_id, time.time(), self.ttl):
+            rows = storage.outbox_take(OUTBOX_BATCH)
+            if not rows:
+                break
+            for _, peers, text in rows:
+                if hasattr(self.vk, "send_many"):
+                    self.vk.send_many(peers, text)
+                else:
+                    for peer_id in peers:
+                        self.vk.send(peer_id, text)
+            storage.outbox_done([i for i, _, _ in rows])
+            OUTBOX_SENT.inc(len(rows))
+            sent += len(rows)
+        return sent
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def stop(self):
+        self._running = False
+
+    def _loop(self):
+        while self._running:
+            try:
+                self.drain()
+                OUTBOX_DEPTH.set(storage.outbox_depth())
+            except Exception:
+                log.exception("outbox sender error")
+            time.sleep(OUTBOX_POLL)
+
+
+def lease_status() -> Dict[str, int]:
+    """worker_id -> число арендованных шардов (для /checkcookies и панели)."""
+    out: Dict[str, int] = {}
+    now = time.time()
+    for name, worker_id, expires in storage.list_leases():
+        if name.startswith("shard:") and expires >= now:
+            out[worker_id] = out.get(worker_id, 0) + 1
+    return out
@@ -3,6 +3,7 @@ import sys
 import time
 import threading
 import os
+import logging
 import importlib.util
 import itertools
 
@@ -13,6 +14,15 @@ init(autoreset=True)
 RUN_MODE = "RELEASE"   # DEBUG | RELEASE
 STARTUP_STYLE = "ROCKET"  
 
+BOOT_T0 = time.monotonic()
+
+# FAST_BOOT=0 — вернуть анимации запуска (по умолчанию выключены)
+FAST_BOOT = os.getenv("FAST_BOOT", "1").lower() not in ("0", "false", "no")
+# сколько ждать longpoll перед первым циклом трекера
+BOOT_VK_WAIT = float(os.getenv("BOOT_VK_WAIT", "15"))
+
+log = logging.getLogger("main")
+
 
 
 CONFIG_FILE = "config.py"
@@ -45,6 +55,8 @@ def load_config():
     spec = importlib.util.spec_from_file_location("config", CONFIG_FILE)
     config = importlib.util.module_from_spec(spec)
     spec.loader.exec_module(config)
+    # чтобы `from config import ...` ниже и в bot.* не исполнял config.py второй раз
+    sys.modules["config"] = config
     return config
 
 
@@ -87,7 +99,10 @@ def ensure_config():
     return config
 
 
-config = ensure_config()
+# пул парсеров (bot/parse_pool.py) импортирует этот файл как __mp_main__:
+# там — только импорты, без вопросов в консоли
+if __name__ != "__mp_main__":
+    config = ensure_config()
 
 
 from config import (
@@ -98,8 +113,15 @@ from config import (
     XF_CSRF
 )
 
+from bot.logging_setup import setup_logging
 from bot.vk_bot import VKBot
-from bot.forum_tracker import ForumTracker, stay_online_loop
+from bot.forum_tracker import ForumTracker
+from bot.workers import WORKER_MODE, Worker, OutboxSender
+from bot import metrics
+
+# /metrics процесса бота (0 — выключить); панель server.py отдаёт только свой процесс
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
 
 
 BOT_VERSION = "2.3.1"
@@ -177,25 +199,50 @@ def status_loop(vk, tracker):
 # =====================================================
 
 def run():
-    if STARTUP_STYLE == "ROCKET":
-        rocket_startup()
-    else:
-        smooth_logo()
+    setup_logging()
+
+    if not FAST_BOOT:
+        if STARTUP_STYLE == "ROCKET":
+            rocket_startup()
+        else:
+            smooth_logo()
 
     if RUN_MODE == "DEBUG":
         print(Fore.YELLOW + "[DEBUG MODE ENABLED]\n")
 
-    vk = VKBot()
+    if METRICS_PORT:
+        try:
+            metrics.serve(METRICS_PORT, METRICS_HOST)
+            log.info("metrics on http://%s:%d/metrics", METRICS_HOST, METRICS_PORT)
+        except Exception:
+            log.exception("metrics endpoint failed to start")
+
+    # VK (groups.getById + longpoll) подключается в своём потоке.
+    # Трекер — один на бота и CommandHandler, и отдаётся обработчику до
+    # vk.start(): иначе команда, пришедшая раньше, создала бы второй трекер.
+    # Сеть при создании трекера не трогается, так что это не задерживает загрузку.
+    vk = VKBot(connect=False)
+    vk.boot_t0 = BOOT_T0
     tracker = ForumTracker(
         XF_USER,
         XF_TFA_TRUST,
         XF_SESSION,
         vk
     )
-
+    vk.handler.tracker = tracker
+    if WORKER_MODE:
+        # этот процесс — один из воркеров и единственный отправитель outbox в VK
+        tracker.worker = Worker()
     vk.start()
+    if WORKER_MODE:
+        OutboxSender(vk).start()
+
+    # первый цикл трекера — только после того, как longpoll слушает
+    if not vk.listening.wait(BOOT_VK_WAIT):
+        log.warning("VK longpoll not ready after %ss, starting tracker anyway", BOOT_VK_WAIT)
     tracker.start()
-    threading.Thread(target=stay_online_loop, daemon=True).start()
+    log.info("boot done in %.2fs (fast_boot=%s)", time.monotonic() - BOOT_T0, FAST_BOOT)
+
     threading.Thread(target=status_loop, args=(vk, tracker), daemon=True).start()
 
     while True:
@@ -8,7 +8,7 @@ from queue import Queue, Empty
 
 from flask import (
     Flask, render_template, request, redirect, url_for, session,
-    flash, jsonify, send_from_directory
+    flash, jsonify, send_from_directory, g, Response
 )
 from flask_sock import Sock
 
@@ -29,7 +29,7 @@ except Exception:
 
 # try to import bot modules if present
 try:
-    from bot.forum_tracker import ForumTracker, stay_online_loop
+    from bot.forum_tracker import ForumTracker
 except Exception:
     ForumTracker = None
 
@@ -38,6 +38,25 @@ try:
 except Exception:
     bot_storage = None
 
+try:
+    from bot import metrics as bot_metrics
+except Exception:
+    bot_metrics = None
+
+try:
+    from bot import profiling as bot_profiling
+except Exception:
+    bot_profiling = None
+
+try:
+    from bot.logging_setup import setup_logging
+    setup_logging()
+except Exception:
+    pass
+
+if bot_metrics:
+    PANEL_SECONDS = bot_metrics.histogram("panel_request_seconds", "Panel request latency", ("endpoint", "status"))
+
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_FILE = os.path.join(APP_DIR, "panel.db")
 LOG_DIR = os.path.join(APP_DIR, "logs")
@@ -147,19 +166,27 @@ def debug_required(f):
         return f(*a, **kw)
     return wrapper
 
-# before_request: log visits (but ignore static)
+# before_request: log visits (but ignore static and metrics scrapes)
 @app.before_request
 def _before():
+    g.t0 = time.perf_counter()
     ip = request.headers.get("X-Real-IP") or request.remote_addr or ""
     ua = request.headers.get("User-Agent", "")[:400]
     path = request.path
     user = session.get("user")
-    if not path.startswith("/static"):
+    if not path.startswith("/static") and path != "/metrics":
         try:
             log_visit(ip, path, ua, user)
         except Exception:
             pass
 
+@app.after_request
+def _after(resp):
+    if bot_metrics and hasattr(g, "t0"):
+        PANEL_SECONDS.observe(time.perf_counter() - g.t0,
+                              endpoint=request.endpoint or "-", status=resp.status_code)
+    return resp
+
 # ROUTES
 @app.route("/login", methods=["GET","POST"])
 def login():
@@ -298,7 +325,39 @@ def debug():
                 tracker_debug = tr.debug_reply_form(FORUM_BASE or "/")
     except Exception as e:
         tracker_debug = f"tracker debug error: {e}"
-    return render_template("debug.html", actions=actions, visits=visits, tracker_debug=tracker_debug)
+    profiles = bot_profiling.list_reports() if bot_profiling else []
+    profiler_armed = getattr(getattr(tracker, "profiler", None), "armed", 0)
+    return render_template("debug.html", actions=actions, visits=visits, tracker_debug=tracker_debug,
+                           profiles=profiles, profiler_armed=profiler_armed)
+
+# run next N tracker cycles under cProfile + tracemalloc
+@app.route("/debug/profile", methods=["POST"])
+@debug_required
+def debug_profile():
+    actor = session.get("user") or "debug"
+    profiler = getattr(tracker, "profiler", None)
+    if not profiler:
+        flash("Трекер в панели не запущен", "warning")
+        return redirect(url_for("debug"))
+    try:
+        n = int(request.form.get("cycles", "1") or 1)
+    except ValueError:
+        n = 1
+    armed = profiler.arm(n, source=f"panel:{actor}")
+    if armed:
+        flash(f"Профилирование следующих {armed} цикл(ов) включено", "success")
+        log_action(actor, "profile_cycle", f"cycles={armed}")
+    else:
+        flash("Профилирование уже идёт", "warning")
+    return redirect(url_for("debug"))
+
+@app.route("/debug/profile/<report_id>.pstats")
+@debug_required
+def debug_profile_download(report_id):
+    path = bot_profiling.pstats_path(report_id) if bot_profiling else None
+    if not path:
+        return Response("not found", status=404, mimetype="text/plain")
+    return send_from_directory(os.path.dirname(path), os.path.basename(path), as_attachment=True)
 
 @app.route("/logs/actions")
 @login_required
@@ -335,6 +394,26 @@ def api_cookies():
     except Exception:
         return jsonify({"ok": False, "cookies": {}})
 
+# Prometheus text exposition (процесс панели; метрики бота — METRICS_PORT в main.py).
+# Панель слушает 0.0.0.0: отдаём только админу или адресам из PANEL_METRICS_ALLOW
+# (адрес сокета, не X-Real-IP — заголовок подделывается)
+PANEL_METRICS_ALLOW = {a.strip() for a in os.getenv("PANEL_METRICS_ALLOW", "127.0.0.1,::1").split(",") if a.strip()}
+
+@app.route("/metrics")
+def metrics_route():
+    if "user" not in session and request.remote_addr not in PANEL_METRICS_ALLOW:
+        return Response("forbidden\n", status=403, mimetype="text/plain")
+    if not bot_metrics:
+        return Response("# bot.metrics unavailable\n", mimetype="text/plain")
+    return Response(bot_metrics.render(), mimetype="text/plain; version=0.0.4")
+
+# recent check_all cycles (seed for dashboard chart)
+@app.route("/api/tracker/cycles")
+@login_required
+def api_tracker_cycles():
+    cycles = list(getattr(tracker, "metrics_history", []) or [])
+    return jsonify({"ok": tracker is not None, "cycles": cycles})
+
 # WebSocket endpoint for live logs
 @sock.route("/ws/logs")
 def ws_logs(ws):
@@ -384,11 +463,17 @@ def broadcaster_loop():
 def broadcast_text(txt):
     broadcast_q.put({"type":"info","payload": txt})
 
+# пул парсеров (bot/parse_pool.py) импортирует этот файл как __mp_main__ —
+# тогда ни потоков, ни трекера, ни базы
+PARSE_POOL_CHILD = __name__ == "__mp_main__"
+
 # start background broadcaster
-threading.Thread(target=broadcaster_loop, daemon=True).start()
+if not PARSE_POOL_CHILD:
+    threading.Thread(target=broadcaster_loop, daemon=True).start()
 
 # try to start tracker if present (non-blocking)
-if ForumTracker:
+tracker = None
+if ForumTracker and not PARSE_POOL_CHILD:
     try:
         # try to create with cookies from config if available
         try:
@@ -396,6 +481,10 @@ if ForumTracker:
         except Exception:
             import config as cfg
             tr = ForumTracker(getattr(cfg,"XF_USER",""), getattr(cfg,"XF_TFA_TRUST",""), getattr(cfg,"XF_SESSION",""), None)
+        tracker = tr
+        # per-cycle metrics -> live chart on dashboard
+        if hasattr(tr, "set_metrics_callback"):
+            tr.set_metrics_callback(lambda m: broadcast_q.put({"type": "metrics", "payload": m}))
         # start it if has start()
         if hasattr(tr, "start"):
             try:
@@ -407,7 +496,8 @@ if ForumTracker:
         pass
 
 # init DB on startup
-init_db()
+if not PARSE_POOL_CHILD:
+    init_db()
 
 if __name__ == "__main__":
     # ensure logs exist
@@ -425,7 +515,7 @@ from queue import Queue, Empty
 
 from flask import (
     Flask, render_template, request, redirect, url_for, session,
-    flash, jsonify, send_from_directory
+    flash, jsonify, send_from_directory, g, Response
 )
 from flask_sock import Sock
 
@@ -446,7 +536,7 @@ except Exception:
 
 # try to import bot modules if present
 try:
-    from bot.forum_tracker import ForumTracker, stay_online_loop
+    from bot.forum_tracker import ForumTracker
 except Exception:
     ForumTracker = None
 
@@ -455,6 +545,25 @@ try:
 except Exception:
     bot_storage = None
 
+try:
+    from bot import metrics as bot_metrics
+except Exception:
+    bot_metrics = None
+
+try:
+    from bot import profiling as bot_profiling
+except Exception:
+    bot_profiling = None
+
+try:
+    from bot.logging_setup import setup_logging
+    setup_logging()
+except Exception:
+    pass
+
+if bot_metrics:
+    PANEL_SECONDS = bot_metrics.histogram("panel_request_seconds", "Panel request latency", ("endpoint", "status"))
+
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_FILE = os.path.join(APP_DIR, "panel.db")
 LOG_DIR = os.path.join(APP_DIR, "logs")
@@ -564,19 +673,27 @@ def debug_required(f):
         return f(*a, **kw)
     return wrapper
 
-# before_request: log visits (but ignore static)
+# before_request: log visits (but ignore static and metrics scrapes)
 @app.before_request
 def _before():
+    g.t0 = time.perf_counter()
     ip = request.headers.get("X-Real-IP") or request.remote_addr or ""
     ua = request.headers.get("User-Agent", "")[:400]
     path = request.path
     user = session.get("user")
-    if not path.startswith("/static"):
+    if not path.startswith("/static") and path != "/metrics":
         try:
             log_visit(ip, path, ua, user)
         except Exception:
             pass
 
+@app.after_request
+def _after(resp):
+    if bot_metrics and hasattr(g, "t0"):
+        PANEL_SECONDS.observe(time.perf_counter() - g.t0,
+                              endpoint=request.endpoint or "-", status=resp.status_code)
+    return resp
+
 # ROUTES
 @app.route("/login", methods=["GET","POST"])
 def login():
@@ -715,7 +832,39 @@ def debug():
                 tracker_debug = tr.debug_reply_form(FORUM_BASE or "/")
     except Exception as e:
         tracker_debug = f"tracker debug error: {e}"
-    return render_template("debug.html", actions=actions, visits=visits, tracker_debug=tracker_debug)
+    profiles = bot_profiling.list_reports() if bot_profiling else []
+    profiler_armed = getattr(getattr(tracker, "profiler", None), "armed", 0)
+    return render_template("debug.html", actions=actions, visits=visits, tracker_debug=tracker_debug,
+                           profiles=profiles, profiler_armed=profiler_armed)
+
+# run next N tracker cycles under cProfile + tracemalloc
+@app.route("/debug/profile", methods=["POST"])
+@debug_required
+def debug_profile():
+    actor = session.get("user") or "debug"
+    profiler = getattr(tracker, "profiler", None)
+    if not profiler:
+        flash("Трекер в панели не запущен", "warning")
+        return redirect(url_for("debug"))
+    try:
+        n = int(request.form.get("cycles", "1") or 1)
+    except ValueError:
+        n = 1
+    armed = profiler.arm(n, source=f"panel:{actor}")
+    if armed:
+        flash(f"Профилирование следующих {armed} цикл(ов) включено", "success")
+        log_action(actor, "profile_cycle", f"cycles={armed}")
+    else:
+        flash("Профилирование уже идёт", "warning")
+    return redirect(url_for("debug"))
+
+@app.route("/debug/profile/<report_id>.pstats")
+@debug_required
+def debug_profile_download(report_id):
+    path = bot_profiling.pstats_path(report_id) if bot_profiling else None
+    if not path:
+        return Response("not found", status=404, mimetype="text/plain")
+    return send_from_directory(os.path.dirname(path), os.path.basename(path), as_attachment=True)
 
 @app.route("/logs/actions")
 @login_required
@@ -752,6 +901,26 @@ def api_cookies():
     except Exception:
         return jsonify({"ok": False, "cookies": {}})
 
+# Prometheus text exposition (процесс панели; метрики бота — METRICS_PORT в main.py).
+# Панель слушает 0.0.0.0: отдаём только админу или адресам из PANEL_METRICS_ALLOW
+# (адрес сокета, не X-Real-IP — заголовок подделывается)
+PANEL_METRICS_ALLOW = {a.strip() for a in os.getenv("PANEL_METRICS_ALLOW", "127.0.0.1,::1").split(",") if a.strip()}
+
+@app.route("/metrics")
+def metrics_route():
+    if "user" not in session and request.remote_addr not in PANEL_METRICS_ALLOW:
+        return Response("forbidden\n", status=403, mimetype="text/plain")
+    if not bot_metrics:
+        return Response("# bot.metrics unavailable\n", mimetype="text/plain")
+    return Response(bot_metrics.render(), mimetype="text/plain; version=0.0.4")
+
+# recent check_all cycles (seed for dashboard chart)
+@app.route("/api/tracker/cycles")
+@login_required
+def api_tracker_cycles():
+    cycles = list(getattr(tracker, "metrics_history", []) or [])
+    return jsonify({"ok": tracker is not None, "cycles": cycles})
+
 # WebSocket endpoint for live logs
 @sock.route("/ws/logs")
 def ws_logs(ws):
@@ -801,11 +970,17 @@ def broadcaster_loop():
 def broadcast_text(txt):
     broadcast_q.put({"type":"info","payload": txt})
 
+# пул парсеров (bot/parse_pool.py) импортирует этот файл как __mp_main__ —
+# тогда ни потоков, ни трекера, ни базы
+PARSE_POOL_CHILD = __name__ == "__mp_main__"
+
 # start background broadcaster
-threading.Thread(target=broadcaster_loop, daemon=True).start()
+if not PARSE_POOL_CHILD:
+    threading.Thread(target=broadcaster_loop, daemon=True).start()
 
 # try to start tracker if present (non-blocking)
-if ForumTracker:
+tracker = None
+if ForumTracker and not PARSE_POOL_CHILD:
     try:
         # try to create with cookies from config if available
         try:
@@ -813,6 +988,10 @@ if ForumTracker:
         except Exception:
             import config as cfg
             tr = ForumTracker(getattr(cfg,"XF_USER",""), getattr(cfg,"XF_TFA_TRUST",""), getattr(cfg,"XF_SESSION",""), None)
+        tracker = tr
+        # per-cycle metrics -> live chart on dashboard
+        if hasattr(tr, "set_metrics_callback"):
+            tr.set_metrics_callback(lambda m: broadcast_q.put({"type": "metrics", "payload": m}))
         # start it if has start()
         if hasattr(tr, "start"):
             try:
@@ -824,7 +1003,8 @@ if ForumTracker:
         pass
 
 # init DB on startup
-init_db()
+if not PARSE_POOL_CHILD:
+    init_db()
 
 if __name__ == "__main__":
     # ensure logs exist
@@ -8,6 +8,69 @@
     return;
   }
   const box = document.getElementById("logsbox");
+
+  // ---- график циклов трекера ----
+  const chart = document.getElementById("cyclesChart");
+  const statsEl = document.getElementById("cycleStats");
+  const cycles = [];
+  const MAX_POINTS = 120;
+
+  function drawCycles(){
+    if(!chart) return;
+    const ctx = chart.getContext("2d");
+    const w = chart.width, h = chart.height, pad = 20;
+    ctx.clearRect(0, 0, w, h);
+    if(!cycles.length) return;
+    const maxMs = Math.max(1, ...cycles.map(c => c.duration_ms || 0));
+    const step = cycles.length > 1 ? (w - pad * 2) / (cycles.length - 1) : 0;
+    const y = v => h - pad - (v / maxMs) * (h - pad * 2);
+
+    ctx.fillStyle = "#9aa3a6";
+    ctx.font = "11px monospace";
+    ctx.fillText(`${Math.round(maxMs)} ms`, 4, 12);
+
+    ctx.strokeStyle = "#7b5cff";
+    ctx.lineWidth = 2;
+    ctx.beginPath();
+    cycles.forEach((c, i) => {
+      const px = pad + i * step, py = y(c.duration_ms || 0);
+      if(i === 0) ctx.moveTo(px, py); else ctx.lineTo(px, py);
+    });
+    ctx.stroke();
+
+    ctx.strokeStyle = "#3fb68b";
+    ctx.lineWidth = 1;
+    ctx.beginPath();
+    cycles.forEach((c, i) => {
+      const px = pad + i * step, py = y(c.parse_ms || 0);
+      if(i === 0) ctx.moveTo(px, py); else ctx.lineTo(px, py);
+    });
+    ctx.stroke();
+
+    ctx.fillStyle = "#ff5050";
+    cycles.forEach((c, i) => {
+      if(c.errors) ctx.fillRect(pad + i * step - 2, h - pad + 4, 4, 4);
+    });
+  }
+
+  function pushCycle(c){
+    cycles.push(c);
+    if(cycles.length > MAX_POINTS) cycles.shift();
+    if(statsEl){
+      const kb = ((c.bytes || 0) / 1024).toFixed(1);
+      statsEl.textContent =
+        `цикл ${c.duration_ms} ms • URL ${c.urls_checked}/${c.urls_due} • ${kb} KB • ` +
+        `парсинг ${c.parse_ms} ms • 304: ${c.not_modified} • уведомлений ${c.notifications} • ошибок ${c.errors}`;
+    }
+  }
+
+  if(chart){
+    fetch("/api/tracker/cycles").then(r => r.json()).then(d => {
+      (d.cycles || []).forEach(pushCycle);
+      drawCycles();
+    }).catch(()=>{});
+  }
+
   function appendLine(s){
     if(!box) return;
     const el = document.createElement("div");
@@ -25,6 +88,9 @@
         appendLine(`[ACTION] ${d.payload.ts_iso} ${d.payload.actor} ${d.payload.action} ${d.payload.details}`);
       } else if(d.type === "visit"){
         appendLine(`[VISIT] ${d.payload.ts_iso} ${d.payload.ip} ${d.payload.user} -> ${d.payload.path}`);
+      } else if(d.type === "metrics"){
+        pushCycle(d.payload);
+        drawCycles();
       } else if(d.type === "info"){
         appendLine(`[INFO] ${d.payload}`);
       } else {
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# bot.storage читает BOT_DB при импорте — своя база на прогон тестов
+os.environ.setdefault("BOT_DB", os.path.join(tempfile.mkdtemp(prefix="matrp-tests-"), "bot_data.db"))
@@ -0,0 +1,63 @@
+import bisect
+import time
+
+import requests
+
+from bot.accounts import AccountPool, ForumAccount, _hash, shard_key
+
+URLS = [f"https://forum.test/threads/t.{i}/" for i in range(200)]
+
+
+def pool(*names):
+    return AccountPool([ForumAccount(n, requests.Session(), posting=(n == "main")) for n in names])
+
+
+def owners(p):
+    return {u: p.pick(u).name for u in URLS}
+
+
+def test_adding_account_moves_only_its_share():
+    before = owners(pool("main", "r1", "r2"))
+    after = owners(pool("main", "r1", "r2", "r3"))
+    moved = [u for u in URLS if before[u] != after[u]]
+    assert moved and all(after[u] == "r3" for u in moved)
+    # остальные ссылки остались на своих аккаунтах
+    assert all(before[u] == after[u] for u in URLS if after[u] != "r3")
+    # новому достаётся примерно своя четверть, а не всё подряд
+    assert len(moved) < len(URLS) / 2
+
+
+def test_failed_account_shard_moves_to_next_on_ring_and_returns():
+    p = pool("main", "r1", "r2")
+    before = owners(p)
+    r1 = next(a for a in p if a.name == "r1")
+    p.fail(r1, seconds=0.2)
+    assert not r1.up
+
+    during = owners(p)
+    for u in URLS:
+        if before[u] != "r1":
+            assert during[u] == before[u]
+            continue
+        # следующий по кольцу живой аккаунт после узла владельца
+        start = bisect.bisect(p._keys, _hash(shard_key(u)))
+        ring = [p._ring[(start + j) % len(p._ring)][1] for j in range(len(p._ring))]
+        assert during[u] == next(a for a in ring if a is not r1).name
+    shards = p.shard(URLS)
+    assert r1 not in shards
+    assert sorted(u for us in shards.values() for u in us) == sorted(URLS)
+
+    time.sleep(0.25)
+    assert r1.up
+    assert owners(p) == before
+
+
+def test_single_account_pool():
+    p = pool("main")
+    main = p.posting
+    assert p.pick(URLS[0]) is main
+    p.fail(main, seconds=60)
+    # единственный аккаунт из ротации не выводится
+    assert main.up
+    assert all(p.pick(u) is main for u in URLS)
+    assert p.shard(URLS) == {main: URLS}
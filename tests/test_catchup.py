@@ -0,0 +1,118 @@
+import os
+import re
+
+import pytest
+
+from bot import forum_tracker, storage
+from bot.forum_tracker import CATCHUP_SINGLE_MAX, ForumTracker, thread_page_url
+from bot.light_poll import LightEndpoints
+from bot.records import Page
+from config import FORUM_BASE
+
+CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "corpus")
+URL = FORUM_BASE + "/threads/zhaloba-na-igroka-ivan_petrov.1374310/"
+PAGES = 3          # в записанной теме pageNav до page-3
+PER_PAGE = 20      # постов на странице в записи
+_POST_IDS = re.compile(r"(post-|posts/)(\d+)")
+
+with open(os.path.join(CORPUS, "thread.html"), encoding="utf-8") as f:
+    THREAD = f.read()
+FIRST_ID = min(int(m.group(2)) for m in _POST_IDS.finditer(THREAD))
+
+
+def post_id(page, i):
+    """id i-го (с 0) поста на странице page (с 1)."""
+    return FIRST_ID + (page - 1) * PER_PAGE + i
+
+
+LAST_ID = post_id(PAGES, PER_PAGE - 1)
+
+
+def thread_pages():
+    # страница k — та же запись, id постов сдвинуты на (k-1)*PER_PAGE: тема идёт подряд
+    out = {}
+    for k in range(1, PAGES + 1):
+        html = _POST_IDS.sub(lambda m: m.group(1) + str(int(m.group(2)) + (k - 1) * PER_PAGE), THREAD)
+        out[thread_page_url(URL, k)] = Page(thread_page_url(URL, k), html.encode("utf-8"), "utf-8")
+    return out
+
+
+class FakeVK:
+    def __init__(self):
+        self.sent = []
+
+    def send_many(self, peers, text):
+        self.sent.append((sorted(peers), text))
+        return len(peers)
+
+
+@pytest.fixture
+def tracker():
+    vk = FakeVK()
+    tr = ForumTracker(vk)
+    tr.light = LightEndpoints(enabled=False)
+    pages = thread_pages()
+    tr.loaded = []
+
+    def fetch_page(url, timeout=15, account=None, max_stale=0):
+        tr.loaded.append(url)
+        return pages.get(url)
+
+    tr.fetch_page = fetch_page
+    return tr
+
+
+def ids(posts):
+    return [int(p.id) for p in posts]
+
+
+def test_no_new_posts_gives_last_post_only(tracker):
+    assert ids(tracker.fetch_posts_since(URL, LAST_ID)) == [LAST_ID]
+
+
+def test_new_posts_on_last_page_only(tracker):
+    since = post_id(3, 14)
+    assert ids(tracker.fetch_posts_since(URL, since)) == list(range(since + 1, LAST_ID + 1))
+    # страница 2 не понадобилась: на последней есть уже доставленный пост
+    assert thread_page_url(URL, 2) not in tracker.loaded
+
+
+def test_walks_back_over_several_pages(tracker):
+    since = post_id(1, 17)
+    assert ids(tracker.fetch_posts_since(URL, since)) == list(range(since + 1, LAST_ID + 1))
+    assert tracker.loaded == [URL, thread_page_url(URL, 3), thread_page_url(URL, 2), URL]
+
+
+def test_walk_back_stops_at_catchup_max_pages(tracker, monkeypatch):
+    monkeypatch.setattr(forum_tracker, "CATCHUP_MAX_PAGES", 2)
+    posts = tracker.fetch_posts_since(URL, FIRST_ID - 1)
+    assert ids(posts) == list(range(post_id(2, 0), LAST_ID + 1))
+
+
+def test_peers_with_different_cursors_and_digest(tracker):
+    storage.init_db()
+    peers = {
+        1: LAST_ID,                               # всё уже видел
+        2: LAST_ID - 2,                           # два поста — по одному
+        3: LAST_ID - CATCHUP_SINGLE_MAX - 5,      # больше CATCHUP_SINGLE_MAX — сводка
+        4: post_id(2, 10),                        # с середины страницы 2 — тоже сводка
+    }
+    for peer_id, cursor in peers.items():
+        storage.add_track(peer_id, URL, "thread")
+        storage.update_last(peer_id, URL, str(cursor))
+    subscribers = [(peer_id, "thread", str(cursor)) for peer_id, cursor in peers.items()]
+
+    assert tracker._process_url(URL, subscribers) == "notified"
+
+    sent = tracker.vk.sent
+    singles = [(p, t) for p, t in sent if t.startswith("📝 Новый пост")]
+    digests = [(p, t) for p, t in sent if t.startswith("📝 Новых постов")]
+    assert [p for p, _ in singles] == [[2], [2]]
+    assert str(LAST_ID - 1) in singles[0][1] and str(LAST_ID) in singles[1][1]
+    assert sorted(p for peers_, _ in digests for p in peers_) == [3, 4]
+    assert any(f"Новых постов: {CATCHUP_SINGLE_MAX + 5}" in t for _, t in digests)
+    assert any(f"Новых постов: {LAST_ID - post_id(2, 10)}" in t for _, t in digests)
+    assert 1 not in [p for peers_, _ in sent for p in peers_]
+
+    cursors = {peer_id: last for peer_id, u, _, last in storage.list_all_tracks() if u == URL}
+    assert cursors == {peer_id: str(LAST_ID) for peer_id in peers}
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from bot.deepseek_ai import AIError, DeepSeekClient
+
+
+class Response:
+    def __init__(self, lines, fail_after=None):
+        self.headers = {"Content-Type": "text/event-stream; charset=utf-8"}
+        self.lines = lines
+        self.fail_after = fail_after
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self, decode_unicode=False):
+        for i, line in enumerate(self.lines):
+            if i == self.fail_after:
+                raise ConnectionError("reset")
+            yield line
+
+
+def sse(*texts):
+    return [f"data: {json.dumps({'choices': [{'delta': {'content': t}}]})}" for t in texts] + ["data: [DONE]"]
+
+
+class Session:
+    def __init__(self, response):
+        self.response = response
+        self.calls = 0
+
+    def post(self, url, **kwargs):
+        self.calls += 1
+        return self.response
+
+
+def client(response, slots=1):
+    c = DeepSeekClient(api_key="k", max_concurrency=slots, queue_timeout=0.2)
+    c.session = Session(response)
+    return c
+
+
+def test_slot_free_while_caller_holds_chunks():
+    c = client(Response(sse("раз ", "два")))
+    it = c.stream("привет")
+    assert next(it) == "раз "
+    # вызывающий ещё не дочитал, но HTTP-чтение уже закончилось — слот свободен
+    c._slots.acquire(timeout=1)
+    c._slots.release()
+    assert list(it) == ["два"]
+    assert c.ask("  ПРИВЕТ ") == "раз два"
+    assert c.session.calls == 1
+
+
+def test_midstream_failure_raises_after_chunks():
+    c = client(Response(sse("раз ", "два"), fail_after=1))
+    got = []
+    with pytest.raises(AIError):
+        for chunk in c.stream("привет"):
+            got.append(chunk)
+    assert got == ["раз "]
+    # оборванный ответ не кэшируется, слот возвращён
+    assert c.cache.get(("привет", 512)) is None
+    assert c._slots.acquire(timeout=1)
+
+
+def test_ai_worker_sends_error_separately(monkeypatch):
+    from bot import deepseek_ai
+    from bot.command_handler import CommandHandler
+
+    class VK:
+        def __init__(self):
+            self.sent = []
+
+        def send(self, peer_id, text):
+            self.sent.append(text)
+            return True
+
+    c = client(Response(sse("Начало ответа."), fail_after=1))
+    monkeypatch.setattr(deepseek_ai, "_client", c)
+    handler = CommandHandler.__new__(CommandHandler)
+    handler.vk = VK()
+    handler._ai_worker(1, "вопрос")
+    assert handler.vk.sent[0] == "Начало ответа."
+    assert handler.vk.sent[1].startswith("AI Ошибка: ")
+    assert len(handler.vk.sent) == 2
@@ -0,0 +1,60 @@
+import threading
+
+from bot.forum_tracker import ForumTracker
+
+
+class PartialVK:
+    """send_many доставляет не всем: беседа 2 отвечает ошибкой."""
+
+    def __init__(self):
+        self.sent = []
+
+    def send_many(self, peers, text):
+        ok = [p for p in peers if p != 2]
+        self.sent.extend((p, text) for p in ok)
+        return len(ok)
+
+
+class LegacyVK:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, peer_id, text):
+        if peer_id == 3:
+            raise RuntimeError("boom")
+        self.sent.append((peer_id, text))
+
+
+def make_tracker(vk):
+    tr = ForumTracker.__new__(ForumTracker)
+    tr.vk = vk
+    tr.worker = None
+    tr._no_vk_logged = False
+    tr._local = threading.local()
+    tr._local.cycle = {}
+    tr._cycle_lock = threading.Lock()
+    return tr
+
+
+def test_without_vk_nothing_is_sent_or_raised():
+    tr = make_tracker(None)
+    tr._deliver({(0, "a"): [1, 2]})
+    tr._deliver({(0, "b"): [1]})
+    assert tr._local.cycle.get("notifications", 0) == 0
+    assert tr._no_vk_logged
+
+
+def test_only_delivered_sends_are_counted():
+    vk = PartialVK()
+    tr = make_tracker(vk)
+    tr._deliver({(1, "second"): [1], (0, "first"): [1, 2, 3]})
+    assert [t for _, t in vk.sent] == ["first", "first", "second"]
+    assert tr._local.cycle["notifications"] == 3
+
+
+def test_send_error_does_not_escape():
+    vk = LegacyVK()
+    tr = make_tracker(vk)
+    tr._deliver({(0, "a"): [1, 3], (1, "b"): [4]})
+    assert vk.sent == [(1, "a"), (4, "b")]
+    assert tr._local.cycle["notifications"] == 2
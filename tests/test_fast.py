@@ -0,0 +1,77 @@
+from bot import storage
+from bot.command_handler import CommandHandler, OFFLINE_PUNISH_URL, PREFIX_CHANGE_URL
+from bot.records import Post
+from config import FORUM_BASE
+
+URL = FORUM_BASE + "/index.php?threads/zhaloba-na-igroka.123/"
+
+COMPLAINT = """<html><body>
+<article class="message-body js-selectToQuote">
+  <dl class="pairs pairs--columns pairs--fixedSmall pairs--customField" data-field="5">
+    <dt>Ник нарушителя</dt><dd>Ivan_Ivanov</dd>
+  </dl>
+  Игрок устроил ДМ в порту.
+</article>
+</body></html>"""
+
+
+class FakeVK:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, peer_id, text):
+        self.sent.append((peer_id, text))
+
+
+class FakeTracker:
+    def __init__(self, html, last_text):
+        self.html = html
+        self.last_text = last_text
+        self.posted = []
+
+    def fetch_html(self, url, timeout=15, account=None, max_stale=0):
+        return self.html
+
+    def fetch_posts_since(self, url, since_id=None, page=None, max_stale=0, **kwargs):
+        return [Post("1", url + "#post-1", None, "Admin", "", self.last_text)]
+
+    def post_message(self, url, message):
+        self.posted.append((url, message))
+        return {"ok": True}
+
+
+def make_handler(tracker):
+    storage.init_db()
+    vk = FakeVK()
+    return vk, CommandHandler(vk, tracker=tracker)
+
+
+def test_fast_approved_posts_punishment_and_prefix():
+    tracker = FakeTracker(COMPLAINT, "Одобрено, наказание будет выдано.")
+    vk, handler = make_handler(tracker)
+
+    handler.cmd_fast(2000000001, ["/fast", URL])
+
+    assert [u for u, _ in tracker.posted] == [OFFLINE_PUNISH_URL, PREFIX_CHANGE_URL]
+    assert tracker.posted[0][1].startswith("/offjail Ivan_Ivanov 50 DM / ")
+    assert vk.sent[-1][1] == "✅ Жалоба обработана автоматически."
+
+
+def test_fast_rejected_changes_prefix_only():
+    tracker = FakeTracker(COMPLAINT, "Отказано.")
+    vk, handler = make_handler(tracker)
+
+    handler.cmd_fast(2000000001, ["/fast", URL])
+
+    assert [u for u, _ in tracker.posted] == [PREFIX_CHANGE_URL]
+    assert "Отказ найден" in vk.sent[-1][1]
+
+
+def test_fast_page_not_loaded():
+    tracker = FakeTracker("", "Одобрено")
+    vk, handler = make_handler(tracker)
+
+    handler.cmd_fast(2000000001, ["/fast", URL])
+
+    assert tracker.posted == []
+    assert vk.sent[-1][1] == "❌ Не удалось загрузить тему."
@@ -0,0 +1,136 @@
+import threading
+import time
+
+import pytest
+
+from bot.forum_tracker import ForumTracker
+from bot.light_poll import LightEndpoints
+from bot.scheduler import ForumScheduler
+from bot.throttle import OPEN, ForumThrottle
+from config import FORUM_BASE
+
+URL = "https://forum.test/index.php?threads/x.1/"
+
+
+class Response:
+    def __init__(self, status, headers=None):
+        self.status_code = status
+        self.headers = headers or {}
+        self.content = b""
+
+
+class Session:
+    def __init__(self, status=200, headers=None):
+        self.status = status
+        self.headers = headers
+        self.calls = 0
+
+    def get(self, url, **kwargs):
+        self.calls += 1
+        if isinstance(self.status, Exception):
+            raise self.status
+        return Response(self.status, self.headers)
+
+    post = get
+
+
+class Budget:
+    def __init__(self, fail=False):
+        self.fail = fail
+
+    def acquire(self):
+        if self.fail:
+            raise RuntimeError("budget")
+
+
+class Account:
+    name = "main"
+
+    def __init__(self, session, budget):
+        self.session = session
+        self.budget = budget
+
+
+def make_tracker(session):
+    tr = ForumTracker.__new__(ForumTracker)
+    tr.session = session
+    tr.scheduler = ForumScheduler(rps=1, burst=1)
+    tr.throttle = ForumThrottle()
+    tr._local = threading.local()
+    tr._cycle_lock = threading.Lock()
+    return tr
+
+
+def test_open_circuit_refunds_token():
+    tr = make_tracker(Session())
+    host = tr.throttle.host(URL)
+    host.state, host.open_until = OPEN, time.monotonic() + 60
+    assert tr._get(Account(tr.session, Budget()), URL, 5) is None
+    assert tr.session.calls == 0
+    assert tr.scheduler.status()["tokens"] >= 0.99
+
+
+def test_slot_released_when_budget_raises():
+    tr = make_tracker(Session())
+    with pytest.raises(RuntimeError):
+        tr._get(Account(tr.session, Budget(fail=True)), URL, 5)
+    assert tr.throttle.host(URL).inflight == 0
+
+
+def test_post_honours_retry_after():
+    tr = make_tracker(Session(429, {"Retry-After": "30"}))
+    assert tr._post(URL, data={}).status_code == 429
+    host = tr.throttle.host(URL)
+    assert host.state == OPEN and host.inflight == 0
+    with pytest.raises(RuntimeError):
+        tr._post(URL, data={})
+    assert tr.session.calls == 1
+
+
+@pytest.mark.parametrize("status, errors, not_modified", [
+    (500, 1, 0),
+    (ConnectionError("reset"), 1, 0),
+    (304, 0, 1),
+])
+def test_request_outcome_counted_once(status, errors, not_modified):
+    tr = ForumTracker(None)
+    tr.light = LightEndpoints(enabled=False)
+    url = FORUM_BASE + "/threads/x.1/"
+    acc = tr.accounts.pick(url)
+    acc.session = Session(status)
+    tr._local.cycle = {}
+    outcome = tr._process_url(url, [(1, "thread", "1")])
+    cycle = tr._local.cycle
+    assert acc.session.calls == 1
+    assert cycle.get("errors", 0) == errors
+    assert cycle.get("not_modified", 0) == not_modified
+    assert outcome == ("not_modified" if not_modified else "fetch_failed")
+
+
+class Pages(Session):
+    """Отдаёт тела по очереди: гостевая страница, потом — после перелогина — своя."""
+
+    def __init__(self, *bodies):
+        super().__init__(200)
+        self.bodies = list(bodies)
+
+    def get(self, url, **kwargs):
+        r = super().get(url, **kwargs)
+        r.content = self.bodies.pop(0)
+        return r
+
+
+def test_relogin_retry_goes_through_gate(monkeypatch):
+    tr = ForumTracker(None)
+    url = FORUM_BASE + "/threads/x.1/"
+    acc = tr.accounts.pick(url)
+    acc.session = Pages(b'<html data-logged-in="false">', b'<html data-logged-in="true">')
+    monkeypatch.setattr(acc.sessions, "relogin", lambda: True)
+    gated = []
+    get = tr._get
+    monkeypatch.setattr(tr, "_get", lambda *a, **kw: gated.append(a[1]) or get(*a, **kw))
+
+    page = tr.fetch_page(url)
+    assert page is not None and b"true" in page.content
+    assert gated == [url, url]
+    assert acc.session.calls == 2
@@ -0,0 +1,46 @@
+import threading
+import time
+
+from bot.profiles import ProfileCache
+from bot.scheduler import BACKGROUND, INTERACTIVE, current_lane, lane
+from bot.throttle import NORMAL, HostThrottle
+
+
+def _enter_in(throttle, value, order):
+    with lane(value):
+        slot = throttle.enter()
+    order.append(value)
+    throttle.leave(slot, True)
+
+
+def test_throttle_slot_goes_to_interactive_first():
+    t = HostThrottle("forum.test", max_concurrency=1)
+    busy = t.enter()
+    assert busy == NORMAL
+
+    order = []
+    bg = threading.Thread(target=_enter_in, args=(t, BACKGROUND, order))
+    bg.start()
+    time.sleep(0.05)
+    fg = threading.Thread(target=_enter_in, args=(t, INTERACTIVE, order))
+    fg.start()
+    time.sleep(0.05)
+
+    t.leave(busy, True)
+    bg.join(2)
+    fg.join(2)
+    assert order == [INTERACTIVE, BACKGROUND]
+    assert t.inflight == 0 and not t._waiting
+
+
+def test_get_many_keeps_caller_lane():
+    seen = []
+
+    def loader(url):
+        seen.append(current_lane())
+        return {"username": url}
+
+    profiles = ProfileCache(loader, workers=4)
+    with lane(INTERACTIVE):
+        profiles.get_many(["1", "2", "3"])
+    assert seen == [INTERACTIVE] * 3
@@ -0,0 +1,26 @@
+import json
+
+from bot.light_poll import parse_latest_location, partial_logged_in
+
+
+def test_latest_location_slug_with_post_word():
+    loc = "https://forum.test/threads/post-123-pravila.77/page-4#post-9001"
+    assert parse_latest_location(loc) == (9001, 4)
+
+
+def test_latest_location_first_page_and_index_php():
+    assert parse_latest_location("/threads/page-2-guide.5/#post-42") == (42, 1)
+    assert parse_latest_location("/index.php?threads/post-1-x.5/page-3#post-7") == (7, 3)
+
+
+def test_latest_location_without_fragment():
+    assert parse_latest_location("/threads/post-123-pravila.77/page-4") is None
+    assert parse_latest_location("/login/") is None
+    assert parse_latest_location("") is None
+
+
+def test_partial_logged_in():
+    content = {"content": '<article class="message-body">x</article>'}
+    assert partial_logged_in(json.dumps({"html": content, "visitor": {"total_unread": "0"}}).encode()) is True
+    assert partial_logged_in(json.dumps({"html": content}).encode()) is False
+    assert partial_logged_in(b"<html data-logged-in=\"true\">") is None
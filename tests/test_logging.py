@@ -0,0 +1,22 @@
+import logging
+import time
+
+from bot.logging_setup import RateLimitFilter
+
+
+def _record(msg):
+    return logging.LogRecord("bot.test", logging.INFO, __file__, 0, msg, (), None)
+
+
+def test_rate_limit_state_is_pruned():
+    f = RateLimitFilter(per_window=1, window=0.05)
+    for i in range(500):
+        f.filter(_record("one-off %d" % i))
+    time.sleep(0.06)
+    assert f.filter(_record("fresh"))
+    assert len(f._state) == 1
+
+
+def test_rate_limit_suppresses_within_window():
+    f = RateLimitFilter(per_window=2, window=60)
+    assert [f.filter(_record("same %s")) for _ in range(4)] == [True, True, False, False]
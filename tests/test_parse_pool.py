@@ -0,0 +1,45 @@
+import os
+import threading
+from collections import OrderedDict
+
+from bot import forum_tracker
+from bot.cache import SingleFlight
+from bot.forum_tracker import SLICE_TOTAL, ForumTracker, parse_thread_page
+from bot.parse_pool import ParsePool, _mp_context
+from bot.records import Page
+
+CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "corpus")
+
+
+def make_tracker(workers):
+    tr = ForumTracker.__new__(ForumTracker)
+    tr.parser = ParsePool(workers)
+    tr._local = threading.local()
+    tr._cycle_lock = threading.Lock()
+    tr._parsed = OrderedDict()
+    tr._parsed_lock = threading.Lock()
+    tr._parse_flight = SingleFlight()
+    return tr
+
+
+def test_pool_does_not_fork():
+    assert _mp_context().get_start_method() in ("forkserver", "spawn")
+
+
+def test_pool_counts_slices_in_parent():
+    with open(os.path.join(CORPUS, "thread.html"), "rb") as f:
+        page = Page("https://forum.test/threads/x.1/", f.read(), "utf-8")
+    url = page.url
+
+    local = make_tracker(0)
+    before = SLICE_TOTAL.value(parser="thread", result="sliced")
+    expected = local._parse("thread", parse_thread_page, page, url, None)
+    assert SLICE_TOTAL.value(parser="thread", result="sliced") == before + 1
+
+    pooled = make_tracker(1)
+    try:
+        assert pooled._parse("thread", parse_thread_page, page, url, None) == expected
+    finally:
+        pooled.parser.shutdown()
+    assert SLICE_TOTAL.value(parser="thread", result="sliced") == before + 2
+    assert forum_tracker._slices.__dict__.get("seen") is None
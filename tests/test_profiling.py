@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+import threading
+
+from bot.profiling import CycleProfiler
+
+
+def busy_worker_function():
+    return sum(i * i for i in range(20000))
+
+
+def test_worker_threads_are_in_the_report(tmp_path):
+    reports = []
+    profiler = CycleProfiler(out_dir=str(tmp_path))
+    profiler.arm(1, source="test", on_done=reports.append)
+
+    def worker():
+        with profiler.thread():
+            busy_worker_function()
+
+    with profiler.cycle():
+        threads = [threading.Thread(target=worker) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    report = reports[0]
+    funcs = {f["func"]: f for f in report["functions"]}
+    worker_rows = [f for name, f in funcs.items() if "busy_worker_function" in name]
+    assert worker_rows and worker_rows[0]["ncalls"] == 2
+    assert report["threads"] >= 1
+
+
+def test_thread_outside_cycle_is_noop():
+    profiler = CycleProfiler()
+    with profiler.thread():
+        pass
+    assert profiler._threads == []
+
+
+def test_pstats_not_imported_until_profiling():
+    code = "import sys, bot.profiling; print('pstats' in sys.modules, 'cProfile' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.split()
+    assert out == ["False", "False"]
@@ -0,0 +1,88 @@
+import json
+import threading
+
+import pytest
+
+from bot import storage
+
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    storage.init_db()
+    conn = storage._conn()
+    conn.execute("DELETE FROM chat_templates")
+    conn.execute("DELETE FROM meta WHERE key='templates_json_migrated'")
+    conn.commit()
+    conn.close()
+    storage._templates_cache.clear()
+    yield
+    storage._templates_cache.clear()
+
+
+def rows():
+    conn = storage._conn()
+    out = conn.execute("SELECT peer_id, name, text FROM chat_templates ORDER BY peer_id, name").fetchall()
+    conn.close()
+    return out
+
+
+def migrated():
+    conn = storage._conn()
+    row = conn.execute("SELECT value FROM meta WHERE key='templates_json_migrated'").fetchone()
+    conn.close()
+    return row is not None
+
+
+def test_migrate_legacy_json_once(tmp_path):
+    path = tmp_path / "templates.json"
+    path.write_text(json.dumps({
+        "2000000001": {"hi": "Привет", "bye": "Пока"},
+        "-5": {"x": "y"},
+        "примеры": "не беседа",
+    }, ensure_ascii=False), encoding="utf-8")
+    # уже заведённый в БД шаблон миграция не перезаписывает
+    storage.add_template(2000000001, "hi", "Здравствуйте")
+
+    assert storage.migrate_templates_json(str(path)) == 2
+    assert migrated()
+    expected = [(-5, "x", "y"), (2000000001, "bye", "Пока"), (2000000001, "hi", "Здравствуйте")]
+    assert rows() == expected
+    assert storage.list_templates(2000000001) == ["bye", "hi"]
+
+    # повторный запуск (даже с дописанным файлом) ничего не добавляет
+    path.write_text(json.dumps({"2000000001": {"hi": "Привет", "new": "Новый"}}), encoding="utf-8")
+    assert storage.migrate_templates_json(str(path)) == 0
+    assert rows() == expected
+
+
+def test_migrate_without_file_sets_flag(tmp_path):
+    assert storage.migrate_templates_json(str(tmp_path / "missing.json")) == 0
+    assert migrated()
+    assert rows() == []
+
+
+def test_cache_fill_does_not_lose_concurrent_add():
+    peer = 2000000002
+    started, release = threading.Event(), threading.Event()
+    conn_orig = storage._conn
+
+    def slow_conn():
+        conn = conn_orig()
+        if threading.current_thread().name == "reader":
+            started.set()
+            release.wait(1)
+        return conn
+
+    storage._conn = slow_conn
+    try:
+        reader = threading.Thread(target=storage.list_templates, args=(peer,), name="reader")
+        reader.start()
+        started.wait(1)
+        writer = threading.Thread(target=storage.add_template, args=(peer, "late", "text"))
+        writer.start()
+        release.set()
+        reader.join(2)
+        writer.join(2)
+    finally:
+        storage._conn = conn_orig
+    assert storage.get_template(peer, "late") == "text"
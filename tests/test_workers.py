@@ -0,0 +1,93 @@
+import time
+
+import pytest
+
+from bot import storage
+from bot.workers import OutboxSender, Worker
+
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    storage.init_db()
+    conn = storage._conn()
+    for table in ("leases", "workers", "outbox"):
+        conn.execute(f"DELETE FROM {table}")
+    conn.commit()
+    conn.close()
+    yield
+
+
+def test_claim_shards_split_between_two_workers():
+    now = 1000.0
+    a = storage.claim_shards("a", 8, 8, now, 30)
+    assert a == list(range(8))
+    # пришёл второй: a отдаёт лишнее, b забирает освободившееся
+    a = storage.claim_shards("a", 8, 4, now + 1, 30)
+    b = storage.claim_shards("b", 8, 4, now + 1, 30)
+    assert len(a) == len(b) == 4
+    assert not set(a) & set(b)
+    assert sorted(a + b) == list(range(8))
+
+
+def test_claim_shards_takes_over_expired_lease():
+    storage.claim_shards("a", 4, 2, 1000.0, 30)
+    b = storage.claim_shards("b", 4, 4, 1001.0, 30)
+    assert len(b) == 2
+    # a не продлевал аренду дольше ttl — его шарды переходят к b
+    b = storage.claim_shards("b", 4, 4, 1040.0, 30)
+    assert b == [0, 1, 2, 3]
+    assert storage.claim_shards("a", 4, 2, 1041.0, 30) == []
+
+
+def test_worker_heartbeat_two_workers_and_expiry():
+    a = Worker("a", shards=6, ttl=0.3)
+    b = Worker("b", shards=6, ttl=0.3)
+    a.heartbeat()
+    assert len(a.shards) == 6 and a.alive == 1
+    b.heartbeat()
+    a.heartbeat()
+    b.heartbeat()
+    assert a.alive == b.alive == 2
+    assert len(a.shards) == len(b.shards) == 3
+    assert not a.shards & b.shards
+
+    time.sleep(0.4)  # a умер: heartbeat и аренды старше ttl
+    b.heartbeat()
+    assert b.alive == 1
+    assert b.shards == frozenset(range(6))
+
+
+def test_try_lease_single_holder():
+    assert storage.try_lease("sender", "a", 1000.0, 30)
+    assert not storage.try_lease("sender", "b", 1010.0, 30)
+    assert storage.try_lease("sender", "a", 1010.0, 30)
+    assert storage.try_lease("sender", "b", 1041.0, 30)
+
+
+class FakeVK:
+    def __init__(self):
+        self.sent = []
+
+    def send_many(self, peers, text):
+        self.sent.append((list(peers), text))
+        return len(peers)
+
+
+def test_outbox_drained_in_put_order():
+    storage.outbox_put([([1, 2], "first"), ([3], "second")])
+    storage.outbox_put([([1], "third")])
+    assert storage.outbox_depth() == 3
+
+    vk = FakeVK()
+    assert OutboxSender(vk, worker_id="sender-a").drain() == 3
+    assert vk.sent == [([1, 2], "first"), ([3], "second"), ([1], "third")]
+    assert storage.outbox_depth() == 0
+
+
+def test_outbox_second_sender_waits_for_lease():
+    storage.outbox_put([([1], "only")])
+    assert OutboxSender(FakeVK(), worker_id="sender-a").drain() == 1
+    storage.outbox_put([([1], "next")])
+    other = FakeVK()
+    assert OutboxSender(other, worker_id="sender-b").drain() == 0
+    assert other.sent == [] and storage.outbox_depth() == 1
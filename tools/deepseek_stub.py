@@ -0,0 +1,103 @@
+
+"""
+Локальная заглушка DeepSeek API (OpenAI-совместимый chat endpoint).
+
+    python tools/deepseek_stub.py --port 8090 --delay 0.05
+    DEEPSEEK_API_URL=http://127.0.0.1:8090/v1/chat DEEPSEEK_API_KEY=test python main.py
+
+Отвечает эхом промпта. При "stream": true отдаёт SSE по словам
+с задержкой --delay между кусками, иначе обычный JSON.
+Счётчик запросов: GET /stats.
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_stats = {"requests": 0, "stream": 0}
+_stats_lock = threading.Lock()
+
+
+class Handler(BaseHTTPRequestHandler):
+    delay = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path != "/stats":
+            self.send_error(404)
+            return
+        body = json.dumps(_stats).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            req = json.loads(self.rfile.read(length) or b"{}")
+        except Exception:
+            self.send_error(400)
+            return
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            self.send_error(401)
+            return
+
+        prompt = ""
+        for m in req.get("messages") or []:
+            if m.get("role") == "user":
+                prompt = m.get("content", "")
+        answer = f"Ответ на: {prompt}\n\n" + " ".join(["lorem"] * 40)
+
+        with _stats_lock:
+            _stats["requests"] += 1
+            if req.get("stream"):
+                _stats["stream"] += 1
+
+        if not req.get("stream"):
+            body = json.dumps({"choices": [{"message": {"role": "assistant", "content": answer}}]},
+                              ensure_ascii=False).encode()
+            time.sleep(self.delay)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        for word in answer.split(" "):
+            chunk = {"choices": [{"delta": {"content": word + " "}}]}
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(self.delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+def serve(host: str = "127.0.0.1", port: int = 8090, delay: float = 0.0) -> ThreadingHTTPServer:
+    """Запускает заглушку в фоне и возвращает сервер (server.shutdown() для остановки)."""
+    Handler.delay = delay
+    srv = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8090)
+    ap.add_argument("--delay", type=float, default=0.05)
+    args = ap.parse_args()
+    Handler.delay = args.delay
+    print(f"DeepSeek stub on http://{args.host}:{args.port}/v1/chat")
+    ThreadingHTTPServer((args.host, args.port), Handler).serve_forever()
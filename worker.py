@@ -0,0 +1,44 @@
+
+"""
+Дополнительный воркер трекера (режим воркеров, см. bot/workers.py).
+
+    python worker.py
+
+Берёт config.py и BOT_DB те же, что у main.py (запущенного с WORKER_MODE=1
+на этой же машине),
+арендует свою долю ссылок и кладёт уведомления в общий outbox — в VK их
+отправляет main.py. Токен VK воркеру не нужен.
+"""
+
+import logging
+import time
+
+from config import XF_USER, XF_TFA_TRUST, XF_SESSION
+
+from bot.logging_setup import setup_logging
+from bot.storage import init_db
+from bot.forum_tracker import ForumTracker
+from bot.workers import Worker
+
+log = logging.getLogger("worker")
+
+
+def run():
+    setup_logging()
+    init_db()
+    tracker = ForumTracker(XF_USER, XF_TFA_TRUST, XF_SESSION, None)
+    tracker.worker = Worker()
+    tracker.start()
+    log.info("worker %s started", tracker.worker.worker_id)
+    try:
+        while True:
+            time.sleep(5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # сразу отдаём шарды остальным, не дожидаясь истечения аренды
+        tracker.stop()
+
+
+if __name__ == "__main__":
+    run()